@@ -0,0 +1,336 @@
+# deterministic synthetic catalog and student population for benchmarks
+#
+#   python generate.py --scale small --csv-out out/catalog
+#       catalog CSVs in the db/catalog format (import with import_catalog.py)
+#   python generate.py --scale large --db out/bench.duckdb
+#       a complete database: schema, seeds, the generated catalog (bulk
+#       import) and students with majors, history, current enrollments and plans
+#
+# the same --seed and sizes always produce the same files and rows.
+import argparse
+import csv
+import random
+import sys
+import time
+from pathlib import Path
+
+import duckdb
+
+BASE = Path(__file__).resolve().parent
+DB_DIR = BASE.parent / 'db'
+sys.path.insert(0, str(DB_DIR))
+import ids
+import import_catalog
+
+SCALES = {
+    #          courses  sections  students  programs
+    'tiny':   (500,     1500,     1000,     5),
+    'small':  (2000,    6000,     5000,     10),
+    'medium': (20000,   60000,    20000,    40),
+    'large':  (20000,   60000,    100000,   40),
+}
+
+TERM_ID = 8
+CY_START, CY_END = 2025, 2026
+
+SUBJECT_WORDS = [
+    'Accounting', 'Aerospace', 'Agriculture', 'Anthropology', 'Architecture', 'Art', 'Astronomy',
+    'Biology', 'Chemistry', 'Communication', 'Computer', 'Criminology', 'Dance', 'Data', 'Design',
+    'Earth', 'Economics', 'Education', 'Electrical', 'Energy', 'English', 'Finance', 'Forestry',
+    'Geography', 'Geology', 'History', 'Hospitality', 'Industrial', 'Journalism', 'Kinesiology',
+    'Linguistics', 'Management', 'Marketing', 'Materials', 'Mathematics', 'Mechanical', 'Music',
+    'Nursing', 'Nutrition', 'Philosophy', 'Physics', 'Political', 'Psychology', 'Religious',
+    'Sociology', 'Statistics', 'Theatre', 'Veterinary', 'Wildlife',
+]
+TITLE_WORDS = [
+    'Introduction', 'Advanced', 'Applied', 'Principles', 'Foundations', 'Topics', 'Methods', 'Theory',
+    'Analysis', 'Systems', 'Design', 'Laboratory', 'Seminar', 'Modeling', 'Computation', 'Structures',
+    'Dynamics', 'Practice', 'Research', 'Networks', 'Programming', 'Statistics', 'Algorithms',
+    'Ethics', 'History', 'Culture', 'Policy', 'Management', 'Engineering', 'Communication', 'Writing',
+    'Probability', 'Calculus', 'Databases', 'Security', 'Optimization', 'Signals', 'Materials',
+    'Environment', 'Health', 'Society', 'Media', 'Performance', 'Biology', 'Chemistry', 'Physics',
+]
+TITLE_TAILS = ['I', 'II', 'III', 'Lab', 'Honors', 'Capstone', 'Workshop']
+BUILDINGS = ['Willard', 'Westgate', 'Thomas', 'Osmond', 'Boucke', 'Forum', 'Sackett', 'Hammond',
+             'Keller', 'Chambers', 'Walker', 'Wartik', 'Davey', 'Deike', 'Pond', 'Leonhard']
+FIRST_NAMES = ['Alex', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Avery', 'Quinn', 'Jamie',
+               'Drew', 'Parker', 'Rowan', 'Sage', 'Emerson', 'Hayden', 'Reese', 'Skyler', 'Logan']
+LAST_NAMES = ['Smith', 'Johnson', 'Lee', 'Brown', 'Garcia', 'Miller', 'Davis', 'Lopez', 'Wilson',
+              'Anderson', 'Thomas', 'Moore', 'Martin', 'Jackson', 'White', 'Harris', 'Clark', 'Lewis']
+GRADES = ['A', 'A', 'A-', 'B+', 'B', 'B', 'B-', 'C+', 'C', 'C', 'D', 'F', 'P']
+
+# (days, minutes per meeting, weight)
+PATTERNS = [('MWF', 50, 40), ('TR', 75, 35), ('MW', 75, 10), ('M', 170, 3), ('T', 170, 3),
+            ('W', 170, 3), ('R', 170, 3), ('F', 110, 2), ('MTWRF', 50, 1)]
+
+
+def subject_codes(n, rnd):
+    codes = []
+    seen = set()
+    for i in range(n):
+        word = SUBJECT_WORDS[i % len(SUBJECT_WORDS)].upper()
+        code = word[:4] if i < len(SUBJECT_WORDS) else word[:3] + chr(ord('A') + (i // len(SUBJECT_WORDS)) % 26)
+        while code in seen:
+            code = word[:2] + ''.join(rnd.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(3))
+        seen.add(code)
+        codes.append(code)
+    return codes
+
+
+def make_catalog(n_courses, n_sections, n_programs, rnd):
+    n_subjects = max(1, n_courses // 80)
+    subjects = subject_codes(n_subjects, rnd)
+
+    # courses: unique numbers per subject, lower numbers first so that the
+    # prereq DAG can point only backwards
+    courses = []
+    per_subject = {s: set() for s in subjects}
+    while len(courses) < n_courses:
+        subject = rnd.choice(subjects)
+        level = rnd.choices([1, 2, 3, 4, 5], weights=[30, 25, 20, 20, 5])[0]
+        cata = str(level * 100 + rnd.randint(0, 99))
+        if rnd.random() < 0.08:
+            cata += rnd.choice('WH')
+        if cata in per_subject[subject]:
+            continue
+        per_subject[subject].add(cata)
+        words = rnd.sample(TITLE_WORDS, rnd.randint(1, 3))
+        title = ' '.join(words)
+        if rnd.random() < 0.3:
+            title += ' ' + rnd.choice(TITLE_TAILS)
+        credits = rnd.choices(['1', '2', '3', '4'], weights=[5, 5, 75, 15])[0]
+        courses.append((subject, cata, title[:70], credits))
+    courses.sort(key=lambda c: (int(c[1].rstrip('WH')), c[0], c[1]))
+
+    # prereqs: 0-3 earlier courses, mostly from the same subject
+    by_subject = {}
+    prereqs = []
+    for idx, (subject, cata, _, _) in enumerate(courses):
+        level = int(cata.rstrip('WH')) // 100
+        earlier = by_subject.get(subject, [])
+        if level >= 2 and idx > 0:
+            wanted = rnd.choices([0, 1, 2, 3], weights=[25, 40, 25, 10])[0]
+            picks = set()
+            for _ in range(wanted):
+                if earlier and rnd.random() < 0.8:
+                    picks.add(rnd.choice(earlier))
+                else:
+                    picks.add(rnd.randrange(idx))
+            for p in sorted(picks):
+                prereqs.append((subject, cata, courses[p][0], courses[p][1], '2'))
+        by_subject.setdefault(subject, []).append(idx)
+
+    # sections: every course gets one before any gets a second
+    sections = []
+    counts = {}
+    weights = [w for _, _, w in PATTERNS]
+    for i in range(n_sections):
+        idx = i if i < len(courses) else rnd.randrange(len(courses))
+        subject, cata, _, _ = courses[idx]
+        counts[idx] = counts.get(idx, 0) + 1
+        days, length, _ = rnd.choices(PATTERNS, weights=weights)[0]
+        start = rnd.randrange(8 * 60, 20 * 60 - length, 5)
+        end = start + length
+        sections.append((
+            subject, cata, f'{subject} {cata}-{counts[idx]:03d}', days,
+            f'{start // 60}:{start % 60:02d}', f'{end // 60}:{end % 60:02d}',
+            f'{rnd.choice(BUILDINGS)} {rnd.randint(1, 399)}',
+        ))
+
+    # programs: one major per subject word, each with 40-60 courses drawn
+    # mostly from its own subject and a couple of neighbours
+    programs = []
+    major_courses = []
+    flowsheets = []
+    for p in range(min(n_programs, len(subjects))):
+        home = subjects[p]
+        name = f"{SUBJECT_WORDS[p % len(SUBJECT_WORDS)]} B.S."
+        if p >= len(SUBJECT_WORDS):
+            name = f"{SUBJECT_WORDS[p % len(SUBJECT_WORDS)]} {home} B.S."
+        programs.append((name, 'Major', CY_START, CY_END))
+        pool = [c for c in courses if c[0] == home]
+        for other in rnd.sample(subjects, min(2, len(subjects))):
+            pool += [c for c in courses if c[0] == other][:20]
+        picked = rnd.sample(pool, min(len(pool), rnd.randint(40, 60)))
+        seen = set()
+        for subject, cata, _, _ in picked:
+            if (subject, cata) in seen:
+                continue
+            seen.add((subject, cata))
+            eligible = 'TRUE' if rnd.random() < 0.9 else 'FALSE'
+            major_courses.append((name, 'Major', CY_START, subject, cata, eligible))
+        # flowsheet: the lowest numbered courses, four a semester
+        for i, (subject, cata) in enumerate(sorted(seen, key=lambda k: (int(k[1][:3]), k))[:24]):
+            flowsheets.append((name, 'Major', CY_START, subject, cata, 1 + i // 4))
+
+    return {
+        'programs.csv': (['name', 'program_type', 'start_year', 'end_year'], programs),
+        'courses.csv': (['subject', 'cata_num', 'title', 'credits'], courses),
+        'major_courses.csv': (['program_name', 'program_type', 'start_year', 'subject', 'cata_num',
+                               'eligible_course'], major_courses),
+        'prereqs.csv': (['subject', 'cata_num', 'prereq_subject', 'prereq_cata_num', 'min_grade'], prereqs),
+        'schedule.csv': (['subject', 'cata_num', 'section_code', 'days_pattern', 'start_time', 'end_time',
+                          'location'], sections),
+        'flowsheets.csv': (['program_name', 'program_type', 'start_year', 'subject', 'cata_num', 'semester'],
+                           flowsheets),
+    }
+
+
+def write_csv(path, header, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows(rows)
+
+
+def write_catalog(catalog, out_dir):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, (header, rows) in catalog.items():
+        write_csv(out_dir / name, header, rows)
+        print(f'wrote {out_dir / name} ({len(rows)} rows)')
+
+
+def load_table(con, table, columns, path):
+    cols = ', '.join(columns)
+    con.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM read_csv(?, header=true)", (str(path),))
+
+
+def make_population(con, n_students, rnd, work_dir):
+    # students with a primary major, a transcript, a few current enrollments
+    # and a degree plan; written as CSVs and loaded with duckdb's reader
+    sections = con.execute("""
+        SELECT section_id, course_id FROM section WHERE meet_type <> 'HISTORY' ORDER BY section_id
+    """).fetchall()
+    programs = [r[0] for r in con.execute("SELECT prog_id FROM program ORDER BY prog_id").fetchall()]
+    major = {}
+    for prog_id, course_id in con.execute("""
+        SELECT major_id, course_id FROM major_courses WHERE eligible_course ORDER BY major_id, course_id
+    """).fetchall():
+        major.setdefault(prog_id, []).append(course_id)
+    if not sections or not programs:
+        raise SystemExit('catalog has no sections or programs to enroll students in')
+
+    n_advisors = max(1, n_students // 250)
+    adv_base = int(con.execute("SELECT COALESCE(MAX(adv_id), 0) FROM advisor").fetchone()[0]) + 1
+    advisors = [
+        (adv_base + a, rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES), f'advisor{adv_base + a}@bench.edu')
+        for a in range(n_advisors)
+    ]
+
+    stu_base = int(con.execute("SELECT COALESCE(MAX(stu_id), 0) FROM student").fetchone()[0]) + 1
+    sp_id = int(con.execute("SELECT COALESCE(MAX(sp_id), 0) FROM student_program").fetchone()[0])
+    enroll_id = int(con.execute("SELECT COALESCE(MAX(enroll_id), 0) FROM enrollment").fetchone()[0])
+    plan_id = int(con.execute("SELECT COALESCE(MAX(plan_id), 0) FROM degree_plan").fetchone()[0])
+    pc_id = int(con.execute("SELECT COALESCE(MAX(pc_id), 0) FROM planned_course").fetchone()[0])
+
+    students, student_programs, enrollments, plans, planned = [], [], [], [], []
+    for n in range(n_students):
+        stu_id = stu_base + n
+        login = f'bench{stu_id}'
+        students.append((stu_id, login, rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES),
+                         f'{login}@bench.edu', TERM_ID, rnd.choice(advisors)[0], 1))
+        prog_id = rnd.choice(programs)
+        sp_id += 1
+        student_programs.append((sp_id, stu_id, prog_id, True, TERM_ID))
+
+        taken = rnd.sample(range(len(sections)), rnd.randint(0, 30) + rnd.randint(0, 5))
+        history, current = taken[:-5] or taken, taken[-5:] if len(taken) > 5 else []
+        for i in history:
+            enroll_id += 1
+            enrollments.append((enroll_id, stu_id, sections[i][0], rnd.choice(GRADES), 'COMPLETE', None))
+        for i in current:
+            enroll_id += 1
+            enrollments.append((enroll_id, stu_id, sections[i][0], None, 'ENROLLED', None))
+
+        plan_id += 1
+        plans.append((plan_id, stu_id, 1, '2026-01-01 00:00:00', TERM_ID))
+        options = major.get(prog_id, [])
+        for course_id in rnd.sample(options, min(len(options), rnd.randint(0, 8))):
+            pc_id += 1
+            planned.append((pc_id, TERM_ID, plan_id, None, course_id, None))
+
+    # one to three requirement areas for programs that have none, drawn last
+    # so the rest of the population does not depend on them
+    has_reqs = {r[0] for r in con.execute("SELECT DISTINCT prog_id FROM requirements").fetchall()}
+    req_id = int(con.execute("SELECT COALESCE(MAX(req_id), 0) FROM requirements").fetchone()[0])
+    requirements = []
+    for prog_id in programs:
+        if prog_id in has_reqs:
+            continue
+        for area in ['CORE', 'SUPP', 'ELEC'][:rnd.randint(1, 3)]:
+            req_id += 1
+            requirements.append((req_id, prog_id, area, f'Major {area.title()}', rnd.randrange(29, 56, 3),
+                                 f'{rnd.choice([2.0, 2.0, 2.25, 2.5, 3.0]):.2f}'))
+
+    tables = [
+        ('advisor', ['adv_id', 'f_name', 'l_name', 'email'], advisors),
+        ('student', ['stu_id', 'login_id', 'f_name', 'l_name', 'email', 'expected_grad_term',
+                     'advisor_id', 'catalog_year_id'], students),
+        ('student_program', ['sp_id', 'stu_id', 'prog_id', 'primary_flag', 'start_term'], student_programs),
+        ('enrollment', ['enroll_id', 'stu_id', 'section_id', 'grade', 'status', 'credits_earned'], enrollments),
+        ('degree_plan', ['plan_id', 'stu_id', 'cy_id', 'time_created', 'target_grad_term_id'], plans),
+        ('planned_course', ['pc_id', 'term_id', 'plan_id', 'section_id', 'course_id', 'manual_courses'], planned),
+        ('requirements', ['req_id', 'prog_id', 'area_id', 'name', 'min_credits', 'min_gpa'], requirements),
+    ]
+    con.execute("BEGIN")
+    for table, columns, rows in tables:
+        path = work_dir / f'{table}.csv'
+        write_csv(path, columns, rows)
+        load_table(con, table, columns, path)
+        path.unlink()
+        print(f'{table}: {len(rows)} rows')
+    con.execute("COMMIT")
+
+
+def build_db(catalog, db_path, n_students, rnd):
+    if db_path.exists():
+        db_path.unlink()
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    cat_dir = db_path.with_suffix('.catalog')
+    write_catalog(catalog, cat_dir)
+
+    con = duckdb.connect(str(db_path))
+    try:
+        con.execute((DB_DIR / 'schema.sql').read_text(encoding='utf-8'))
+        con.execute((DB_DIR / 'data.sql').read_text(encoding='utf-8'))
+        ids.ensure_sequences(con)
+
+        import_catalog.CAT = cat_dir
+        started = time.monotonic()
+        import_catalog.run_import(con, bulk=True)
+        print(f'catalog imported in {time.monotonic() - started:.1f}s')
+
+        started = time.monotonic()
+        make_population(con, n_students, rnd, db_path.parent)
+        print(f'population loaded in {time.monotonic() - started:.1f}s')
+        ids.ensure_sequences(con)
+    finally:
+        con.close()
+    print('Created', db_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='generate a synthetic catalog / database for benchmarks')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--courses', type=int, help='override the number of courses')
+    parser.add_argument('--sections', type=int, help='override the number of sections')
+    parser.add_argument('--students', type=int, help='override the number of students')
+    parser.add_argument('--programs', type=int, help='override the number of programs')
+    parser.add_argument('--seed', type=int, default=431)
+    out = parser.add_mutually_exclusive_group(required=True)
+    out.add_argument('--csv-out', type=Path, help='write catalog CSVs to this directory')
+    out.add_argument('--db', type=Path, help='build a complete database at this path')
+    args = parser.parse_args()
+
+    n_courses, n_sections, n_students, n_programs = SCALES[args.scale]
+    n_courses = args.courses or n_courses
+    n_sections = args.sections or n_sections
+    n_students = args.students if args.students is not None else n_students
+    n_programs = args.programs or n_programs
+
+    rnd = random.Random(args.seed)
+    catalog = make_catalog(n_courses, n_sections, n_programs, rnd)
+    if args.csv_out:
+        write_catalog(catalog, args.csv_out)
+    else:
+        build_db(catalog, args.db, n_students, rnd)
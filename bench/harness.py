@@ -0,0 +1,727 @@
+# load harness for every API endpoint
+#
+#   python harness.py run --db out/bench.duckdb --out base.json
+#       in-process (flask test client) against a throwaway copy of the db
+#   python harness.py run --db out/bench.duckdb --url http://127.0.0.1:5000 --out base.json
+#       against a running server; the db is only read (from a copy) to pick ids
+#   python harness.py diff base.json new.json
+#       per-endpoint latency / throughput change, exit 1 on a regression
+#   python harness.py rush --db out/bench.duckdb --students 500
+#       simultaneous enrollments in one section, checking seats and waitlist
+#
+# ids for the requests are sampled from the database with a fixed seed, so
+# two runs against the same generated db send the same requests.
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+import duckdb
+
+BASE = Path(__file__).resolve().parent
+FRONTEND = BASE.parent / 'frontend'
+
+SAMPLE_SIZE = 2000
+
+# routes the harness deliberately leaves alone
+SKIPPED = {
+    ('POST', '/api/admin/import_catalog'): 'rewrites the catalog',
+    ('GET', '/api/admin/slow_queries'): 'diagnostics',
+    ('GET', '/<path:filename>'): 'static files',
+}
+
+
+def sample(db_path, seed):
+    # a read-only copy, so this works while a server holds the db open
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = Path(tmp) / 'sample.duckdb'
+        shutil.copyfile(db_path, copy)
+        con = duckdb.connect(str(copy), read_only=True)
+        try:
+            def rows(sql):
+                return con.execute(f"{sql} ORDER BY hash(1 + {seed}, k) LIMIT {SAMPLE_SIZE}").fetchall()
+            s = {
+                'students': rows("""
+                    SELECT s.stu_id, s.login_id, dp.plan_id, s.advisor_id, s.stu_id AS k
+                    FROM student s JOIN degree_plan dp ON dp.stu_id = s.stu_id
+                """),
+                'courses': rows("SELECT course_id, subject, cata_num, title, course_id AS k FROM course"),
+                'sections': rows("""
+                    SELECT section_id, course_id, term_id, section_id AS k
+                    FROM section WHERE meet_type <> 'HISTORY'
+                """),
+                'graded': rows("""
+                    SELECT enroll_id, stu_id, enroll_id AS k FROM enrollment WHERE grade IS NOT NULL
+                """),
+                'enrolled': rows("""
+                    SELECT stu_id, section_id, enroll_id AS k FROM enrollment WHERE status = 'ENROLLED'
+                """),
+                'waitlisted': rows("SELECT stu_id, section_id, wait_id AS k FROM waitlist"),
+                'planned': rows("SELECT pc_id, plan_id, pc_id AS k FROM planned_course"),
+                'programs': rows("SELECT prog_id, prog_id AS k FROM program"),
+                'terms': rows("SELECT term_id, term_id AS k FROM term"),
+            }
+        finally:
+            con.close()
+    if not s['students'] or not s['courses']:
+        raise SystemExit(f'{db_path} has no students with plans or no courses; generate one with generate.py')
+    return s
+
+
+def search_query(rnd, s):
+    subject, cata, title = rnd.choice(s['courses'])[1:4]
+    word = rnd.choice(title.split() or [subject])
+    return rnd.choice([
+        {'q': word},
+        {'q': word[:3]},
+        {'q': f'{subject} {cata}'},
+        {'q': subject},
+        {'q': word, 'level': rnd.choice(['100', '200', '300', '400'])},
+        {'subject': subject},
+        {'q': word[:1] + word[2:] if len(word) > 4 else word},
+    ])
+
+
+# (method, rule) -> (writes, fn(rnd, sample) -> (path, query, json body))
+SCENARIOS = {}
+
+
+def scenario(method, rule, writes=False):
+    def register(fn):
+        SCENARIOS[(method, rule)] = (writes, fn)
+        return fn
+    return register
+
+
+def student(rnd, s):
+    return rnd.choice(s['students'])
+
+
+def paged(rnd, query):
+    # list endpoints: sometimes a page size other than the default
+    if rnd.random() < 0.3:
+        query['limit'] = rnd.choice([10, 25])
+    return query
+
+
+for page in ('/', '/home', '/plan', '/history'):
+    scenario('GET', page)(lambda rnd, s, page=page: (page, {}, None))
+
+scenario('GET', '/health')(lambda rnd, s: ('/health', {}, None))
+scenario('GET', '/metrics')(lambda rnd, s: ('/metrics', {}, None))
+scenario('GET', '/api/subjects')(lambda rnd, s: ('/api/subjects', {}, None))
+scenario('GET', '/api/programs')(lambda rnd, s: ('/api/programs', {}, None))
+scenario('GET', '/api/advisors')(lambda rnd, s: ('/api/advisors', {}, None))
+scenario('GET', '/api/courses/search')(
+    lambda rnd, s: ('/api/courses/search', paged(rnd, search_query(rnd, s)), None))
+scenario('GET', '/api/signin')(lambda rnd, s: ('/api/signin', {'login_id': student(rnd, s)[1]}, None))
+scenario('GET', '/api/bootstrap')(lambda rnd, s: ('/api/bootstrap', {'login_id': student(rnd, s)[1]}, None))
+scenario('GET', '/api/plan')(lambda rnd, s: ('/api/plan', {'plan_id': student(rnd, s)[2]}, None))
+scenario('GET', '/api/student/major')(lambda rnd, s: ('/api/student/major', {'stu_id': student(rnd, s)[0]}, None))
+scenario('GET', '/api/history')(
+    lambda rnd, s: ('/api/history', paged(rnd, {'stu_id': student(rnd, s)[0]}), None))
+scenario('GET', '/api/history/summary')(
+    lambda rnd, s: ('/api/history/summary', {'stu_id': student(rnd, s)[0]}, None))
+scenario('GET', '/api/final_schedule')(
+    lambda rnd, s: ('/api/final_schedule', paged(rnd, {'stu_id': student(rnd, s)[0]}), None))
+scenario('GET', '/api/time_conflicts')(
+    lambda rnd, s: ('/api/time_conflicts', {'plan_id': student(rnd, s)[2]}, None))
+scenario('GET', '/api/schedule')(
+    lambda rnd, s: ('/api/schedule', paged(rnd, {'plan_id': student(rnd, s)[2]}), None))
+
+
+@scenario('GET', '/api/prereqs_missing')
+def prereqs_missing(rnd, s):
+    return '/api/prereqs_missing', {'stu_id': student(rnd, s)[0], 'course_id': rnd.choice(s['courses'])[0]}, None
+
+
+@scenario('GET', '/api/prereqs/chain')
+def prereq_chain(rnd, s):
+    query = {'course_id': rnd.choice(s['courses'])[0]}
+    if rnd.random() < 0.5:
+        query['stu_id'] = student(rnd, s)[0]
+    return '/api/prereqs/chain', query, None
+
+
+scenario('GET', '/api/prereqs/unlocks')(
+    lambda rnd, s: ('/api/prereqs/unlocks', {'course_id': rnd.choice(s['courses'])[0]}, None))
+scenario('GET', '/api/prereqs/longest_chain')(
+    lambda rnd, s: ('/api/prereqs/longest_chain', {'stu_id': student(rnd, s)[0]}, None))
+
+
+@scenario('GET', '/api/time_conflicts/check')
+def conflicts_check(rnd, s):
+    return '/api/time_conflicts/check', {'plan_id': student(rnd, s)[2],
+                                         'section_id': rnd.choice(s['sections'])[0]}, None
+
+
+@scenario('GET', '/api/time_conflicts/term')
+def conflicts_term(rnd, s):
+    stu = student(rnd, s)
+    query = {'term_id': rnd.choice(s['terms'])[0]}
+    if rnd.random() < 0.5 and stu[3] is not None:
+        query['adv_id'] = stu[3]
+    return '/api/time_conflicts/term', query, None
+
+
+@scenario('GET', '/api/recommendations')
+def recommendations(rnd, s):
+    stu = student(rnd, s)
+    return '/api/recommendations', paged(rnd, {'stu_id': stu[0], 'plan_id': stu[2]}), None
+
+
+scenario('GET', '/api/audit')(lambda rnd, s: ('/api/audit', {'stu_id': student(rnd, s)[0]}, None))
+scenario('GET', '/api/audit/program')(
+    lambda rnd, s: ('/api/audit/program', {'prog_id': rnd.choice(s['programs'])[0]}, None))
+
+
+@scenario('GET', '/api/schedule/generate')
+def generate(rnd, s):
+    return '/api/schedule/generate', {'plan_id': student(rnd, s)[2], 'max_results': 10, 'budget_ms': 500}, None
+
+
+@scenario('POST', '/api/plan/add_course', writes=True)
+def plan_add(rnd, s):
+    stu = student(rnd, s)
+    return '/api/plan/add_course', {}, {'plan_id': stu[2], 'term_id': rnd.choice(s['terms'])[0],
+                                        'course_id': rnd.choice(s['courses'])[0]}
+
+
+@scenario('POST', '/api/plan/remove', writes=True)
+def plan_remove(rnd, s):
+    return '/api/plan/remove', {}, {'pc_id': rnd.choice(s['planned'])[0]} if s['planned'] else {'pc_id': 0}
+
+
+@scenario('POST', '/api/plan/batch', writes=True)
+def plan_batch(rnd, s):
+    stu = student(rnd, s)
+    ops = [{'op': 'add', 'course_id': rnd.choice(s['courses'])[0], 'term_id': rnd.choice(s['terms'])[0]}
+           for _ in range(rnd.randint(1, 8))]
+    ops += [{'op': 'move', 'course_id': op['course_id'], 'term_id': op['term_id']} for op in ops[:2]]
+    return '/api/plan/batch', {}, {'plan_id': stu[2], 'ops': ops}
+
+
+@scenario('POST', '/api/plan/autofill', writes=True)
+def plan_autofill(rnd, s):
+    # mostly layouts only, so repeated runs keep finding courses to place
+    return '/api/plan/autofill', {}, {'plan_id': student(rnd, s)[2], 'max_credits': rnd.choice([12, 15, 18]),
+                                      'dry_run': rnd.random() < 0.8}
+
+
+@scenario('POST', '/api/student/major', writes=True)
+def set_major(rnd, s):
+    return '/api/student/major', {}, {'stu_id': student(rnd, s)[0], 'prog_id': rnd.choice(s['programs'])[0]}
+
+
+@scenario('POST', '/api/history/add_course', writes=True)
+def history_add(rnd, s):
+    return '/api/history/add_course', {}, {'stu_id': student(rnd, s)[0], 'course_id': rnd.choice(s['courses'])[0],
+                                           'grade': rnd.choice(['A', 'B', 'C'])}
+
+
+@scenario('POST', '/api/history/import', writes=True)
+def history_import(rnd, s):
+    # a small transcript batch for a few students, mostly dry runs
+    rows = [{'stu_id': student(rnd, s)[0], 'course_id': rnd.choice(s['courses'])[0],
+             'grade': rnd.choice(['A', 'B', 'C'])} for _ in range(rnd.randint(5, 50))]
+    return '/api/history/import', {'dry_run': int(rnd.random() < 0.5)}, {'rows': rows}
+
+
+@scenario('POST', '/api/admin/recommendations', writes=True)
+def admin_recommendations(rnd, s):
+    return '/api/admin/recommendations', {'prog_id': rnd.choice(s['programs'])[0]}, None
+
+
+@scenario('POST', '/api/history/update_grade', writes=True)
+def history_grade(rnd, s):
+    enroll_id, stu_id = rnd.choice(s['graded'])[:2] if s['graded'] else (0, 0)
+    return '/api/history/update_grade', {}, {'stu_id': stu_id, 'enroll_id': enroll_id,
+                                             'grade': rnd.choice(['A', 'B', 'C'])}
+
+
+@scenario('POST', '/api/history/remove', writes=True)
+def history_remove(rnd, s):
+    enroll_id, stu_id = rnd.choice(s['graded'])[:2] if s['graded'] else (0, 0)
+    return '/api/history/remove', {}, {'stu_id': stu_id, 'enroll_id': enroll_id}
+
+
+@scenario('POST', '/api/final_schedule/remove', writes=True)
+def final_remove(rnd, s):
+    stu_id, section_id = rnd.choice(s['enrolled'])[:2] if s['enrolled'] else (0, 0)
+    return '/api/final_schedule/remove', {}, {'stu_id': stu_id, 'section_id': section_id}
+
+
+@scenario('POST', '/api/enroll', writes=True)
+def enroll(rnd, s):
+    return '/api/enroll', {}, {'stu_id': student(rnd, s)[0], 'section_id': rnd.choice(s['sections'])[0]}
+
+
+scenario('GET', '/api/waitlist')(
+    lambda rnd, s: ('/api/waitlist', {'stu_id': (rnd.choice(s['waitlisted']) if s['waitlisted']
+                                                 else student(rnd, s))[0]}, None))
+
+
+@scenario('POST', '/api/waitlist/remove', writes=True)
+def waitlist_remove(rnd, s):
+    stu_id, section_id = rnd.choice(s['waitlisted'])[:2] if s['waitlisted'] else (0, 0)
+    return '/api/waitlist/remove', {}, {'stu_id': stu_id, 'section_id': section_id}
+
+
+class InProcessClient:
+    # the flask app imported into this process, one test client per thread
+    def __init__(self, db_path):
+        os.environ['COURSE_PLANNER_DB'] = str(db_path)
+        sys.path.insert(0, str(FRONTEND))
+        import app as app_module
+        self.app = app_module.app
+        self._local = threading.local()
+
+    def routes(self):
+        return {
+            (method, rule.rule)
+            for rule in self.app.url_map.iter_rules()
+            for method in rule.methods - {'HEAD', 'OPTIONS'}
+        }
+
+    def request(self, method, path, query, body, raw=False):
+        # raw=True returns the body instead of its size
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        resp = client.open(path, method=method, query_string=query, json=body)
+        data = resp.get_data()
+        resp.close()
+        return resp.status_code, (data if raw else len(data))
+
+
+class HttpClient:
+    # a keep-alive connection per thread to a running server
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self._local = threading.local()
+
+    def routes(self):
+        return None
+
+    def request(self, method, path, query, body, raw=False):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        target = self.prefix + path + ('?' + urlencode(query) if query else '')
+        payload = json.dumps(body) if body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            conn.request(method, target, body=payload, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+            return resp.status, (data if raw else len(data))
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    k = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[k]
+
+
+def summarize(latencies, statuses, failures, elapsed, sizes):
+    latencies = sorted(latencies)
+    count = len(latencies) + failures
+    ms = [v * 1000 for v in latencies]
+    return {
+        'count': count,
+        'errors': failures + sum(n for code, n in statuses.items() if int(code) >= 500),
+        'status': dict(sorted(statuses.items())),
+        'rps': round(count / elapsed, 2) if elapsed else None,
+        'mean_ms': round(sum(ms) / len(ms), 3) if ms else None,
+        'p50_ms': round(percentile(ms, 50), 3) if ms else None,
+        'p95_ms': round(percentile(ms, 95), 3) if ms else None,
+        'p99_ms': round(percentile(ms, 99), 3) if ms else None,
+        'max_ms': round(ms[-1], 3) if ms else None,
+        'mean_bytes': round(sum(sizes) / len(sizes)) if sizes else None,
+    }
+
+
+def run_load(client, keys, s, args):
+    rnd = random.Random(args.seed)
+    # every request is generated up front so runs with the same seed match
+    plan = [key for key in keys for _ in range(args.requests)]
+    rnd.shuffle(plan)
+    plan = [(key, SCENARIOS[key][1](rnd, s)) for key in plan]
+    warmup = [(key, SCENARIOS[key][1](rnd, s)) for key in keys for _ in range(args.warmup)]
+
+    results = {key: {'lat': [], 'status': {}, 'fail': 0, 'size': []} for key in keys}
+    lock = threading.Lock()
+    position = [0]
+    deadline = time.monotonic() + args.duration if args.duration else None
+
+    def send(key, req):
+        path, query, body = req
+        started = time.perf_counter()
+        try:
+            status, size = client.request(key[0], path, query, body)
+        except Exception as e:
+            return None, None, repr(e)
+        return time.perf_counter() - started, (status, size), None
+
+    for key, req in warmup:
+        send(key, req)
+
+    def worker():
+        while True:
+            with lock:
+                i = position[0]
+                position[0] += 1
+            if deadline is None:
+                if i >= len(plan):
+                    return
+            elif time.monotonic() > deadline:
+                return
+            # duration runs keep cycling through the plan
+            key, req = plan[i % len(plan)]
+            elapsed, result, error = send(key, req)
+            with lock:
+                r = results[key]
+                if error is not None:
+                    r['fail'] += 1
+                    if args.verbose:
+                        print(f'{key[0]} {req[0]}: {error}', file=sys.stderr)
+                    continue
+                status, size = result
+                r['lat'].append(elapsed)
+                r['status'][str(status)] = r['status'].get(str(status), 0) + 1
+                r['size'].append(size)
+            if args.verbose and status >= 500:
+                print(f'{key[0]} {req[0]} {req[1]}: {status}', file=sys.stderr)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for f in [pool.submit(worker) for _ in range(args.concurrency)]:
+            f.result()
+    elapsed = time.monotonic() - started
+
+    routes = {
+        f'{method} {rule}': summarize(r['lat'], r['status'], r['fail'], elapsed, r['size'])
+        for (method, rule), r in sorted(results.items())
+    }
+    every = [v for r in results.values() for v in r['lat']]
+    statuses = {}
+    for r in results.values():
+        for code, n in r['status'].items():
+            statuses[code] = statuses.get(code, 0) + n
+    total = summarize(every, statuses, sum(r['fail'] for r in results.values()), elapsed,
+                      [v for r in results.values() for v in r['size']])
+    return routes, total, elapsed
+
+
+def git_rev():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def open_client(args):
+    # (client, temporary directory to clean up or None)
+    if args.url:
+        return HttpClient(args.url), None
+    # writes land in a copy unless asked otherwise
+    tmp = None
+    db_path = args.db
+    if not args.in_place:
+        tmp = tempfile.TemporaryDirectory()
+        db_path = Path(tmp.name) / args.db.name
+        shutil.copyfile(args.db, db_path)
+    return InProcessClient(db_path), tmp
+
+
+def print_routes(rows):
+    print(f"{'route':<42} {'n':>6} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, r in rows:
+        print(f"{name:<42} {r['count']:>6} {r['errors']:>4} {r['rps'] or 0:>8.1f} "
+              f"{r['p50_ms'] or 0:>8.2f} {r['p95_ms'] or 0:>8.2f} {r['p99_ms'] or 0:>8.2f}")
+
+
+def cmd_run(args):
+    s = sample(args.db, args.seed)
+    client, tmp = open_client(args)
+
+    try:
+        keys = [
+            key for key, (writes, _) in sorted(SCENARIOS.items())
+            if (args.writes or not writes) and (not args.routes or re.search(args.routes, f'{key[0]} {key[1]}'))
+        ]
+        if not keys:
+            raise SystemExit('no routes selected')
+
+        served = client.routes()
+        uncovered = sorted(served - set(SCENARIOS) - set(SKIPPED)) if served is not None else []
+        for method, rule in uncovered:
+            print(f'warning: no scenario for {method} {rule}', file=sys.stderr)
+
+        routes, total, elapsed = run_load(client, keys, s, args)
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    result = {
+        'meta': {
+            'git': git_rev(),
+            'target': args.url or 'in-process',
+            'db': str(args.db),
+            'seed': args.seed,
+            'concurrency': args.concurrency,
+            'requests_per_route': args.requests,
+            'duration': args.duration,
+            'writes': args.writes,
+            'elapsed_s': round(elapsed, 3),
+            'uncovered': [f'{m} {r}' for m, r in uncovered],
+        },
+        'total': total,
+        'routes': routes,
+    }
+
+    print_routes(list(routes.items()) + [('total', total)])
+    if args.out:
+        args.out.write_text(json.dumps(result, indent=2), encoding='utf-8')
+        print('wrote', args.out)
+
+
+def rush_sample(db_path, seed, section_id, n_students):
+    # the section, its seats and waitlist, and students with no row in it
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = Path(tmp) / 'sample.duckdb'
+        shutil.copyfile(db_path, copy)
+        con = duckdb.connect(str(copy), read_only=True)
+        try:
+            if section_id is None:
+                found = con.execute(f"""
+                    SELECT section_id FROM section WHERE meet_type <> 'HISTORY'
+                    ORDER BY hash(1 + {seed}, section_id) LIMIT 1
+                """).fetchone()
+                if found is None:
+                    raise SystemExit(f'{db_path} has no sections')
+                section_id = found[0]
+            found = con.execute("SELECT capacity FROM section WHERE section_id = ?", (section_id,)).fetchone()
+            if found is None:
+                raise SystemExit(f'no section {section_id}')
+            seated = con.execute("""
+                SELECT COUNT(*) FROM enrollment WHERE section_id = ? AND status = 'ENROLLED'
+            """, (section_id,)).fetchone()[0]
+            waiting = [r[0] for r in con.execute("""
+                SELECT stu_id FROM waitlist WHERE section_id = ? ORDER BY position
+            """, (section_id,)).fetchall()]
+            students = [r[0] for r in con.execute(f"""
+                SELECT stu_id FROM student s
+                WHERE NOT EXISTS (SELECT 1 FROM enrollment e WHERE e.stu_id = s.stu_id AND e.section_id = ?)
+                  AND NOT EXISTS (SELECT 1 FROM waitlist w WHERE w.stu_id = s.stu_id AND w.section_id = ?)
+                ORDER BY hash(1 + {seed}, stu_id) LIMIT {int(n_students)}
+            """, (section_id, section_id)).fetchall()]
+        finally:
+            con.close()
+    return section_id, found[0], seated, waiting, students
+
+
+def cmd_rush(args):
+    """
+    Registration rush on one section: every student asks for a seat at
+    once, then --drops of the seats just taken are given up. Checks that the
+    section fills exactly to capacity, that places in line are handed out
+    once each and in order, and that each drop promotes the head of the
+    line; exits 1 when one of them fails.
+    """
+    section_id, capacity, seated, waiting, students = rush_sample(
+        args.db, args.seed, args.section, args.students)
+    # seats already free go to the waitlist the first time the section is used
+    free = max(0, capacity - seated)
+    ahead = waiting[min(len(waiting), free):]
+    free -= len(waiting) - len(ahead)
+    print(f'section {section_id}: capacity {capacity}, {seated} seated, {len(waiting)} waiting, '
+          f'{len(students)} students')
+
+    client, tmp = open_client(args)
+    failed = []
+
+    def burst(method, path, bodies):
+        # every request at once; (latencies, statuses, failures, elapsed, responses)
+        gate = threading.Barrier(min(args.concurrency, len(bodies)) or 1)
+        queue = list(enumerate(bodies))
+        lock = threading.Lock()
+        out = [None] * len(bodies)
+        lat, statuses, failures = [], {}, [0]
+
+        def worker():
+            gate.wait()
+            while True:
+                with lock:
+                    if not queue:
+                        return
+                    i, body = queue.pop(0)
+                started = time.perf_counter()
+                try:
+                    status, data = client.request(method, path, {}, body, raw=True)
+                except Exception as e:
+                    with lock:
+                        failures[0] += 1
+                    if args.verbose:
+                        print(f'{method} {path}: {e!r}', file=sys.stderr)
+                    continue
+                elapsed = time.perf_counter() - started
+                with lock:
+                    lat.append(elapsed)
+                    statuses[str(status)] = statuses.get(str(status), 0) + 1
+                    out[i] = (status, json.loads(data or b'{}'))
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=gate.parties) as pool:
+            for f in [pool.submit(worker) for _ in range(gate.parties)]:
+                f.result()
+        return lat, statuses, failures[0], time.monotonic() - started, out
+
+    try:
+        lat, statuses, failures, elapsed, out = burst(
+            'POST', '/api/enroll', [{'stu_id': stu_id, 'section_id': section_id} for stu_id in students])
+        routes = [('POST /api/enroll', summarize(lat, statuses, failures, elapsed, []))]
+
+        enrolled = [stu_id for stu_id, r in zip(students, out) if r and r[1].get('status') == 'ENROLLED']
+        waitlisted = sorted((r[1]['position'], stu_id) for stu_id, r in zip(students, out)
+                            if r and r[1].get('status') == 'WAITLISTED')
+        want = min(free, len(students))
+        print(f'{len(enrolled)} enrolled, {len(waitlisted)} waitlisted')
+        if len(enrolled) != want:
+            failed.append(f'{len(enrolled)} enrolled, {want} seats were free')
+        if len(enrolled) + len(waitlisted) != len(students):
+            failed.append(f'{len(students) - len(enrolled) - len(waitlisted)} requests neither enrolled nor waitlisted')
+        places = [p for p, _ in waitlisted]
+        if places != list(range(len(ahead) + 1, len(ahead) + len(waitlisted) + 1)):
+            failed.append(f'waitlist places are not {len(ahead) + 1}..{len(ahead) + len(waitlisted)}')
+
+        drops = enrolled[:args.drops]
+        if drops:
+            lat, statuses, failures, elapsed, out = burst(
+                'POST', '/api/final_schedule/remove', [{'stu_id': stu_id, 'section_id': section_id}
+                                                       for stu_id in drops])
+            routes.append(('POST /api/final_schedule/remove', summarize(lat, statuses, failures, elapsed, [])))
+            promoted = [stu_id for r in out if r for stu_id in r[1].get('promoted', [])]
+            line = ahead + [stu_id for _, stu_id in waitlisted]
+            print(f'{len(drops)} dropped, {len(promoted)} promoted')
+            if sorted(promoted) != sorted(line[:len(drops)]):
+                failed.append('the students promoted are not the head of the waitlist')
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    print_routes(routes)
+    for route, r in routes:
+        if r['errors']:
+            failed.append(f"{r['errors']} errors on {route}")
+    if args.out:
+        args.out.write_text(json.dumps({
+            'meta': {'git': git_rev(), 'target': args.url or 'in-process', 'db': str(args.db),
+                     'section_id': section_id, 'capacity': capacity, 'students': len(students),
+                     'concurrency': args.concurrency, 'failed': failed},
+            'routes': dict(routes),
+        }, indent=2), encoding='utf-8')
+        print('wrote', args.out)
+    for f in failed:
+        print('FAILED:', f)
+    if failed:
+        sys.exit(1)
+
+
+def change(old, new):
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def cmd_diff(args):
+    old = json.loads(args.old.read_text(encoding='utf-8'))
+    new = json.loads(args.new.read_text(encoding='utf-8'))
+    metric = f'{args.metric}_ms'
+    regressions = []
+
+    print(f"{'route':<42} {'old ' + args.metric:>10} {'new ' + args.metric:>10} {'change':>8} "
+          f"{'old rps':>9} {'new rps':>9}")
+    for name in sorted(set(old['routes']) | set(new['routes'])):
+        a, b = old['routes'].get(name), new['routes'].get(name)
+        if a is None or b is None:
+            print(f"{name:<42} {'only in ' + ('new' if a is None else 'old'):>10}")
+            continue
+        pct = change(a[metric], b[metric])
+        flag = ''
+        slower = (pct is not None and pct > args.threshold
+                  and b[metric] - a[metric] > args.min_ms)
+        more_errors = b['errors'] / max(b['count'], 1) > a['errors'] / max(a['count'], 1)
+        if slower or more_errors:
+            flag = ' REGRESSION' if slower else ' MORE ERRORS'
+            regressions.append(name)
+        print(f"{name:<42} {a[metric] or 0:>10.2f} {b[metric] or 0:>10.2f} "
+              f"{(f'{pct:+.1f}%' if pct is not None else '-'):>8} {a['rps'] or 0:>9.1f} {b['rps'] or 0:>9.1f}{flag}")
+
+    if regressions:
+        print(f'{len(regressions)} regression(s) over {args.threshold}% / {args.min_ms}ms on {args.metric}')
+        sys.exit(1)
+    print('no regressions')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='load harness for the course planner API')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='send load and record per-route latency')
+    run.add_argument('--db', type=Path, required=True, help='database to sample ids from (and serve in-process)')
+    run.add_argument('--url', help='base url of a running server; in-process when omitted')
+    run.add_argument('--in-place', action='store_true', help='serve the db itself instead of a copy')
+    run.add_argument('--requests', type=int, default=50, help='requests per route')
+    run.add_argument('--duration', type=float, help='run for this many seconds instead')
+    run.add_argument('--warmup', type=int, default=2, help='untimed requests per route first')
+    run.add_argument('--concurrency', type=int, default=8)
+    run.add_argument('--routes', help='regex on "METHOD /rule" to select routes')
+    run.add_argument('--writes', action='store_true', help='include endpoints that modify data')
+    run.add_argument('--seed', type=int, default=431)
+    run.add_argument('--out', type=Path, help='write results as json')
+    run.add_argument('--verbose', action='store_true', help='print failed and 5xx requests')
+    run.set_defaults(func=cmd_run)
+
+    rush = sub.add_parser('rush', help='simultaneous enrollments in one section, with correctness checks')
+    rush.add_argument('--db', type=Path, required=True, help='database to sample ids from (and serve in-process)')
+    rush.add_argument('--url', help='base url of a running server; in-process when omitted')
+    rush.add_argument('--in-place', action='store_true', help='serve the db itself instead of a copy')
+    rush.add_argument('--section', type=int, help='section_id to enroll in (default one sampled with --seed)')
+    rush.add_argument('--students', type=int, default=500, help='students asking for a seat')
+    rush.add_argument('--drops', type=int, default=10, help='new seats given up afterwards')
+    rush.add_argument('--concurrency', type=int, default=32)
+    rush.add_argument('--seed', type=int, default=431)
+    rush.add_argument('--out', type=Path, help='write results as json')
+    rush.add_argument('--verbose', action='store_true', help='print failed requests')
+    rush.set_defaults(func=cmd_rush)
+
+    diff = sub.add_parser('diff', help='compare two result files')
+    diff.add_argument('old', type=Path)
+    diff.add_argument('new', type=Path)
+    diff.add_argument('--metric', choices=['p50', 'p95', 'p99', 'mean'], default='p95')
+    diff.add_argument('--threshold', type=float, default=15.0, help='percent slowdown that counts')
+    diff.add_argument('--min-ms', type=float, default=1.0, help='ignore slowdowns smaller than this')
+    diff.set_defaults(func=cmd_diff)
+
+    args = parser.parse_args()
+    args.func(args)
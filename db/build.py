@@ -1,10 +1,27 @@
+import argparse
 import duckdb
 import pathlib
 
+import ids
+import import_catalog
+
 BASE = pathlib.Path(__file__).resolve().parent
 
 db_path = BASE / 'course_planner.duckdb'
 
+parser = argparse.ArgumentParser(description='build the course planner database')
+parser.add_argument('--refresh', action='store_true',
+                    help='keep the existing database and apply catalog changes incrementally')
+args = parser.parse_args()
+
+if args.refresh and db_path.exists():
+    con = duckdb.connect(str(db_path))
+    try:
+        import_catalog.run_import(con, incremental=True)
+    finally:
+        con.close()
+    raise SystemExit(0)
+
 if db_path.exists():
     db_path.unlink()
 
@@ -15,6 +32,9 @@ verify_sql = (BASE / 'verify.sql').read_text(encoding='utf-8')
 con = duckdb.connect(str(db_path))
 con.execute(schema_sql)
 con.execute(seeds_sql)
+# seeds use explicit ids, start the id sequences after them
+ids.ensure_sequences(con)
+import_catalog.fill_cata_numbers(con)
 
 print('Tables:')
 for row in con.execute('SHOW TABLES').fetchall():
@@ -0,0 +1,75 @@
+# id allocation backed by one duckdb sequence per table
+#
+# nextval() is atomic across every connection to the database, so inserts no
+# longer race on SELECT COALESCE(MAX(id),0)+1. duckdb lets only one process
+# open the file read-write, so the sequence is the single source of ids for
+# all threads of whichever process holds it.
+
+# table -> (id column, sequence)
+ID_SEQUENCES = {
+    'catalog_year':    ('cy_id',           'seq_catalog_year'),
+    'term':            ('term_id',         'seq_term'),
+    'program':         ('prog_id',         'seq_program'),
+    'student':         ('stu_id',          'seq_student'),
+    'course':          ('course_id',       'seq_course'),
+    'section':         ('section_id',      'seq_section'),
+    'meeting':         ('meeting_id',      'seq_meeting'),
+    'enrollment':      ('enroll_id',       'seq_enrollment'),
+    'student_program': ('sp_id',           'seq_student_program'),
+    'major_courses':   ('major_course_id', 'seq_major_courses'),
+    'degree_plan':     ('plan_id',         'seq_degree_plan'),
+    'planned_course':  ('pc_id',           'seq_planned_course'),
+    'course_prereq':   ('cp_id',           'seq_course_prereq'),
+    'waitlist':        ('wait_id',         'seq_waitlist'),
+}
+
+
+def seq(table):
+    return ID_SEQUENCES[table][1]
+
+
+def nextval_sql(table):
+    # for use inside INSERT ... VALUES / SELECT
+    return f"nextval('{seq(table)}')"
+
+
+def next_id(con, table):
+    return int(con.execute(f"SELECT {nextval_sql(table)}").fetchone()[0])
+
+
+def ensure_sequences(con):
+    """
+    Migration for new and existing databases: create any missing sequence and
+    move any sequence that is behind its table (e.g. after seeding explicit
+    ids) to MAX(id)+1. Run it while nothing else is writing.
+    """
+    existing = {
+        name: last if last is not None else start - 1
+        for name, start, last in con.execute(
+            "SELECT sequence_name, start_value, last_value FROM duckdb_sequences()"
+        ).fetchall()
+    }
+    changed = []
+    for table, (col, name) in ID_SEQUENCES.items():
+        max_id = con.execute(f"SELECT COALESCE(MAX({col}),0) FROM {table}").fetchone()[0]
+        if name in existing and existing[name] >= max_id:
+            continue
+        con.execute(f"DROP SEQUENCE IF EXISTS {name}")
+        con.execute(f"CREATE SEQUENCE {name} START WITH {int(max_id) + 1}")
+        changed.append((name, int(max_id) + 1))
+    return changed
+
+
+if __name__ == '__main__':
+    import duckdb
+    from pathlib import Path
+
+    DB = str((Path(__file__).resolve().parent / 'course_planner.duckdb'))
+    print('DB:', DB)
+    con = duckdb.connect(DB)
+    try:
+        for name, start in ensure_sequences(con):
+            print(f'{name} -> starts at {start}')
+        print('Sequences up to date')
+    finally:
+        con.close()
@@ -1,9 +1,13 @@
 # import catalog CSVs into database
+import argparse
 import csv
+import hashlib
 from pathlib import Path
 import duckdb
 from datetime import datetime
 
+import ids
+
 BASE = Path(__file__).resolve().parent
 
 DAY_MAP = {
@@ -17,7 +21,9 @@ DAY_MAP = {
 }
 DB = str((BASE.parent/'db' / 'course_planner.duckdb').resolve())
 CAT = BASE / 'catalog'
-con = duckdb.connect(DB)
+
+# set by run_import, so the server can run an import on its own connection
+con = None
 
 def fetch_dict(sql, params=()):
     cur = con.execute(sql, params)
@@ -28,9 +34,8 @@ def exec_sql(sql, params=()):
     con.execute(sql, params)
 
 
-def next_id(table, col):
-    row = fetch_dict(f"SELECT COALESCE(MAX({col}),0)+1 AS nid FROM {table}")[0]
-    return int(row['nid'])
+def next_id(table):
+    return ids.next_id(con, table)
 
 def ensure_catalog_year(start_year, end_year):
     row = fetch_dict(
@@ -39,7 +44,7 @@ def ensure_catalog_year(start_year, end_year):
     )
     if row:
         return int(row[0]['cy_id'])
-    cy_id = next_id('catalog_year','cy_id')
+    cy_id = next_id('catalog_year')
     exec_sql(
         "INSERT INTO catalog_year (cy_id, start_year, end_year) VALUES (?,?,?)",
         (cy_id, start_year, end_year)
@@ -53,7 +58,7 @@ def upsert_program(name, program_type, cy_id):
     )
     if row:
         return int(row[0]['prog_id'])
-    prog_id = next_id('program','prog_id')
+    prog_id = next_id('program')
     exec_sql(
         "INSERT INTO program (prog_id, catalog_year_id, name, program_type) VALUES (?,?,?,?)",
         (prog_id, cy_id, name, program_type)
@@ -71,7 +76,7 @@ def upsert_course(subject, cata_num, title, credits_str):
         exec_sql("UPDATE course SET title = ?, credits = ? WHERE course_id = ?",
                  (title, str(credits_str), course_id))
         return course_id
-    course_id = next_id('course','course_id')
+    course_id = next_id('course')
     exec_sql(
         "INSERT INTO course (course_id, title, subject, cata_num, credits) VALUES (?,?,?,?,?)",
         (course_id, title, subject, cata_num, str(credits_str))
@@ -85,7 +90,7 @@ def ensure_major_course(prog_id, course_id, eligible):
     )
     if row:
         return
-    mc_id = next_id('major_courses','major_course_id')
+    mc_id = next_id('major_courses')
     exec_sql(
         "INSERT INTO major_courses (major_course_id, major_id, course_id, eligible_course) VALUES (?,?,?,?)",
         (mc_id, prog_id, course_id, bool(str(eligible).upper() == 'TRUE'))
@@ -98,7 +103,7 @@ def ensure_prereq(course_id, prereq_course_id, min_grade):
     )
     if row:
         return
-    cp_id = next_id('course_prereq','cp_id')
+    cp_id = next_id('course_prereq')
     exec_sql(
         "INSERT INTO course_prereq (cp_id, prereq_course_id, course_id, min_grade) VALUES (?,?,?,?)",
         (cp_id, prereq_course_id, course_id, int(min_grade) if str(min_grade).isdigit() else None)
@@ -195,12 +200,6 @@ def load_schedule(course_map):
 
     term_id = 8
 
-    # starting IDs
-    sec_row = fetch_dict("SELECT COALESCE(MAX(section_id),0) AS max_id FROM section")[0]
-    meet_row = fetch_dict("SELECT COALESCE(MAX(meeting_id),0) AS max_id FROM meeting")[0]
-    next_section_id = int(sec_row['max_id']) + 1
-    next_meeting_id = int(meet_row['max_id']) + 1
-
     with path.open(newline='', encoding='utf-8') as f:
         for row in csv.DictReader(f):
             subj         = row['subject'].strip()
@@ -218,8 +217,7 @@ def load_schedule(course_map):
                 continue
 
             # insert section
-            section_id = next_section_id
-            next_section_id += 1
+            section_id = next_id('section')
 
             exec_sql("""
                 INSERT INTO section (section_id, class_num, capacity, campus, meet_type, term_id, course_id)
@@ -235,8 +233,7 @@ def load_schedule(course_map):
                     print(f"  !! unknown day '{ch}' in pattern '{days_pattern}', skipping")
                     continue
 
-                meeting_id = next_meeting_id
-                next_meeting_id += 1
+                meeting_id = next_id('meeting')
 
                 exec_sql("""
                     INSERT INTO meeting (meeting_id, location, section_id, start_time, end_time, days_of_week)
@@ -246,24 +243,735 @@ def load_schedule(course_map):
 
                 print(f"  added meeting {ch} {start_time}-{end_time} at {location} (meeting_id={meeting_id})")
 
-if __name__ == '__main__':
-    print('DB:', DB)
+# bulk mode: stage each CSV with duckdb's csv reader, resolve ids with joins
+# and write with set-based SQL. same skip reporting as the row loaders, but
+# one statement per step instead of several per row.
+
+def stage_csv(name, table, columns):
+    path = CAT / name
+    if not path.exists():
+        print(f'skip {name} (not found)')
+        return False
+    print(f'loading {name} (bulk)')
+    cols = ', '.join(f"TRIM(COALESCE({c}, '')) AS {c}" for c in columns)
+    exec_sql(f"""
+        CREATE OR REPLACE TEMP TABLE {table} AS
+        SELECT row_number() OVER () AS line, {cols}
+        FROM read_csv(?, header=true, all_varchar=true)
+    """, (str(path),))
+    return True
+
+# first value of a query, or the row count duckdb returns for INSERT/UPDATE
+def count(sql, params=()):
+    return int(con.execute(sql, params).fetchone()[0])
+
+# per table change counts, summarized by incremental mode
+changes = {}
+
+def note(table, kind, n):
+    counts = changes.setdefault(table, {'insert': 0, 'update': 0, 'delete': 0, 'kept': 0})
+    counts[kind] += n
+
+def bulk_load_programs():
+    exec_sql("CREATE OR REPLACE TEMP TABLE prog_map (name VARCHAR, program_type VARCHAR, start_year INT, prog_id INT)")
+    if not stage_csv('programs.csv', 'stg_programs', ['name', 'program_type', 'start_year', 'end_year']):
+        return
+
+    new_years = count(f"""
+        INSERT INTO catalog_year (cy_id, start_year, end_year)
+        SELECT {ids.nextval_sql('catalog_year')}, sy, ey
+        FROM (SELECT DISTINCT CAST(start_year AS INT) AS sy, CAST(end_year AS INT) AS ey FROM stg_programs) y
+        WHERE NOT EXISTS (
+            SELECT 1 FROM catalog_year cy WHERE cy.start_year = y.sy AND cy.end_year = y.ey
+        )
+    """)
+
+    exec_sql("""
+        CREATE OR REPLACE TEMP TABLE stg_programs_resolved AS
+        SELECT DISTINCT p.name, p.program_type, CAST(p.start_year AS INT) AS start_year, cy.cy_id
+        FROM stg_programs p
+        JOIN catalog_year cy
+          ON cy.start_year = CAST(p.start_year AS INT) AND cy.end_year = CAST(p.end_year AS INT)
+    """)
+    new_progs = count(f"""
+        INSERT INTO program (prog_id, catalog_year_id, name, program_type)
+        SELECT {ids.nextval_sql('program')}, r.cy_id, r.name, r.program_type
+        FROM (SELECT DISTINCT cy_id, name, program_type FROM stg_programs_resolved) r
+        WHERE NOT EXISTS (
+            SELECT 1 FROM program p
+            WHERE p.name = r.name AND p.program_type = r.program_type AND p.catalog_year_id = r.cy_id
+        )
+    """)
+
+    exec_sql("""
+        INSERT INTO prog_map
+        SELECT r.name, r.program_type, r.start_year, p.prog_id
+        FROM stg_programs_resolved r
+        JOIN program p
+          ON p.name = r.name AND p.program_type = r.program_type AND p.catalog_year_id = r.cy_id
+    """)
+    note('catalog_year', 'insert', new_years)
+    note('program', 'insert', new_progs)
+    print(f' catalog years added {new_years}, programs added {new_progs}')
+
+def bulk_load_courses():
+    exec_sql("CREATE OR REPLACE TEMP TABLE course_map (subject VARCHAR, cata_num VARCHAR, course_id INT)")
+    if not stage_csv('courses.csv', 'stg_courses', ['subject', 'cata_num', 'title', 'credits']):
+        return
+
+    # a key listed twice keeps its last row, like the row loader
+    exec_sql("""
+        CREATE OR REPLACE TEMP TABLE stg_courses_last AS
+        SELECT * FROM stg_courses
+        QUALIFY row_number() OVER (PARTITION BY subject, cata_num ORDER BY line DESC) = 1
+    """)
+
+    updated = count("""
+        UPDATE course SET title = s.title, credits = s.credits
+        FROM stg_courses_last s
+        WHERE course.subject = s.subject AND course.cata_num = s.cata_num
+          AND (course.title <> s.title OR course.credits <> s.credits)
+    """)
+    inserted = count(f"""
+        INSERT INTO course (course_id, title, subject, cata_num, credits)
+        SELECT {ids.nextval_sql('course')}, title, subject, cata_num, credits
+        FROM (
+            SELECT * FROM stg_courses_last s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM course c WHERE c.subject = s.subject AND c.cata_num = s.cata_num
+            )
+            ORDER BY s.line
+        )
+    """)
+
+    exec_sql("""
+        INSERT INTO course_map
+        SELECT s.subject, s.cata_num, c.course_id
+        FROM stg_courses_last s
+        JOIN course c ON c.subject = s.subject AND c.cata_num = s.cata_num
+    """)
+    note('course', 'insert', inserted)
+    note('course', 'update', updated)
+    print(f' courses added {inserted}, updated {updated}')
+
+def bulk_load_major_courses():
+    if not stage_csv('major_courses.csv', 'stg_major_courses',
+                     ['program_name', 'program_type', 'start_year', 'subject', 'cata_num', 'eligible_course']):
+        return
+
+    exec_sql("""
+        CREATE OR REPLACE TEMP TABLE stg_major_resolved AS
+        SELECT m.line, m.program_name, m.program_type, m.start_year, m.subject, m.cata_num,
+               UPPER(m.eligible_course) = 'TRUE' AS eligible, pm.prog_id, cm.course_id
+        FROM stg_major_courses m
+        LEFT JOIN prog_map pm
+          ON pm.name = m.program_name AND pm.program_type = m.program_type
+         AND pm.start_year = TRY_CAST(m.start_year AS INT)
+        LEFT JOIN course_map cm ON cm.subject = m.subject AND cm.cata_num = m.cata_num
+    """)
+    for r in fetch_dict("""
+        SELECT * FROM stg_major_resolved
+        WHERE prog_id IS NULL OR course_id IS NULL
+        ORDER BY line
+    """):
+        print(f"skip major_courses row, missing ids: {(r['program_name'], r['program_type'], int(r['start_year']))} -> {r['prog_id']}, {(r['subject'], r['cata_num'])} -> {r['course_id']}")
+
+    # existing links are left alone and the first row per link wins
+    inserted = count(f"""
+        INSERT INTO major_courses (major_course_id, major_id, course_id, eligible_course)
+        SELECT {ids.nextval_sql('major_courses')}, prog_id, course_id, eligible
+        FROM (
+            SELECT * FROM stg_major_resolved r
+            WHERE prog_id IS NOT NULL AND course_id IS NOT NULL
+              AND NOT EXISTS (
+                SELECT 1 FROM major_courses mc WHERE mc.major_id = r.prog_id AND mc.course_id = r.course_id
+              )
+            QUALIFY row_number() OVER (PARTITION BY prog_id, course_id ORDER BY line) = 1
+            ORDER BY line
+        )
+    """)
+    note('major_courses', 'insert', inserted)
+    print(f' major courses added {inserted}')
+
+def bulk_load_prereqs():
+    if not stage_csv('prereqs.csv', 'stg_prereqs',
+                     ['subject', 'cata_num', 'prereq_subject', 'prereq_cata_num', 'min_grade']):
+        return
+
+    exec_sql("""
+        CREATE OR REPLACE TEMP TABLE stg_prereqs_resolved AS
+        SELECT p.line, p.subject, p.cata_num, p.prereq_subject, p.prereq_cata_num,
+               CASE WHEN regexp_full_match(p.min_grade, '[0-9]+') THEN CAST(p.min_grade AS INT) END AS min_grade,
+               c.course_id, pc.course_id AS prereq_course_id
+        FROM stg_prereqs p
+        LEFT JOIN course_map c ON c.subject = p.subject AND c.cata_num = p.cata_num
+        LEFT JOIN course_map pc ON pc.subject = p.prereq_subject AND pc.cata_num = p.prereq_cata_num
+    """)
+    for r in fetch_dict("""
+        SELECT * FROM stg_prereqs_resolved
+        WHERE course_id IS NULL OR prereq_course_id IS NULL
+        ORDER BY line
+    """):
+        print(f"skip prereq row, missing ids: {(r['subject'], r['cata_num'])} or {(r['prereq_subject'], r['prereq_cata_num'])}")
+
+    inserted = count(f"""
+        INSERT INTO course_prereq (cp_id, prereq_course_id, course_id, min_grade)
+        SELECT {ids.nextval_sql('course_prereq')}, prereq_course_id, course_id, min_grade
+        FROM (
+            SELECT * FROM stg_prereqs_resolved r
+            WHERE course_id IS NOT NULL AND prereq_course_id IS NOT NULL
+              AND NOT EXISTS (
+                SELECT 1 FROM course_prereq cp
+                WHERE cp.course_id = r.course_id AND cp.prereq_course_id = r.prereq_course_id
+              )
+            QUALIFY row_number() OVER (PARTITION BY course_id, prereq_course_id ORDER BY line) = 1
+            ORDER BY line
+        )
+    """)
+    note('course_prereq', 'insert', inserted)
+    print(f' prereqs added {inserted}')
+
+# one row per day letter in days_pattern (e.g., 'MWF' -> three rows); letters
+# not in DAY_MAP get a NULL day_num so callers can report them
+def expand_days(source, target):
+    day_values = ', '.join(f"('{ch}', {n})" for ch, n in DAY_MAP.items())
+    exec_sql(f"""
+        CREATE OR REPLACE TEMP TABLE {target} AS
+        SELECT d.*, dm.day_num
+        FROM (
+            SELECT section_id, line, UPPER(days_pattern) AS days_pattern, location, start_time, end_time,
+                   unnest(string_split(UPPER(days_pattern), '')) AS ch,
+                   generate_subscripts(string_split(UPPER(days_pattern), ''), 1) AS pos
+            FROM {source}
+        ) d
+        LEFT JOIN (VALUES {day_values}) dm(ch, day_num) ON dm.ch = d.ch
+        WHERE d.ch <> ''
+    """)
+
+def bulk_load_schedule(report_existing=True):
+    if not stage_csv('schedule.csv', 'stg_schedule',
+                     ['subject', 'cata_num', 'section_code', 'days_pattern', 'start_time', 'end_time', 'location']):
+        return
+
+    term_id = 8
+
+    for r in fetch_dict("""
+        SELECT s.subject, s.cata_num
+        FROM stg_schedule s
+        LEFT JOIN course_map cm ON cm.subject = s.subject AND cm.cata_num = s.cata_num
+        WHERE cm.course_id IS NULL
+        ORDER BY s.line
+    """):
+        print(f"skip schedule row, no course found for {r['subject']} {r['cata_num']}")
+
+    # sections already in the database (earlier imports) are kept as they are
+    existing = count("""
+        SELECT COUNT(*)
+        FROM stg_schedule s
+        JOIN course_map cm ON cm.subject = s.subject AND cm.cata_num = s.cata_num
+        WHERE EXISTS (SELECT 1 FROM section sec WHERE sec.class_num = s.section_code)
+    """)
+    if existing and report_existing:
+        print(f"skip {existing} schedule rows, sections already exist")
+
+    exec_sql(f"""
+        CREATE OR REPLACE TEMP TABLE new_sections AS
+        SELECT {ids.nextval_sql('section')} AS section_id, *
+        FROM (
+            SELECT s.*, cm.course_id
+            FROM stg_schedule s
+            JOIN course_map cm ON cm.subject = s.subject AND cm.cata_num = s.cata_num
+            WHERE NOT EXISTS (SELECT 1 FROM section sec WHERE sec.class_num = s.section_code)
+            QUALIFY row_number() OVER (PARTITION BY s.section_code ORDER BY s.line) = 1
+            ORDER BY s.line
+        )
+    """)
+    exec_sql("""
+        INSERT INTO section (section_id, class_num, capacity, campus, meet_type, term_id, course_id)
+        SELECT section_id, section_code, 60, 'UP', 'IN_PERSON', ?, course_id
+        FROM new_sections
+    """, (term_id,))
+
+    expand_days('new_sections', 'new_meeting_days')
+    for r in fetch_dict("SELECT ch, days_pattern FROM new_meeting_days WHERE day_num IS NULL ORDER BY line, pos"):
+        print(f"  !! unknown day '{r['ch']}' in pattern '{r['days_pattern']}', skipping")
+
+    exec_sql(f"""
+        INSERT INTO meeting (meeting_id, location, section_id, start_time, end_time, days_of_week)
+        SELECT {ids.nextval_sql('meeting')}, location, section_id, start_time, end_time, day_num
+        FROM (SELECT * FROM new_meeting_days WHERE day_num IS NOT NULL ORDER BY line, pos)
+    """)
+    new_secs = count('SELECT COUNT(*) FROM new_sections')
+    new_meets = count('SELECT COUNT(*) FROM new_meeting_days WHERE day_num IS NOT NULL')
+    note('section', 'insert', new_secs)
+    note('meeting', 'insert', new_meets)
+    print(f" sections added {new_secs}, meetings added {new_meets}")
+
+# flowsheets are replaced by the file in every mode: rows it no longer lists
+# are removed, and a program's priorities follow the order of its rows
+def load_flowsheets():
+    if not stage_csv('flowsheets.csv', 'stg_flowsheets',
+                     ['program_name', 'program_type', 'start_year', 'subject', 'cata_num', 'semester']):
+        return
+
+    exec_sql("""
+        CREATE OR REPLACE TEMP TABLE stg_flowsheets_resolved AS
+        SELECT f.line, f.program_name, f.program_type, f.start_year, f.subject, f.cata_num,
+               TRY_CAST(f.semester AS INT) AS semester, p.prog_id, c.course_id
+        FROM stg_flowsheets f
+        LEFT JOIN (
+            SELECT p.prog_id, p.name, p.program_type, cy.start_year
+            FROM program p JOIN catalog_year cy ON cy.cy_id = p.catalog_year_id
+        ) p ON p.name = f.program_name AND p.program_type = f.program_type
+           AND p.start_year = TRY_CAST(f.start_year AS INT)
+        LEFT JOIN course c ON c.subject = f.subject AND c.cata_num = f.cata_num
+        QUALIFY row_number() OVER (PARTITION BY f.line ORDER BY p.prog_id) = 1
+    """)
+    for r in fetch_dict("""
+        SELECT * FROM stg_flowsheets_resolved
+        WHERE prog_id IS NULL OR course_id IS NULL OR COALESCE(semester, 0) < 1
+        ORDER BY line
+    """):
+        print(f"skip flowsheets row, missing ids or semester: {(r['program_name'], r['program_type'], r['start_year'])} -> {r['prog_id']}, {(r['subject'], r['cata_num'])} -> {r['course_id']}, semester {r['semester']}")
+
+    # the first row per course wins
+    exec_sql("""
+        CREATE OR REPLACE TEMP TABLE want_flowsheet AS
+        SELECT prog_id, course_id, semester, row_number() OVER (PARTITION BY prog_id ORDER BY line) AS priority
+        FROM (
+            SELECT * FROM stg_flowsheets_resolved
+            WHERE prog_id IS NOT NULL AND course_id IS NOT NULL AND semester >= 1
+            QUALIFY row_number() OVER (PARTITION BY prog_id, course_id ORDER BY line) = 1
+        )
+    """)
+    updated = count("""
+        UPDATE flowsheet SET semester = w.semester, priority = w.priority
+        FROM want_flowsheet w
+        WHERE flowsheet.prog_id = w.prog_id AND flowsheet.course_id = w.course_id
+          AND (flowsheet.semester <> w.semester OR flowsheet.priority <> w.priority)
+    """)
+    deleted = count("""
+        DELETE FROM flowsheet
+        WHERE NOT EXISTS (
+            SELECT 1 FROM want_flowsheet w WHERE w.prog_id = flowsheet.prog_id AND w.course_id = flowsheet.course_id
+        )
+    """)
+    inserted = count("""
+        INSERT INTO flowsheet (prog_id, course_id, semester, priority)
+        SELECT prog_id, course_id, semester, priority
+        FROM want_flowsheet w
+        WHERE NOT EXISTS (
+            SELECT 1 FROM flowsheet f WHERE f.prog_id = w.prog_id AND f.course_id = w.course_id
+        )
+    """)
+    note('flowsheet', 'insert', inserted)
+    note('flowsheet', 'update', updated)
+    note('flowsheet', 'delete', deleted)
+    print(f' flowsheet rows added {inserted}, updated {updated}, removed {deleted}')
+
+def fill_cata_numbers(connection):
+    # course.cata_number is the first run of digits in cata_num
+    connection.execute("""
+        UPDATE course SET cata_number = TRY_CAST(regexp_extract(cata_num, '[0-9]+') AS INT)
+        WHERE cata_number IS DISTINCT FROM TRY_CAST(regexp_extract(cata_num, '[0-9]+') AS INT)
+    """)
+
+def ensure_flowsheet_schema(connection):
+    """
+    Migration for databases built before flowsheets: adds the flowsheet table
+    and course.cata_number, and fills the numbers in.
+    """
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS flowsheet (
+          prog_id INT NOT NULL REFERENCES program(prog_id),
+          course_id INT NOT NULL REFERENCES course(course_id),
+          semester INT NOT NULL,
+          priority INT NOT NULL,
+          PRIMARY KEY (prog_id, course_id),
+          CHECK (semester >= 1)
+        )
+    """)
+    has_number = connection.execute("""
+        SELECT COUNT(*) FROM duckdb_columns()
+        WHERE database_name = current_database() AND schema_name = 'main'
+          AND table_name = 'course' AND column_name = 'cata_number'
+    """).fetchone()[0]
+    if not has_number:
+        connection.execute("ALTER TABLE course ADD COLUMN cata_number INT")
+    fill_cata_numbers(connection)
+
+def clear_recommendations():
+    if count("SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'recommendation' AND NOT temporary"):
+        exec_sql("DELETE FROM recommendation")
+
+def drop_staging():
+    for t in ['stg_programs', 'stg_programs_resolved', 'prog_map', 'stg_courses', 'stg_courses_last',
+              'course_map', 'stg_major_courses', 'stg_major_resolved', 'stg_prereqs', 'stg_prereqs_resolved',
+              'stg_schedule', 'new_sections', 'new_meeting_days', 'want_sections', 'want_meeting_days',
+              'drop_sections', 'drop_courses', 'drop_programs', 'stg_flowsheets', 'stg_flowsheets_resolved',
+              'want_flowsheet']:
+        exec_sql(f"DROP TABLE IF EXISTS temp.{t}")
+
+def bulk_import():
+    bulk_load_programs()
+    bulk_load_courses()
+    bulk_load_major_courses()
+    bulk_load_prereqs()
+    bulk_load_schedule()
+    load_flowsheets()
+    drop_staging()
+
+# incremental mode: fingerprint each CSV and skip the ones that did not change,
+# then diff the staged rows against the live tables by natural key and row hash
+# and apply only the inserts, updates and deletes. catalog rows that student
+# data (enrollments, plans, waitlists, majors) still uses are kept.
+
+CATALOG_FILES = ['programs.csv', 'courses.csv', 'major_courses.csv', 'prereqs.csv', 'schedule.csv',
+                 'flowsheets.csv']
+
+# a changed file forces a re-diff of the files whose rows point at it
+DEPENDENTS = {
+    'programs.csv': ['major_courses.csv', 'flowsheets.csv'],
+    'courses.csv': ['major_courses.csv', 'prereqs.csv', 'schedule.csv', 'flowsheets.csv'],
+}
+
+def ensure_catalog_file_table():
+    # one row per imported CSV with its hash, plus an 'import' row for full
+    # imports; the server reads the newest imported_at to see a new catalog
+    exec_sql("""
+        CREATE TABLE IF NOT EXISTS catalog_file (
+          name VARCHAR PRIMARY KEY,
+          sha256 VARCHAR NOT NULL,
+          imported_at TIMESTAMP NOT NULL
+        )
+    """)
+
+def changed_files(force=False):
+    stored = {r['name']: r['sha256'] for r in fetch_dict("SELECT name, sha256 FROM catalog_file")}
+    current = {}
+    for name in CATALOG_FILES:
+        path = CAT / name
+        if path.exists():
+            current[name] = hashlib.sha256(path.read_bytes()).hexdigest()
+    dirty = {name for name, digest in current.items() if force or stored.get(name) != digest}
+    for name in list(dirty):
+        dirty.update(d for d in DEPENDENTS.get(name, []) if d in current)
+    return current, dirty
+
+def row_hash(*cols):
+    parts = ', '.join(f"COALESCE(CAST({c} AS VARCHAR), '')" for c in cols)
+    return f"md5(concat_ws('|', {parts}))"
+
+def diff_programs():
+    # programs dropped from the CSV go once no student or requirement uses them
+    exec_sql("""
+        CREATE OR REPLACE TEMP TABLE drop_programs AS
+        SELECT p.prog_id
+        FROM program p
+        WHERE NOT EXISTS (
+            SELECT 1 FROM stg_programs_resolved r
+            WHERE r.name = p.name AND r.program_type = p.program_type AND r.cy_id = p.catalog_year_id
+        )
+    """)
+
+def diff_courses():
+    exec_sql("""
+        CREATE OR REPLACE TEMP TABLE drop_courses AS
+        SELECT c.course_id
+        FROM course c
+        WHERE NOT EXISTS (
+            SELECT 1 FROM stg_courses_last s WHERE s.subject = c.subject AND s.cata_num = c.cata_num
+        )
+    """)
+
+def diff_major_courses():
+    exec_sql("""
+        CREATE OR REPLACE TEMP TABLE want_major AS
+        SELECT prog_id, course_id, eligible
+        FROM stg_major_resolved
+        WHERE prog_id IS NOT NULL AND course_id IS NOT NULL
+        QUALIFY row_number() OVER (PARTITION BY prog_id, course_id ORDER BY line) = 1
+    """)
+    updated = count(f"""
+        UPDATE major_courses SET eligible_course = w.eligible
+        FROM want_major w
+        WHERE major_courses.major_id = w.prog_id AND major_courses.course_id = w.course_id
+          AND {row_hash('major_courses.eligible_course')} <> {row_hash('w.eligible')}
+    """)
+    deleted = count("""
+        DELETE FROM major_courses
+        WHERE NOT EXISTS (
+            SELECT 1 FROM want_major w
+            WHERE w.prog_id = major_courses.major_id AND w.course_id = major_courses.course_id
+        )
+    """)
+    exec_sql("DROP TABLE temp.want_major")
+    note('major_courses', 'update', updated)
+    note('major_courses', 'delete', deleted)
+
+def diff_prereqs():
+    exec_sql("""
+        CREATE OR REPLACE TEMP TABLE want_prereq AS
+        SELECT course_id, prereq_course_id, min_grade
+        FROM stg_prereqs_resolved
+        WHERE course_id IS NOT NULL AND prereq_course_id IS NOT NULL
+        QUALIFY row_number() OVER (PARTITION BY course_id, prereq_course_id ORDER BY line) = 1
+    """)
+    updated = count(f"""
+        UPDATE course_prereq SET min_grade = w.min_grade
+        FROM want_prereq w
+        WHERE course_prereq.course_id = w.course_id AND course_prereq.prereq_course_id = w.prereq_course_id
+          AND {row_hash('course_prereq.min_grade')} <> {row_hash('w.min_grade')}
+    """)
+    deleted = count("""
+        DELETE FROM course_prereq
+        WHERE NOT EXISTS (
+            SELECT 1 FROM want_prereq w
+            WHERE w.course_id = course_prereq.course_id AND w.prereq_course_id = course_prereq.prereq_course_id
+        )
+    """)
+    exec_sql("DROP TABLE temp.want_prereq")
+    note('course_prereq', 'update', updated)
+    note('course_prereq', 'delete', deleted)
+
+def meeting_signature(day_col, start_col, end_col, loc_col):
+    one = (f"CAST({day_col} AS VARCHAR) || ' ' || CAST(CAST({start_col} AS TIME) AS VARCHAR) || '-' || "
+           f"CAST(CAST({end_col} AS TIME) AS VARCHAR) || ' ' || COALESCE({loc_col}, '')")
+    return f"string_agg({one}, ';' ORDER BY {one})"
+
+def diff_schedule():
+    # desired sections straight from the CSV, keyed by class_num
+    exec_sql(f"""
+        CREATE OR REPLACE TEMP TABLE want_sections AS
+        SELECT sec.section_id, s.*, cm.course_id
+        FROM stg_schedule s
+        JOIN course_map cm ON cm.subject = s.subject AND cm.cata_num = s.cata_num
+        JOIN section sec ON sec.class_num = s.section_code
+        QUALIFY row_number() OVER (PARTITION BY s.section_code ORDER BY s.line) = 1
+    """)
+    expand_days('want_sections', 'want_meeting_days')
+
+    # row hash per section: its course plus every meeting it has
+    exec_sql(f"""
+        CREATE OR REPLACE TEMP TABLE changed_sections AS
+        WITH want AS (
+            SELECT w.section_id, w.course_id,
+                   {meeting_signature('d.day_num', 'd.start_time', 'd.end_time', 'd.location')} AS meetings
+            FROM want_sections w
+            LEFT JOIN want_meeting_days d ON d.section_id = w.section_id AND d.day_num IS NOT NULL
+            GROUP BY w.section_id, w.course_id
+        ),
+        have AS (
+            SELECT s.section_id, s.course_id,
+                   {meeting_signature('m.days_of_week', 'm.start_time', 'm.end_time', 'm.location')} AS meetings
+            FROM section s
+            LEFT JOIN meeting m ON m.section_id = s.section_id
+            WHERE s.section_id IN (SELECT section_id FROM want_sections)
+            GROUP BY s.section_id, s.course_id
+        )
+        SELECT want.section_id, want.course_id,
+               want.course_id <> have.course_id AS course_changed,
+               {row_hash('want.meetings')} <> {row_hash('have.meetings')} AS meetings_changed
+        FROM want JOIN have ON have.section_id = want.section_id
+        WHERE {row_hash('want.course_id', 'want.meetings')} <> {row_hash('have.course_id', 'have.meetings')}
+    """)
+    exec_sql("""
+        UPDATE section SET course_id = c.course_id
+        FROM changed_sections c
+        WHERE section.section_id = c.section_id AND c.course_changed
+    """)
+    replaced = count("""
+        DELETE FROM meeting
+        WHERE section_id IN (SELECT section_id FROM changed_sections WHERE meetings_changed)
+    """)
+    added = count(f"""
+        INSERT INTO meeting (meeting_id, location, section_id, start_time, end_time, days_of_week)
+        SELECT {ids.nextval_sql('meeting')}, location, section_id, start_time, end_time, day_num
+        FROM (
+            SELECT d.* FROM want_meeting_days d
+            JOIN changed_sections c ON c.section_id = d.section_id AND c.meetings_changed
+            WHERE d.day_num IS NOT NULL
+            ORDER BY d.line, d.pos
+        )
+    """)
+    note('section', 'update', count("SELECT COUNT(*) FROM changed_sections"))
+    note('meeting', 'delete', replaced)
+    note('meeting', 'insert', added)
+
+    # catalog sections no longer listed; synthetic HIST- sections belong to students
+    exec_sql("""
+        CREATE OR REPLACE TEMP TABLE drop_sections AS
+        SELECT s.section_id
+        FROM section s
+        WHERE s.meet_type <> 'HISTORY'
+          AND NOT EXISTS (
+            SELECT 1 FROM stg_schedule st
+            JOIN course_map cm ON cm.subject = st.subject AND cm.cata_num = st.cata_num
+            WHERE st.section_code = s.class_num
+          )
+    """)
+    exec_sql("DROP TABLE temp.changed_sections")
+
+# rows a student still points at are kept and reported, never deleted
+STUDENT_REFS = {
+    'section': """
+        EXISTS (SELECT 1 FROM enrollment e WHERE e.section_id = section.section_id)
+        OR EXISTS (SELECT 1 FROM planned_course pc WHERE pc.section_id = section.section_id)
+        OR EXISTS (SELECT 1 FROM waitlist w WHERE w.section_id = section.section_id)
+    """,
+    'course': """
+        EXISTS (SELECT 1 FROM section s WHERE s.course_id = course.course_id)
+        OR EXISTS (SELECT 1 FROM planned_course pc WHERE pc.course_id = course.course_id)
+        OR EXISTS (SELECT 1 FROM course_prereq cp
+                   WHERE cp.course_id = course.course_id OR cp.prereq_course_id = course.course_id)
+        OR EXISTS (SELECT 1 FROM major_courses mc WHERE mc.course_id = course.course_id)
+        OR EXISTS (SELECT 1 FROM flowsheet f WHERE f.course_id = course.course_id)
+    """,
+    'program': """
+        EXISTS (SELECT 1 FROM student_program sp WHERE sp.prog_id = program.prog_id)
+        OR EXISTS (SELECT 1 FROM requirements r WHERE r.prog_id = program.prog_id)
+        OR EXISTS (SELECT 1 FROM major_courses mc WHERE mc.major_id = program.prog_id)
+        OR EXISTS (SELECT 1 FROM flowsheet f WHERE f.prog_id = program.prog_id)
+    """,
+}
+
+def drop_unreferenced(table, id_col, candidates):
+    if not count(f"SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = '{candidates}' AND temporary"):
+        return
+    total = count(f"SELECT COUNT(*) FROM {candidates}")
+    deleted = count(f"""
+        DELETE FROM {table}
+        WHERE {id_col} IN (SELECT {id_col} FROM {candidates})
+          AND NOT ({STUDENT_REFS[table]})
+    """)
+    note(table, 'delete', deleted)
+    note(table, 'kept', total - deleted)
+
+def print_summary():
+    print('Catalog changes:')
+    print(f"  {'table':<16}{'insert':>8}{'update':>8}{'delete':>8}{'kept':>8}")
+    for table, c in changes.items():
+        if any(c.values()):
+            print(f"  {table:<16}{c['insert']:>8}{c['update']:>8}{c['delete']:>8}{c['kept']:>8}")
+    if not any(any(c.values()) for c in changes.values()):
+        print('  (none)')
+
+def incremental_import(force=False):
+    """
+    Runs inside the caller's transaction. Returns (the parent-row deletes that
+    have to wait for it to commit, the file hashes to record once they have):
+    duckdb rejects deleting a row in the same transaction that deleted the
+    rows referencing it, so meetings, prereqs and major courses go now and
+    their sections, courses and programs go after. The hashes are written
+    last so a run that stops before the deferred deletes sees the files as
+    changed again and retries them.
+    """
+    current, dirty = changed_files(force)
+    if not dirty:
+        print('catalog unchanged')
+        return [], {}
+    for name in CATALOG_FILES:
+        if name in current:
+            print(f"{name}: {'changed' if name in dirty else 'unchanged'}")
+
+    # programs and courses are always staged: the other files resolve ids through them
+    bulk_load_programs()
+    bulk_load_courses()
+    deferred = []
+    if 'programs.csv' in dirty:
+        diff_programs()
+        deferred.append(('program', 'prog_id', 'drop_programs'))
+    if 'courses.csv' in dirty:
+        diff_courses()
+        deferred.append(('course', 'course_id', 'drop_courses'))
+    if 'major_courses.csv' in dirty:
+        bulk_load_major_courses()
+        diff_major_courses()
+    if 'prereqs.csv' in dirty:
+        bulk_load_prereqs()
+        diff_prereqs()
+    if 'schedule.csv' in dirty:
+        bulk_load_schedule(report_existing=False)
+        diff_schedule()
+        # meetings of sections about to go are removed in this transaction
+        removed = count(f"""
+            DELETE FROM meeting
+            WHERE section_id IN (
+                SELECT section_id FROM drop_sections
+                WHERE section_id NOT IN (SELECT section_id FROM section WHERE {STUDENT_REFS['section']})
+            )
+        """)
+        note('meeting', 'delete', removed)
+        deferred.insert(0, ('section', 'section_id', 'drop_sections'))
+    if 'flowsheets.csv' in dirty:
+        load_flowsheets()
+
+    return deferred, {name: current[name] for name in dirty}
+
+def record_hashes(hashes):
+    now = datetime.now()
+    for name, sha256 in hashes.items():
+        exec_sql("INSERT OR REPLACE INTO catalog_file (name, sha256, imported_at) VALUES (?, ?, ?)",
+                 (name, sha256, now))
+
+def run_import(connection, bulk=False, incremental=False, force=False):
+    global con
+    con = connection
     CAT.mkdir(exist_ok=True)
+    changes.clear()
 
     # transactional batches in case of errors
     in_txn = False
+    deferred, hashes = [], {}
     try:
+        # older databases predate the id sequences
+        ids.ensure_sequences(con)
+        ensure_flowsheet_schema(con)
+        ensure_catalog_file_table()
+
         exec_sql("BEGIN")
         in_txn = True
 
-        program_map = load_programs()
-        course_map = load_courses()
-        load_major_courses(course_map, program_map)
-        load_prereqs(course_map)
-        load_schedule(course_map)
+        if incremental:
+            deferred, hashes = incremental_import(force)
+        elif bulk:
+            bulk_import()
+        else:
+            program_map = load_programs()
+            course_map = load_courses()
+            load_major_courses(course_map, program_map)
+            load_prereqs(course_map)
+            load_schedule(course_map)
+            load_flowsheets()
+        if not incremental:
+            # full imports keep no file hashes, so the next incremental run
+            # still diffs every file, but the catalog is stamped as changed
+            record_hashes({'import': 'bulk' if bulk else 'rows'})
+        fill_cata_numbers(con)
+        # stored recommendations were ranked against the old catalog
+        if not incremental or any(any(c.values()) for c in changes.values()):
+            clear_recommendations()
 
         exec_sql("COMMIT")
         in_txn = False
+
+        # parent rows go one table per transaction, after their children
+        for table, id_col, candidates in deferred:
+            exec_sql("BEGIN")
+            in_txn = True
+            drop_unreferenced(table, id_col, candidates)
+            exec_sql("COMMIT")
+            in_txn = False
+        # only now is the import whole
+        if hashes:
+            exec_sql("BEGIN")
+            in_txn = True
+            record_hashes(hashes)
+            exec_sql("COMMIT")
+            in_txn = False
+        if incremental:
+            drop_staging()
+            print_summary()
         print('Import complete')
     except Exception:
         if in_txn:
@@ -272,5 +980,20 @@ if __name__ == '__main__':
             except duckdb.Error:
                 pass
         raise
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='import catalog CSVs into database')
+    parser.add_argument('--bulk', action='store_true',
+                        help='set-based import for large catalogs (one SQL statement per step)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only apply the rows that changed since the last import')
+    parser.add_argument('--force', action='store_true',
+                        help='with --incremental, diff every file even if its hash is unchanged')
+    args = parser.parse_args()
+
+    print('DB:', DB)
+    connection = duckdb.connect(DB)
+    try:
+        run_import(connection, bulk=args.bulk, incremental=args.incremental, force=args.force)
     finally:
-        con.close()
\ No newline at end of file
+        connection.close()
@@ -0,0 +1,196 @@
+# import completed courses for many students at once
+#
+# rows are (stu_id, course, grade), with the course given as course_id or as
+# subject and cata_num. like /api/history/add_course, each course gets one
+# synthetic HIST-{course_id} section and each (student, course) one COMPLETE
+# enrollment, updated in place when it already exists. rows are staged in a
+# temp table, checked set-wise, and applied with a handful of statements in
+# one transaction; rows that fail a check are skipped and reported.
+import argparse
+import csv
+import tempfile
+from pathlib import Path
+import duckdb
+
+import ids
+
+BASE = Path(__file__).resolve().parent
+DB = str((BASE / 'course_planner.duckdb').resolve())
+
+COLUMNS = ('stu_id', 'course_id', 'subject', 'cata_num', 'grade')
+GRADES = ('A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D', 'F', 'P', 'NP')
+
+# term the synthetic history sections are filed under, as in add_course
+HISTORY_TERM = 8
+
+
+def fetch_dict(con, sql, params=()):
+    cur = con.execute(sql, params)
+    cols = [d[0].lower() for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+# first value of a query, or the row count duckdb returns for INSERT/UPDATE
+def count(con, sql, params=()):
+    return int(con.execute(sql, params).fetchone()[0])
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def stage_csv(con, path):
+    # columns missing from the header are staged as empty strings
+    with open(path, newline='') as f:
+        header = next(csv.reader(f), [])
+    present = {h.strip().lower(): h for h in header}
+    cols = ', '.join(
+        f"TRIM(COALESCE({quote(present[c])}, '')) AS {c}" if c in present else f"'' AS {c}"
+        for c in COLUMNS
+    )
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE stg_transcript AS
+        SELECT row_number() OVER () AS line, {cols}
+        FROM read_csv(?, header=true, all_varchar=true)
+    """, (str(path),))
+
+
+def stage_rows(con, rows):
+    # rows are dicts, e.g. parsed from a json or csv upload. they go through a
+    # temp csv: the python client converts list parameters a value at a time,
+    # which is far slower than duckdb's csv reader for a large batch
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'rows.csv'
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            w = csv.writer(f)
+            w.writerow(COLUMNS)
+            w.writerows([str(r.get(c) if r.get(c) is not None else '').strip() for c in COLUMNS] for r in rows)
+        stage_csv(con, path)
+
+
+def check(con):
+    # every staged row with its student, course and grade resolved, and the
+    # reason it is rejected (NULL when it is imported)
+    con.execute("""
+        CREATE OR REPLACE TEMP TABLE stg_transcript_checked AS
+        SELECT t.*, st.stu_id AS student, COALESCE(c1.course_id, c2.course_id) AS course, UPPER(t.grade) AS letter,
+            CASE
+                WHEN st.stu_id IS NULL THEN 'unknown student'
+                WHEN COALESCE(c1.course_id, c2.course_id) IS NULL THEN 'unknown course'
+                WHEN NOT list_contains(?, UPPER(t.grade)) THEN 'invalid grade'
+                WHEN row_number() OVER (
+                    PARTITION BY st.stu_id, COALESCE(c1.course_id, c2.course_id), list_contains(?, UPPER(t.grade))
+                    ORDER BY t.line DESC) > 1
+                    THEN 'duplicate, a later row for this course is used'
+            END AS reason
+        FROM stg_transcript t
+        LEFT JOIN student st ON st.stu_id = TRY_CAST(t.stu_id AS INT)
+        LEFT JOIN course c1 ON t.course_id <> '' AND c1.course_id = TRY_CAST(t.course_id AS INT)
+        LEFT JOIN course c2 ON t.course_id = '' AND c2.subject = UPPER(t.subject) AND c2.cata_num = t.cata_num
+    """, (list(GRADES), list(GRADES)))
+
+
+def apply(con):
+    # returns the new section ids and the enrollment update and insert counts
+    sections = [r[0] for r in con.execute(f"""
+        INSERT INTO section (section_id, class_num, capacity, campus, meet_type, term_id, course_id)
+        SELECT {ids.nextval_sql('section')}, 'HIST-' || course, 999, 'HISTORY', 'HISTORY', {HISTORY_TERM}, course
+        FROM (SELECT DISTINCT course FROM stg_transcript_checked WHERE reason IS NULL ORDER BY course) c
+        WHERE NOT EXISTS (SELECT 1 FROM section s WHERE s.class_num = 'HIST-' || c.course)
+        RETURNING section_id
+    """).fetchall()]
+    con.execute("""
+        CREATE OR REPLACE TEMP TABLE stg_transcript_ok AS
+        SELECT t.line, t.student, t.course, t.letter, s.section_id
+        FROM stg_transcript_checked t
+        JOIN section s ON s.class_num = 'HIST-' || t.course
+        WHERE t.reason IS NULL
+    """)
+    updated = count(con, """
+        UPDATE enrollment SET grade = o.letter, status = 'COMPLETE'
+        FROM stg_transcript_ok o
+        WHERE enrollment.stu_id = o.student AND enrollment.section_id = o.section_id
+    """)
+    inserted = count(con, f"""
+        INSERT INTO enrollment (enroll_ID, stu_ID, section_ID, grade, status, credits_earned)
+        SELECT {ids.nextval_sql('enrollment')}, student, section_id, letter, 'COMPLETE', NULL
+        FROM (
+            SELECT * FROM stg_transcript_ok o
+            WHERE NOT EXISTS (
+                SELECT 1 FROM enrollment e WHERE e.stu_id = o.student AND e.section_id = o.section_id
+            )
+            ORDER BY line
+        )
+    """)
+    return sections, updated, inserted
+
+
+def drop_staging(con):
+    for t in ('stg_transcript', 'stg_transcript_checked', 'stg_transcript_ok'):
+        con.execute(f"DROP TABLE IF EXISTS {t}")
+
+
+def run_import(con, path=None, rows=None, dry_run=False):
+    """
+    Import a transcript csv at path, or rows (dicts with the COLUMNS keys).
+    Returns counts, the rejected rows with their reason, the students whose
+    history changed and the synthetic sections created. dry_run checks the
+    rows and writes nothing.
+    """
+    if path is not None:
+        stage_csv(con, path)
+    else:
+        stage_rows(con, rows or [])
+    con.execute("BEGIN")
+    try:
+        check(con)
+        rejected = fetch_dict(con, """
+            SELECT line, stu_id, course_id, subject, cata_num, grade, reason
+            FROM stg_transcript_checked WHERE reason IS NOT NULL ORDER BY line
+        """)
+        total = count(con, "SELECT COUNT(*) FROM stg_transcript_checked")
+        students = [r[0] for r in con.execute(
+            "SELECT DISTINCT student FROM stg_transcript_checked WHERE reason IS NULL ORDER BY student").fetchall()]
+        sections, updated, inserted = apply(con) if not dry_run else ([], 0, 0)
+        con.execute("ROLLBACK" if dry_run else "COMMIT")
+    except BaseException:
+        try:
+            con.execute("ROLLBACK")
+        except duckdb.Error:
+            pass
+        raise
+    finally:
+        drop_staging(con)
+    return {
+        'rows': total,
+        'imported': total - len(rejected),
+        'enrollments_added': inserted,
+        'enrollments_updated': updated,
+        'sections_added': len(sections),
+        'rejected': rejected,
+        'students': students,
+        'new_sections': sections,
+        'dry_run': dry_run,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='import completed courses for many students from a csv')
+    parser.add_argument('csv', help=f"csv with a header naming some of {', '.join(COLUMNS)}; "
+                                    'give course_id or subject and cata_num')
+    parser.add_argument('--db', default=DB)
+    parser.add_argument('--dry-run', action='store_true', help='check the rows and report, writing nothing')
+    args = parser.parse_args()
+
+    print('DB:', args.db)
+    connection = duckdb.connect(args.db)
+    try:
+        ids.ensure_sequences(connection)
+        report = run_import(connection, path=args.csv, dry_run=args.dry_run)
+    finally:
+        connection.close()
+    for r in report['rejected']:
+        course = r['course_id'] or f"{r['subject']} {r['cata_num']}"
+        print(f"skip line {r['line']}: {r['reason']}: {(r['stu_id'], course, r['grade'])}")
+    print(f"{report['rows']} rows, {report['imported']} imported, {len(report['rejected'])} rejected; "
+          f"enrollments added {report['enrollments_added']}, updated {report['enrollments_updated']}, "
+          f"history sections added {report['sections_added']}" + (' (dry run)' if args.dry_run else ''))
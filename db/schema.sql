@@ -51,6 +51,8 @@ CREATE TABLE course (
   subject VARCHAR(20) NOT NULL,
   cata_num VARCHAR(20) NOT NULL,
   credits VARCHAR(2) NOT NULL,
+  cata_number INT,
+--   number in cata_num (202 for 202C), set by import_catalog
   UNIQUE (subject, cata_num)
 );
 
@@ -128,6 +130,19 @@ CREATE TABLE major_courses (
   UNIQUE (major_id, course_id)
 );
 
+-- suggested course order of a program: semester 1 is the first fall, 2 the
+-- first spring, and so on; priority orders courses across the whole sheet
+CREATE TABLE flowsheet (
+  prog_id INT NOT NULL REFERENCES program(prog_id),
+--   ON DELETE CASCADE ON UPDATE CASCADE
+  course_id INT NOT NULL REFERENCES course(course_id),
+--   ON DELETE CASCADE ON UPDATE CASCADE
+  semester INT NOT NULL,
+  priority INT NOT NULL,
+  PRIMARY KEY (prog_id, course_id),
+  CHECK (semester >= 1)
+);
+
 -- =========================
 -- Degree plan and planned courses
 -- =========================
@@ -181,6 +196,33 @@ CREATE TABLE waitlist (
   UNIQUE (stu_ID, section_ID)
 );
 
+-- =========================
+-- Catalog import fingerprints
+-- =========================
+
+CREATE TABLE catalog_file (
+  name VARCHAR PRIMARY KEY,
+  sha256 VARCHAR NOT NULL,
+  imported_at TIMESTAMP NOT NULL
+);
+
+-- =========================
+-- Stored recommendations
+-- =========================
+
+-- written by the batch job in frontend/recommend.py: the ranked course ids
+-- of each plan, the same as a json response, and a fingerprint of the student
+-- state they were ranked from. derived data, cleared by catalog imports, so
+-- no foreign keys
+CREATE TABLE recommendation (
+  plan_id INT PRIMARY KEY,
+  stu_id INT NOT NULL,
+  prog_id INT NOT NULL,
+  course_ids INT[] NOT NULL,
+  items VARCHAR NOT NULL,
+  basis VARCHAR NOT NULL,
+  computed_at TIMESTAMP NOT NULL
+);
 
 -- =========================
 -- Indexes (to speed up lookups)
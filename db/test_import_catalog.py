@@ -0,0 +1,161 @@
+# an incremental import that dies between its transactions, then runs again,
+# must leave the same catalog as one that never failed
+#
+# duckdb rejects deleting a row in the transaction that deleted the rows
+# referencing it, so sections, courses and programs are dropped in their own
+# transactions after the main one commits. run with: python -m pytest db
+import csv
+import shutil
+
+import duckdb
+import pytest
+
+import ids
+import import_catalog
+
+BASE = import_catalog.BASE
+
+
+def build(path):
+    con = duckdb.connect(str(path))
+    con.execute((BASE / 'schema.sql').read_text(encoding='utf-8'))
+    con.execute((BASE / 'data.sql').read_text(encoding='utf-8'))
+    ids.ensure_sequences(con)
+    import_catalog.fill_cata_numbers(con)
+    return con
+
+
+def run(path, cat, monkeypatch):
+    monkeypatch.setattr(import_catalog, 'CAT', cat)
+    con = duckdb.connect(str(path))
+    try:
+        import_catalog.run_import(con, incremental=True)
+    finally:
+        con.close()
+
+
+def unused_course(path):
+    # a course with sections that no student uses, so the import may drop it all
+    con = duckdb.connect(str(path))
+    try:
+        return con.execute("""
+            SELECT c.subject, c.cata_num
+            FROM course c
+            WHERE EXISTS (SELECT 1 FROM section s WHERE s.course_id = c.course_id)
+              AND NOT EXISTS (SELECT 1 FROM planned_course pc WHERE pc.course_id = c.course_id)
+              AND NOT EXISTS (
+                SELECT 1 FROM section s
+                WHERE s.course_id = c.course_id
+                  AND (EXISTS (SELECT 1 FROM enrollment e WHERE e.section_id = s.section_id)
+                       OR EXISTS (SELECT 1 FROM planned_course pc WHERE pc.section_id = s.section_id)
+                       OR EXISTS (SELECT 1 FROM waitlist w WHERE w.section_id = s.section_id))
+              )
+            ORDER BY c.subject, c.cata_num
+            LIMIT 1
+        """).fetchone()
+    finally:
+        con.close()
+
+
+def remove_course(cat, subject, cata_num):
+    # every catalog row that names the course, in any column pair
+    pairs = [('subject', 'cata_num'), ('prereq_subject', 'prereq_cata_num')]
+    for path in cat.glob('*.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            fields = reader.fieldnames
+            rows = [r for r in reader
+                    if not any(r.get(s) == subject and r.get(n) == cata_num for s, n in pairs)]
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def snapshot(path):
+    # catalog rows by natural key; ids may differ between the two runs
+    queries = {
+        'course': "SELECT subject, cata_num, title, credits, cata_number FROM course",
+        'section': """
+            SELECT s.class_num, c.subject, c.cata_num, s.meet_type
+            FROM section s JOIN course c ON c.course_id = s.course_id
+        """,
+        'meeting': """
+            SELECT s.class_num, m.days_of_week, m.start_time, m.end_time, m.location
+            FROM meeting m JOIN section s ON s.section_id = m.section_id
+        """,
+        'course_prereq': """
+            SELECT c.subject, c.cata_num, p.subject, p.cata_num, cp.min_grade
+            FROM course_prereq cp
+            JOIN course c ON c.course_id = cp.course_id
+            JOIN course p ON p.course_id = cp.prereq_course_id
+        """,
+        'major_courses': """
+            SELECT p.name, c.subject, c.cata_num, mc.eligible_course
+            FROM major_courses mc
+            JOIN program p ON p.prog_id = mc.major_id
+            JOIN course c ON c.course_id = mc.course_id
+        """,
+        'flowsheet': """
+            SELECT p.name, c.subject, c.cata_num, f.semester, f.priority
+            FROM flowsheet f
+            JOIN program p ON p.prog_id = f.prog_id
+            JOIN course c ON c.course_id = f.course_id
+        """,
+        'program': "SELECT name, program_type FROM program",
+        'catalog_file': "SELECT name, sha256 FROM catalog_file",
+    }
+    con = duckdb.connect(str(path), read_only=True)
+    try:
+        return {table: sorted(con.execute(sql).fetchall(), key=repr) for table, sql in queries.items()}
+    finally:
+        con.close()
+
+
+@pytest.fixture
+def catalogs(tmp_path):
+    # the shipped catalog, and a copy without one course nobody uses
+    before = tmp_path / 'before'
+    after = tmp_path / 'after'
+    shutil.copytree(BASE / 'catalog', before)
+    shutil.copytree(BASE / 'catalog', after)
+    return before, after
+
+
+@pytest.mark.parametrize('fail_at', ['section', 'course', 'hashes'])
+def test_rerun_after_failure_matches_clean_run(tmp_path, catalogs, monkeypatch, fail_at):
+    before, after = catalogs
+    clean, failed = tmp_path / 'clean.duckdb', tmp_path / 'failed.duckdb'
+    for path in (clean, failed):
+        build(path).close()
+        run(path, before, monkeypatch)
+
+    course = unused_course(clean)
+    assert course is not None
+    remove_course(after, *course)
+    run(clean, after, monkeypatch)
+
+    # die in the transaction that drops fail_at (or records the hashes)
+    drop_unreferenced = import_catalog.drop_unreferenced
+    record_hashes = import_catalog.record_hashes
+
+    def dying_drop(table, id_col, candidates):
+        if table == fail_at:
+            raise RuntimeError('import died')
+        drop_unreferenced(table, id_col, candidates)
+
+    def dying_record(hashes):
+        raise RuntimeError('import died')
+
+    monkeypatch.setattr(import_catalog, 'drop_unreferenced', dying_drop)
+    if fail_at == 'hashes':
+        monkeypatch.setattr(import_catalog, 'record_hashes', dying_record)
+    with pytest.raises(RuntimeError):
+        run(failed, after, monkeypatch)
+    monkeypatch.setattr(import_catalog, 'drop_unreferenced', drop_unreferenced)
+    monkeypatch.setattr(import_catalog, 'record_hashes', record_hashes)
+
+    run(failed, after, monkeypatch)
+    got, want = snapshot(failed), snapshot(clean)
+    assert got == want
+    assert not any(r[:2] == course for r in want['course'])
@@ -13,15 +13,19 @@ LEFT JOIN course c ON c.course_id = COALESCE(pc.course_id, sec.course_id)
 WHERE pc.plan_id = 6001 AND pc.term_id = 1
 GROUP BY tm.code;
 
+-- narrow to the plan's meetings first, then join only those (range join per day)
+WITH plan_meeting AS (
+    SELECT section_id, days_of_week, start_time, end_time
+    FROM meeting
+    WHERE section_id IN (SELECT section_id FROM planned_course WHERE plan_id = 6001)
+)
 SELECT a.section_id AS a, b.section_id AS b, a.days_of_week, a.start_time, a.end_time, b.start_time, b.end_time
-FROM meeting a
-JOIN meeting b
-    ON a.section_id <> b.section_id
-    AND a.days_of_week = b.days_of_week
+FROM plan_meeting a
+JOIN plan_meeting b
+    ON a.days_of_week = b.days_of_week
     AND a.start_time < b.end_time
     AND b.start_time < a.end_time
-WHERE a.section_id IN (SELECT section_id FROM planned_course WHERE plan_id = 6001)
-    AND b.section_id IN (SELECT section_id FROM planned_course WHERE plan_id = 6001)
+    AND a.section_id <> b.section_id
 ORDER BY a.days_of_week, a.start_time;
 
 SELECT pre.prereq_course_id, c2.subject, c2.cata_num, c2.title
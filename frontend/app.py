@@ -1,12 +1,36 @@
-from flask import Flask, request, jsonify, render_template
-import duckdb
+from flask import Flask, Response, request, jsonify, render_template
+import csv
 import datetime
+import io
+import duckdb
+import os
 from pathlib import Path
-import re
+import sys
+import threading
+import time
+
+import catalog_cache
+import catalog_hooks
+import catalog_snapshot
+import conflicts
+import dbpool
+import degree_audit
+import flowsheet
+import metrics
+import pages
+import plan_filler
+import prereq_closure
+import prereq_graph
+import recommend
+import schedule_gen
+import search_index
+import seats
+import statements
+import student_cache
 
 # set to parent direc of this file
 BASE = Path(__file__).resolve().parent
-DB_PATH = str((BASE.parent/'db' / 'course_planner.duckdb').resolve())
+DB_PATH = os.environ.get('COURSE_PLANNER_DB') or str((BASE.parent/'db' / 'course_planner.duckdb').resolve())
 
 app = Flask(
     __name__,
@@ -15,15 +39,73 @@ app = Flask(
     static_url_path=''
 )
 
+# catalog scripts live in db/
+sys.path.insert(0, str(BASE.parent / 'db'))
+import ids
+import import_catalog
+import import_transcripts
+
+def open_db(root):
+    ids.ensure_sequences(root)
+    import_catalog.ensure_flowsheet_schema(root)
+    recommend.ensure_schema(root)
+    catalog_snapshot.attach(root)
+
+# one database handle per process, one pooled cursor per request
+db = dbpool.Database(DB_PATH, on_open=open_db, on_cursor=catalog_snapshot.use)
+dbpool.init_app(app, db)
+metrics.init_app(app, dbpool.current_con)
+
+# worker pool stats, set by asgi.py when run with serve.py
+server_stats = None
+
 # debugger ( for ex: http://127.0.0.1:5000/health to see existing tables)
 @app.get('/health')
 def health():
     try:
         tables = run_query('SHOW TABLES')
-        return {'ok': True, 'db': DB_PATH, 'tables': [t['name'] for t in tables]}
+        return {'ok': True, 'db': DB_PATH, 'pool': db.stats(), 'student_cache': student_cache.stats(),
+                'catalog_cache': catalog_cache.stats(), 'catalog_snapshot': catalog_snapshot.stats(),
+                'server': server_stats() if server_stats else None, 'statements': statements.stats(),
+                'seats': seats.stats(), 'tables': [t['name'] for t in tables]}
     except Exception as e:
         return {'ok': False, 'error': str(e)}, 500
 
+# request, sql, pool and cache metrics in prometheus text format
+@app.get('/metrics')
+def metrics_endpoint():
+    pool = db.stats()
+    students = student_cache.stats()
+    catalog = catalog_cache.stats()
+    gauges = [
+        ('planner_db_pool_connections', 'Pooled database cursors by state.',
+         {(('state', 'in_use'),): pool['in_use'], (('state', 'idle'),): pool['idle']}),
+        ('planner_cache_hits', 'Cache hits since start.',
+         {(('cache', 'student'),): students['hits'], (('cache', 'catalog'),): catalog['hits']}),
+        ('planner_cache_misses', 'Cache misses since start.',
+         {(('cache', 'student'),): students['misses'], (('cache', 'catalog'),): catalog['misses']}),
+        ('planner_cache_entries', 'Entries held by each cache.',
+         {(('cache', 'student'),): students['size'], (('cache', 'catalog'),): catalog['size']}),
+    ]
+    parsed = statements.stats()
+    gauges += [
+        ('planner_statement_parses', 'Cursors each named statement was parsed on.',
+         {(('statement', name),): st['parses'] for name, st in parsed.items()}),
+    ]
+    if server_stats:
+        server = server_stats()
+        gauges += [
+            ('planner_server_pending', 'Requests running or queued for a worker.', {(): server['pending']}),
+            ('planner_server_rejected', 'Requests turned away with a 503 since start.', {(): server['rejected']}),
+        ]
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+# the sampled slow-query log, newest first
+@app.get('/api/admin/slow_queries')
+def slow_queries():
+    return jsonify({'threshold_ms': metrics.SLOW_QUERY_MS, 'sample_rate': metrics.SLOW_QUERY_SAMPLE,
+                    'items': metrics.slow_queries()})
+
 # update when adding new tabs
 @app.get('/')
 def index():
@@ -48,25 +130,79 @@ def rows_to_dicts(cur):
     cols = [d[0].lower() for d in cur.description]
     return [dict(zip(cols, r)) for r in cur.fetchall()]
 
+def request_con():
+    return dbpool.get_con(db)
+
+# all statements in a request share the request's pooled connection; each
+# one is timed for /metrics
 def run_query(sql, params=()):
-    con = duckdb.connect(DB_PATH)
-    try:
-        cur = con.execute(sql, params)
-        out = rows_to_dicts(cur)
-        con.close()
-        return out
-    except Exception as e:
-        con.close()
-        raise e
+    return metrics.execute(request_con, sql, params, rows_to_dicts)
 
 def run_exec(sql, params=()):
-    con = duckdb.connect(DB_PATH)
-    try:
-        con.execute(sql, params)
-        con.close()
-    except Exception as e:
-        con.close()
-        raise e
+    metrics.execute(request_con, sql, params)
+
+# wrap a request's reads and writes in one transaction
+def transaction():
+    return dbpool.transaction(db)
+
+# independent read-only calls, concurrently when cursors are free
+def parallel(*calls):
+    return dbpool.parallel(db, *calls)
+
+PROFILE_SQL = """
+    SELECT s.stu_id, s.login_id, s.f_name, s.l_name, s.email,
+        s.expected_grad_term, s.catalog_year_id, s.advisor_id,
+        a.f_name AS adv_first, a.l_name AS adv_last
+    FROM student s
+    LEFT JOIN advisor a ON a.adv_id = s.advisor_id
+"""
+PROFILE_BY_LOGIN_SQL = statements.define('profile_by_login', PROFILE_SQL + "WHERE s.login_id = ?")
+PROFILE_BY_ID_SQL = statements.define('profile_by_id', PROFILE_SQL + "WHERE s.stu_id = ?")
+FIRST_PLAN_SQL = statements.define(
+    'first_plan', "SELECT plan_id FROM degree_plan WHERE stu_id = ? ORDER BY plan_id LIMIT 1")
+
+# look up a student by login_id, creating the student and a plan if needed.
+# returns (student profile, plan_id)
+def sign_in(login_id):
+    # lookup and creation of the student and plan commit together
+    with transaction():
+        student = run_query(PROFILE_BY_LOGIN_SQL, (login_id,))
+
+        # create student if not exists
+        if not student:
+            cy = run_query("SELECT cy_id FROM catalog_year ORDER BY end_year DESC LIMIT 1")
+            cy_id = cy[0]['cy_id'] if cy else None
+            # pick a default advisor
+            adv_rows = run_query("SELECT adv_id FROM advisor ORDER BY adv_id LIMIT 1")
+            adv_id = adv_rows[0]['adv_id'] if adv_rows else None
+
+            # pick a default expected grad term
+            term_rows = run_query("SELECT term_id FROM term ORDER BY start_date DESC LIMIT 1")
+            expected_term = term_rows[0]['term_id'] if term_rows else None
+
+            next_sid = run_query(f"""
+                INSERT INTO student (stu_id, login_id, f_name, l_name, email,
+                                        expected_grad_term, catalog_year_id, advisor_id)
+                VALUES ({ids.nextval_sql('student')}, ?, 'New', 'Student', ? || '@psu.edu', ?, ?, ?)
+                RETURNING stu_id
+            """, (login_id, login_id, expected_term, cy_id, adv_id))[0]['stu_id']
+
+            student = run_query(PROFILE_BY_ID_SQL, (next_sid,))
+
+        stu = student[0]
+
+        plan = run_query(FIRST_PLAN_SQL, (stu['stu_id'],))
+        if not plan:
+            plan_id = run_query(
+                f"INSERT INTO degree_plan (plan_ID, stu_ID, cy_ID, time_created, target_grad_term_ID) VALUES ({ids.nextval_sql('degree_plan')},?,?,?,?) RETURNING plan_id",
+                (stu['stu_id'], stu['catalog_year_id'], datetime.datetime.utcnow(), stu['expected_grad_term'])
+            )[0]['plan_id']
+        else:
+            plan_id = plan[0]['plan_id']
+    if not plan:
+        # a lookup of the id before it existed may have been cached
+        student_cache.invalidate_plan(plan_id)
+    return stu, plan_id
 
 # sign in by login_id amd create plan if none exists
 @app.get('/api/signin')
@@ -75,57 +211,67 @@ def signin():
     if not login_id:
         return jsonify({'error': 'login_id is required'}), 400
 
-    student = run_query("""
-        SELECT s.stu_id, s.login_id, s.f_name, s.l_name, s.email,
-            s.expected_grad_term, s.catalog_year_id, s.advisor_id,
-            a.f_name AS adv_first, a.l_name AS adv_last
-        FROM student s
-        LEFT JOIN advisor a ON a.adv_id = s.advisor_id
-        WHERE s.login_id = ?
-    """, (login_id,))
-
-    # create student if not exists
-    if not student:
-        next_sid = run_query("SELECT COALESCE(MAX(stu_id),0)+1 AS nid FROM student")[0]['nid']
-        cy = run_query("SELECT cy_id FROM catalog_year ORDER BY end_year DESC LIMIT 1")
-        cy_id = cy[0]['cy_id'] if cy else None
-        # pick a default advisor
-        adv_rows = run_query("SELECT adv_id FROM advisor ORDER BY adv_id LIMIT 1")
-        adv_id = adv_rows[0]['adv_id'] if adv_rows else None
-
-        # pick a default expected grad term
-        term_rows = run_query("SELECT term_id FROM term ORDER BY start_date DESC LIMIT 1")
-        expected_term = term_rows[0]['term_id'] if term_rows else None
-
-        run_exec("""
-            INSERT INTO student (stu_id, login_id, f_name, l_name, email,
-                                    expected_grad_term, catalog_year_id, advisor_id)
-            VALUES (?, ?, 'New', 'Student', ? || '@psu.edu', ?, ?, ?)
-        """, (next_sid, login_id, login_id, expected_term, cy_id, adv_id))
-
-        student = run_query("""
-            SELECT s.stu_id, s.login_id, s.f_name, s.l_name, s.email,
-                s.expected_grad_term, s.catalog_year_id, s.advisor_id,
-                a.f_name AS adv_first, a.l_name AS adv_last
-            FROM student s
-            LEFT JOIN advisor a ON a.adv_id = s.advisor_id
-            WHERE s.stu_id = ?
-        """, (next_sid,))
-
-    stu = student[0]
-
-    plan = run_query("SELECT plan_id FROM degree_plan WHERE stu_id = ? ORDER BY plan_id LIMIT 1", (stu['stu_id'],))
-    if not plan:
-        next_id = run_query("SELECT COALESCE(MAX(plan_id),0)+1 AS nid FROM degree_plan")[0]['nid']
-        run_exec(
-            "INSERT INTO degree_plan (plan_ID, stu_ID, cy_ID, time_created, target_grad_term_ID) VALUES (?,?,?,?,?)",
-            (next_id, stu['stu_id'], stu['catalog_year_id'], datetime.datetime.utcnow(), stu['expected_grad_term'])
-        )
-        plan_id = next_id
+    stu, plan_id = sign_in(login_id)
+    return jsonify({'student': stu, 'plan_id': plan_id})
+
+PLAN_ROWS_SQL = statements.define('plan_rows', """
+    SELECT
+    pc.pc_id,
+    COALESCE(pc.course_id, sec.course_id) AS course_id,
+    pc.term_id,
+    tm.code AS term_code,
+    COALESCE(c.subject || ' ' || c.cata_num, '(manual)') AS course_code,
+    c.title,
+    CAST(c.credits AS INT) AS credits
+    FROM planned_course pc
+    JOIN term tm ON tm.term_id = pc.term_id
+    LEFT JOIN section sec ON sec.section_id = pc.section_id
+    LEFT JOIN course c ON c.course_id = COALESCE(pc.course_id, sec.course_id)
+    WHERE pc.plan_id = ?
+    ORDER BY tm.start_date, course_code
+""")
+
+# eligible courses of a student's primary major
+MAJOR_COURSE_IDS_SQL = statements.define('major_course_ids', """
+    SELECT mc.course_id
+    FROM student_program sp
+    JOIN program p ON p.prog_id = sp.prog_id AND p.program_type = 'Major'
+    JOIN major_courses mc ON mc.major_id = sp.prog_id AND mc.eligible_course = TRUE
+    WHERE sp.stu_id = ? AND sp.primary_flag = TRUE
+""")
+
+# planned courses of a plan with credit totals, flagged when recommended.
+# state is the owner's student_state when the caller already has it
+def plan_payload(plan_id, state=None):
+    plan = student_cache.plan_state(run_query, plan_id)
+    rows = run_query(PLAN_ROWS_SQL, (plan_id,))
+
+    if plan['stu_id'] is not None:
+        if state is None:
+            state = student_cache.student_state(run_query, plan['stu_id'])
+        passed = state['prereq_completed']
+        major = {r['course_id'] for r in run_query(MAJOR_COURSE_IDS_SQL, (plan['stu_id'],))}
+        graph = prereq_graph.current(run_query)
+
+        # completed courses drop out of the plan; major courses not yet passed
+        # whose direct prereqs are all passed are flagged as recommended
+        kept = []
+        for r in rows:
+            cid = r['course_id']
+            if cid in state['completed']:
+                continue
+            r['recommended'] = int(
+                cid in major and cid not in passed
+                and all(p in passed for p in graph.prereqs.get(cid, ()))
+            )
+            kept.append(r)
+        rows = kept
     else:
-        plan_id = plan[0]['plan_id']
+        for r in rows:
+            r['recommended'] = 0
 
-    return jsonify({'student': stu, 'plan_id': plan_id})
+    total = sum([r['credits'] or 0 for r in rows])
+    return {'items': rows, 'total_credits': total}
 
 # get planned courses for a given plan_id
 @app.get('/api/plan')
@@ -135,64 +281,14 @@ def get_plan():
     except:
         return jsonify({'error': 'plan_id required'}), 400
 
-    rows = run_query("""
-        WITH rec AS (
-        SELECT c.course_id
-        FROM degree_plan dp
-        JOIN student_program sp ON sp.stu_id = dp.stu_id AND sp.primary_flag = TRUE
-        JOIN program p ON p.prog_id = sp.prog_id AND p.program_type = 'Major'
-        JOIN major_courses mc ON mc.major_id = sp.prog_id AND mc.eligible_course = TRUE
-        JOIN course c ON c.course_id = mc.course_id
-        WHERE dp.plan_id = ?
-            AND NOT EXISTS (
-            SELECT 1 FROM enrollment e
-            JOIN section s ON s.section_id = e.section_id
-            WHERE e.stu_id = dp.stu_id
-                AND s.course_id = c.course_id
-                AND e.grade IN ('A','A-','B+','B','B-','C+','C')
-            )
-            AND NOT EXISTS (
-            SELECT 1 FROM course_prereq pre
-            WHERE pre.course_id = c.course_id
-                AND NOT EXISTS (
-                SELECT 1
-                FROM enrollment e2
-                JOIN section s2 ON s2.section_id = e2.section_id
-                WHERE e2.stu_id = dp.stu_id
-                    AND s2.course_id = pre.prereq_course_id
-                    AND e2.grade IN ('A','A-','B+','B','B-','C+','C')
-                )
-            )
-        )
-        SELECT
-        pc.pc_id,
-        COALESCE(pc.course_id, sec.course_id) AS course_id,
-        pc.term_id,
-        tm.code AS term_code,
-        COALESCE(c.subject || ' ' || c.cata_num, '(manual)') AS course_code,
-        c.title,
-        CAST(c.credits AS INT) AS credits,
-        CASE WHEN rec.course_id IS NOT NULL THEN 1 ELSE 0 END AS recommended
-        FROM planned_course pc
-        JOIN term tm ON tm.term_id = pc.term_id
-        LEFT JOIN section sec ON sec.section_id = pc.section_id
-        LEFT JOIN course c ON c.course_id = COALESCE(pc.course_id, sec.course_id)
-        LEFT JOIN rec ON rec.course_id = COALESCE(pc.course_id, sec.course_id)
-        WHERE pc.plan_id = ?
-            AND NOT EXISTS (
-            SELECT 1
-            FROM enrollment e3
-            JOIN section s3 ON s3.section_id = e3.section_id
-            WHERE e3.stu_id = (SELECT stu_id FROM degree_plan WHERE plan_id = ?)
-                AND s3.course_id = COALESCE(pc.course_id, sec.course_id)
-                AND e3.grade IN ('A','A-','B+','B','B-','C+','C','P')
-            )
+    return jsonify(plan_payload(plan_id))
 
-        ORDER BY tm.start_date, course_code
-    """, (plan_id, plan_id, plan_id))
-
-    total = sum([r['credits'] or 0 for r in rows])
-    return jsonify({'items': rows, 'total_credits': total})
+COURSE_EXISTS_SQL = statements.define('course_exists', "SELECT 1 AS x FROM course WHERE course_id = ?")
+INSERT_PLANNED_SQL = statements.define('insert_planned_course', f"""
+    INSERT INTO planned_course (pc_id, term_id, plan_id, section_id, course_id, manual_courses)
+    VALUES ({ids.nextval_sql('planned_course')}, ?, ?, NULL, ?, NULL)
+    RETURNING pc_id
+""")
 
 # add a course to a plan by course_id
 @app.post('/api/plan/add_course')
@@ -205,134 +301,40 @@ def add_course_to_plan():
     except:
         return jsonify({'error': 'plan_id, term_id, course_id required'}), 400
 
-    exists = run_query("SELECT 1 AS x FROM course WHERE course_id = ?", (course_id,))
+    exists = run_query(COURSE_EXISTS_SQL, (course_id,))
     if not exists:
         return jsonify({'error': 'course_id does not exist'}), 400
 
     # find student for this plan
-    plan_row = run_query("SELECT stu_id FROM degree_plan WHERE plan_id = ?", (plan_id,))
-    if not plan_row:
+    plan = student_cache.plan_state(run_query, plan_id)
+    if plan['stu_id'] is None:
         return jsonify({'error': 'plan_id not found'}), 400
-    stu_id = plan_row[0]['stu_id']
+    state = student_cache.student_state(run_query, plan['stu_id'])
 
-    # completed courses for this student (subject, cata_num)
-    completed_rows = run_query("""
-        SELECT DISTINCT s.course_id, c.subject, c.cata_num
-        FROM enrollment e
-        JOIN section s ON s.section_id = e.section_id
-        JOIN course c ON c.course_id = s.course_id
-        WHERE e.stu_id = ?
-          AND e.grade IN ('A','A-','B+','B','B-','C+','C','P')
-    """, (stu_id,))
-    completed_sc = {(r['subject'], str(r['cata_num'])) for r in completed_rows}
-
-    # planned courses for this plan (subject, cata_num)
-    planned_rows = run_query("""
-        SELECT COALESCE(pc.course_id, sec.course_id) AS course_id,
-               c.subject, c.cata_num
-        FROM planned_course pc
-        LEFT JOIN section sec ON sec.section_id = pc.section_id
-        LEFT JOIN course c ON c.course_id = COALESCE(pc.course_id, sec.course_id)
-        WHERE pc.plan_id = ?
-    """, (plan_id,))
-    planned_sc = {(r['subject'], str(r['cata_num'])) for r in planned_rows if r['subject'] is not None}
-
-    # subject/cata of the course to add
-    course_row = run_query("SELECT subject, cata_num FROM course WHERE course_id = ?", (course_id,))
-    if not course_row:
-        return jsonify({'error': 'course_id does not exist'}), 400
-    candidate_key = (course_row[0]['subject'], str(course_row[0]['cata_num']))
-
-    # equivalence sets (treat these as the same course)
-    EQUIV_SETS = [
-        {('CMPSC', '121'), ('CMPSC', '131')},
-        {('CMPSC', '122'), ('CMPSC', '132')},
-        {('CAS',   '100A'), ('CAS',   '100B')},
-        {('CMPSC', '483W'), ('CMPSC', '431W')},
-    ]
-
-    def equiv_group(key):
-        for group in EQUIV_SETS:
-            if key in group:
-                return group
-        return {key}
-
-    def has_equiv_in_set(key, key_set):
-        group = equiv_group(key)
-        for k in group:
-            if k in key_set:
-                return True
-        return False
+    graph = prereq_graph.current(run_query)
+    completed_mask = graph.mask(state['completed'])
+    planned_mask = graph.mask(plan['planned'])
 
     # block adding if an equivalent course is already completed or in plan
-    if has_equiv_in_set(candidate_key, completed_sc) or has_equiv_in_set(candidate_key, planned_sc):
+    if graph.has_equiv(course_id, completed_mask | planned_mask):
         return jsonify({'error': 'equivalent course already completed or in plan'}), 400
 
-    # prereqs for this course
-    prereqs = run_query("""
-        SELECT pre.prereq_course_id, c.subject, c.cata_num
-        FROM course_prereq pre
-        JOIN course c ON c.course_id = pre.prereq_course_id
-        WHERE pre.course_id = ?
-    """, (course_id,))
-
-    # explicit OR prereq sets (MATH 110 or 140)
-    OR_PREREQ_SETS = [
-        {('MATH', '110'), ('MATH', '140')},
-    ]
-
-    def prereqs_ok_for_course():
-        if not prereqs:
-            return True
-
-        used = set()
-        alt_groups = []
-
-        # build OR groups based on OR_PREREQ_SETS
-        for alt_def in OR_PREREQ_SETS:
-            group_keys = set()
-            for p in prereqs:
-                key_sc = (p['subject'], str(p['cata_num']))
-                if key_sc in alt_def:
-                    group_keys.add(key_sc)
-            if group_keys:
-                alt_groups.append(group_keys)
-                used.update(group_keys)
-
-        # everything else is a required prereq (AND)
-        required_prereqs = [
-            (p['subject'], str(p['cata_num']))
-            for p in prereqs
-            if (p['subject'], str(p['cata_num'])) not in used
-        ]
-
-        # all required prereqs must be satisfied (respecting equivalence)
-        for subj, cata in required_prereqs:
-            if not has_equiv_in_set((subj, cata), completed_sc):
-                return False
-
-        # each OR group must have at least one satisfied prereq
-        for group in alt_groups:
-            if not any(has_equiv_in_set(key_sc, completed_sc) for key_sc in group):
-                return False
-
-        return True
-
-    if not prereqs_ok_for_course():
+    if not graph.prereqs_ok(course_id, completed_mask):
         return jsonify({'error': 'prerequisites not satisfied for this course'}), 400
 
-    next_pc = run_query("SELECT COALESCE(MAX(pc_id),0)+1 AS nid FROM planned_course")[0]['nid']
     try:
-        run_exec("""
-            INSERT INTO planned_course (pc_id, term_id, plan_id, section_id, course_id, manual_courses)
-            VALUES (?, ?, ?, NULL, ?, NULL)
-        """, (next_pc, term_id, plan_id, course_id))
+        next_pc = run_query(INSERT_PLANNED_SQL, (term_id, plan_id, course_id))[0]['pc_id']
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+    student_cache.invalidate_plan(plan_id)
+    degree_audit.record_planned(plan['stu_id'], next_pc, course_id)
 
     return jsonify({'ok': True, 'pc_id': next_pc})
 
 
+REMOVE_PLANNED_SQL = statements.define(
+    'remove_planned_course', "DELETE FROM planned_course WHERE pc_id = ? RETURNING plan_id")
+
 # remove a planned course row
 @app.post('/api/plan/remove')
 def remove_planned():
@@ -342,47 +344,342 @@ def remove_planned():
     except:
         return jsonify({'error': 'pc_id required'}), 400
 
-    run_exec("DELETE FROM planned_course WHERE pc_id = ?", (pc_id,))
+    removed = run_query(REMOVE_PLANNED_SQL, (pc_id,))
+    for r in removed:
+        owner = student_cache.plan_state(run_query, r['plan_id'])['stu_id']
+        student_cache.invalidate_plan(r['plan_id'])
+        if owner is not None:
+            degree_audit.drop_planned(owner, pc_id)
     return jsonify({'ok': True})
 
+MAX_BATCH_OPS = 500
+
+BATCH_ITEMS_SQL = statements.define('batch_plan_items', """
+    SELECT pc.pc_id, COALESCE(pc.course_id, sec.course_id) AS course_id, pc.term_id
+    FROM planned_course pc
+    LEFT JOIN section sec ON sec.section_id = pc.section_id
+    WHERE pc.plan_id = ?
+""")
+BATCH_DELETE_SQL = statements.define(
+    'batch_delete_planned', "DELETE FROM planned_course WHERE list_contains(?, pc_id)")
+BATCH_MOVE_SQL = statements.define(
+    'batch_move_planned', "UPDATE planned_course SET term_id = ? WHERE pc_id = ?")
+
+# apply an ordered list of add / remove / move operations to one plan.
+# every op is checked against the plan as the earlier ops leave it (courses
+# added earlier count toward later prereq checks) and nothing is written
+# unless all of them pass
+@app.post('/api/plan/batch')
+def plan_batch():
+    data = request.get_json(force=True)
+    try:
+        plan_id = int(data.get('plan_id'))
+        ops = data.get('ops')
+        assert isinstance(ops, list)
+    except:
+        return jsonify({'error': 'plan_id and a list of ops required'}), 400
+    if len(ops) > MAX_BATCH_OPS:
+        return jsonify({'error': f'at most {MAX_BATCH_OPS} ops per batch'}), 400
+
+    try:
+        with transaction():
+            owner = run_query(student_cache.PLAN_OWNER_SQL, (plan_id,))
+            if not owner:
+                return jsonify({'error': 'plan_id not found'}), 400
+            state = student_cache.student_state(run_query, owner[0]['stu_id'])
+            graph = prereq_graph.current(run_query)
+            terms = {r['term_id'] for r in run_query("SELECT term_id FROM term")}
+
+            # the plan as the batch goes: key -> {'pc_id', 'course_id', 'term_id'};
+            # existing rows are keyed by pc_id, rows added here by ('new', op index)
+            items = {}
+            for r in run_query(BATCH_ITEMS_SQL, (plan_id,)):
+                items[r['pc_id']] = dict(r)
+            original = {k: v['term_id'] for k, v in items.items()}
+            touched = {}  # key -> results of the ops on it, to fill in new pc_ids
+            completed_mask = graph.mask(state['completed'])
+
+            def find(op):
+                # an existing row by pc_id, or any row (including added ones) by course_id
+                if op.get('pc_id') is not None:
+                    key = int(op['pc_id'])
+                    return key if key in items else None
+                course_id = int(op['course_id'])
+                return next((k for k, v in items.items() if v['course_id'] == course_id), None)
+
+            results = []
+            for i, op in enumerate(ops):
+                kind = op.get('op') if isinstance(op, dict) else None
+                result = {'index': i, 'op': kind, 'ok': False}
+                results.append(result)
+                try:
+                    if kind == 'add':
+                        course_id, term_id = int(op['course_id']), int(op['term_id'])
+                        if course_id not in graph.key_of:
+                            result['error'] = 'course_id does not exist'
+                        elif term_id not in terms:
+                            result['error'] = 'term_id does not exist'
+                        elif graph.has_equiv(course_id, completed_mask | graph.mask(v['course_id'] for v in items.values())):
+                            result['error'] = 'equivalent course already completed or in plan'
+                        elif not graph.prereqs_ok(course_id, completed_mask | graph.mask(
+                                v['course_id'] for k, v in items.items() if isinstance(k, tuple))):
+                            result['error'] = 'prerequisites not satisfied for this course'
+                        else:
+                            items[('new', i)] = {'pc_id': None, 'course_id': course_id, 'term_id': term_id}
+                            touched[('new', i)] = [result]
+                            result.update(ok=True, pc_id=None, course_id=course_id, term_id=term_id)
+                    elif kind == 'remove':
+                        key = find(op)
+                        if key is None:
+                            result['error'] = 'course not in plan'
+                        else:
+                            removed = items.pop(key)
+                            touched.setdefault(key, []).append(result)
+                            result.update(ok=True, pc_id=removed['pc_id'], course_id=removed['course_id'])
+                    elif kind == 'move':
+                        key, term_id = find(op), int(op['term_id'])
+                        if key is None:
+                            result['error'] = 'course not in plan'
+                        elif term_id not in terms:
+                            result['error'] = 'term_id does not exist'
+                        else:
+                            items[key]['term_id'] = term_id
+                            touched.setdefault(key, []).append(result)
+                            result.update(ok=True, pc_id=items[key]['pc_id'], course_id=items[key]['course_id'],
+                                          term_id=term_id)
+                    else:
+                        result['error'] = 'op must be add, remove or move'
+                except (KeyError, TypeError, ValueError):
+                    result['error'] = 'add needs course_id and term_id, remove needs pc_id or course_id, move also term_id'
+
+            if not all(r['ok'] for r in results):
+                # nothing has been written yet
+                return jsonify({'ok': False, 'results': results}), 400
+
+            # write only the net change: deletes, then term moves, then inserts
+            gone = [k for k in original if k not in items]
+            if gone:
+                run_exec(BATCH_DELETE_SQL, (gone,))
+            for k, v in items.items():
+                if not isinstance(k, tuple) and v['term_id'] != original[k]:
+                    run_exec(BATCH_MOVE_SQL, (v['term_id'], k))
+            for k, v in items.items():
+                if isinstance(k, tuple):
+                    v['pc_id'] = run_query(INSERT_PLANNED_SQL, (v['term_id'], plan_id, v['course_id']))[0]['pc_id']
+                    for result in touched[k]:
+                        result['pc_id'] = v['pc_id']
+    except Exception as e:
+        # the transaction rolled back, so none of the ops were applied
+        return jsonify({'error': str(e)}), 400
+    student_cache.invalidate_plan(plan_id)
+    for k in gone:
+        degree_audit.drop_planned(owner[0]['stu_id'], k)
+    for k, v in items.items():
+        if isinstance(k, tuple):
+            degree_audit.record_planned(owner[0]['stu_id'], v['pc_id'], v['course_id'])
+
+    return jsonify({'ok': True, 'results': results})
+
+MAX_FILL_TERMS = 12
+DEFAULT_TERM_CREDITS = 18
+
+# fill a plan with the rest of the primary major over future terms. terms
+# run from start_term_id (default: the first one that has not started) to
+# target_term_id (default: the plan's target graduation term when that is
+# later, else MAX_FILL_TERMS terms), adding terms past the last one in the
+# table as needed. prereqs outside the major that a course cannot be taken
+# without are planned too. dry_run returns the layout without writing it
+@app.post('/api/plan/autofill')
+def plan_autofill():
+    data = request.get_json(force=True)
+    try:
+        plan_id = int(data.get('plan_id'))
+        max_credits = int(data.get('max_credits') or DEFAULT_TERM_CREDITS)
+        start_term_id = int(data['start_term_id']) if data.get('start_term_id') is not None else None
+        target_term_id = int(data['target_term_id']) if data.get('target_term_id') is not None else None
+    except:
+        return jsonify({'error': 'plan_id required; max_credits, start_term_id, target_term_id must be integers'}), 400
+    if not 1 <= max_credits <= 30:
+        return jsonify({'error': 'max_credits must be between 1 and 30'}), 400
+    summers = bool(data.get('summers'))
+    dry_run = bool(data.get('dry_run'))
+
+    # two fills that create the same new term conflict; the loser runs again
+    # and finds the term the other one committed
+    for _ in range(3):
+        try:
+            return fill_plan(plan_id, max_credits, start_term_id, target_term_id, summers, dry_run)
+        except (duckdb.ConstraintException, duckdb.TransactionException):
+            continue
+    return jsonify({'error': 'terms changed while filling the plan, try again'}), 409
+
+CREATE_TERM_SQL = statements.define('create_term', f"""
+    INSERT INTO term (term_id, code, start_date, end_date)
+    VALUES ({ids.nextval_sql('term')}, ?, ?, ?)
+    RETURNING term_id
+""")
+
+def terms_needed(seq, placed):
+    # generated terms (no term_id yet) up to the last one the layout uses
+    return [t for t in seq[:max(placed.values()) + 1] if t['term_id'] is None]
+
+# the autofill layout, written unless dry_run, as the response. terms the
+# layout needs are created in the same transaction as its courses
+def fill_plan(plan_id, max_credits, start_term_id, target_term_id, summers, dry_run):
+    with transaction():
+        plan = run_query("SELECT stu_id, target_grad_term_id FROM degree_plan WHERE plan_id = ?", (plan_id,))
+        if not plan:
+            return jsonify({'error': 'plan_id not found'}), 400
+        stu_id = plan[0]['stu_id']
+        major = primary_major(stu_id)
+        if not major:
+            return jsonify({'error': 'student has no primary major'}), 400
+
+        # the terms to fill, in order
+        terms = run_query("SELECT term_id, code, start_date, end_date FROM term ORDER BY start_date")
+        by_id = {t['term_id']: t for t in terms}
+        if start_term_id is not None:
+            if start_term_id not in by_id:
+                return jsonify({'error': 'start_term_id does not exist'}), 400
+            start = by_id[start_term_id]
+        else:
+            today = datetime.date.today()
+            start = next((t for t in terms if t['start_date'] > today), None)
+        if target_term_id is None and plan[0]['target_grad_term_id'] in by_id:
+            target_term_id = plan[0]['target_grad_term_id']
+            if start is None or by_id[target_term_id]['start_date'] < start['start_date']:
+                target_term_id = None
+        target = by_id.get(target_term_id)
+        if target_term_id is not None and target is None:
+            return jsonify({'error': 'target_term_id does not exist'}), 400
+        if target is not None and (start is None or target['start_date'] < start['start_date']):
+            return jsonify({'error': 'target term is before the start term'}), 400
+
+        def regular(t):
+            return summers or not t['code'].startswith('SU')
+
+        if start is None:
+            # every known term has started: continue after the last one
+            seq = []
+            after = terms[-1]['code'] if terms else None
+        else:
+            seq = [t for t in terms if t['start_date'] >= start['start_date'] and (t is start or regular(t))]
+            if target is not None:
+                seq = [t for t in seq if t['start_date'] <= target['start_date']]
+            seq = seq[:MAX_FILL_TERMS]
+            after = seq[-1]['code'] if seq else None
+        if target is None and len(seq) < MAX_FILL_TERMS:
+            more = plan_filler.following_terms(after, MAX_FILL_TERMS - len(seq), summers)
+            if more is None and not seq:
+                return jsonify({'error': 'no future terms to fill'}), 400
+            seq += more or []
+        first_start = seq[0]['start_date']
+        index = {t['term_id']: i for i, t in enumerate(seq) if t['term_id'] is not None}
+
+        state = student_cache.student_state(run_query, stu_id)
+        graph = prereq_graph.current(run_query)
+        planned = run_query("""
+            SELECT COALESCE(pc.course_id, sec.course_id) AS course_id, pc.term_id, tm.start_date,
+                   CAST(c.credits AS INT) AS credits
+            FROM planned_course pc
+            JOIN term tm ON tm.term_id = pc.term_id
+            LEFT JOIN section sec ON sec.section_id = pc.section_id
+            LEFT JOIN course c ON c.course_id = COALESCE(pc.course_id, sec.course_id)
+            WHERE pc.plan_id = ?
+        """, (plan_id,))
+        completed_mask = graph.mask(state['completed'])
+        # planned before the first term counts as done, inside the range it holds its term
+        done_mask = completed_mask | graph.mask(r['course_id'] for r in planned if r['start_date'] < first_start)
+        fixed = [(index[r['term_id']], r['course_id'], r['credits']) for r in planned if r['term_id'] in index]
+        taken_mask = completed_mask | graph.mask(r['course_id'] for r in planned)
+
+        wanted = [r['course_id'] for r in run_query("""
+            SELECT mc.course_id
+            FROM major_courses mc
+            JOIN course c ON c.course_id = mc.course_id
+            WHERE mc.major_id = ? AND mc.eligible_course = TRUE
+            ORDER BY c.subject, c.cata_num
+        """, (major['prog_id'],)) if not graph.has_equiv(r['course_id'], taken_mask)]
+        courses, added = plan_filler.closure(graph, wanted, taken_mask)
+        info = {r['course_id']: r for r in run_query("""
+            SELECT course_id, subject, cata_num, cata_number, title, CAST(credits AS INT) AS credits
+            FROM course WHERE list_contains(?, course_id)
+        """, (courses,))}
+        # cata_number breaks ties between equally long chains; it stays out of the response
+        levels = {c: r.pop('cata_number') for c, r in info.items()}
+        placed, unplaced = plan_filler.pack(
+            graph, courses, {c: r['credits'] for c, r in info.items()}, levels,
+            done_mask, fixed, len(seq), max_credits)
+
+        if placed and not dry_run:
+            for t in terms_needed(seq, placed):
+                t['term_id'] = run_query(CREATE_TERM_SQL, (t['code'], t['start_date'], t['end_date']))[0]['term_id']
+            order = sorted(placed, key=lambda c: (placed[c], info[c]['subject'], str(info[c]['cata_num'])))
+            run_exec(f"""
+                INSERT INTO planned_course (pc_id, term_id, plan_id, section_id, course_id, manual_courses)
+                SELECT {ids.nextval_sql('planned_course')}, term_id, ?, NULL, course_id, NULL
+                FROM (
+                    SELECT UNNEST(?) AS term_id, UNNEST(?) AS course_id, UNNEST(range(?)) AS ord
+                    ORDER BY ord
+                )
+            """, (plan_id, [seq[placed[c]]['term_id'] for c in order], order, len(order)))
+    if placed and not dry_run:
+        student_cache.invalidate_plan(plan_id)
+        degree_audit.invalidate(stu_id)
+
+    added = set(added)
+    out_terms = []
+    for i, t in enumerate(seq):
+        rows = sorted((c for c in placed if placed[c] == i),
+                      key=lambda c: (info[c]['subject'], str(info[c]['cata_num'])))
+        if not rows:
+            continue
+        items = [dict(info[c], prereq_only=c in added) for c in rows]
+        out_terms.append({
+            'term_id': t['term_id'],
+            'code': t['code'],
+            'credits': sum(r['credits'] or 0 for r in items),
+            'planned_credits': sum(cr or 0 for j, _, cr in fixed if j == i),
+            'courses': items,
+        })
+    return jsonify({
+        'ok': True,
+        'dry_run': dry_run,
+        'terms': out_terms,
+        'unplaced': [dict(info[c], reason=reason) for c, reason in unplaced.items() if c in info],
+    })
+
+def search_vary():
+    # browsing by subject / level is cached, typed queries are not
+    if (request.args.get('q') or '').strip():
+        return None
+    return ((request.args.get('subject') or '').strip(), (request.args.get('level') or '').strip(),
+            request.args.get('cursor', ''), request.args.get('limit', ''))
+
 # search courses
 @app.get('/api/courses/search')
+@catalog_cache.cached(search_vary)
 def search_courses():
     q = (request.args.get('q') or '').strip()
     subject = (request.args.get('subject') or '').strip()
     level = (request.args.get('level') or '').strip()  # '100','200','300','400','500' or ''
+    try:
+        after, limit = pages.request_page(request.args, 'search', (int, str, str, int), search_index.LIMIT)
+    except pages.BadPage as e:
+        return jsonify({'error': str(e)}), 400
 
-    sql = [
-        "SELECT course_id, subject, cata_num, title, credits",
-        "FROM course",
-        "WHERE 1=1"
-    ]
-    params = []
-
-    code_match = None
-    if q:
-        code_match = re.match(r'^\s*([A-Za-z]{2,5})\s*([0-9]{1,3})\s*$', q)
-
-    if code_match:
-        subj_code, num_code = code_match.groups()
-        sql.append("AND subject = ? AND cata_num LIKE ?")
-        params.extend([subj_code.upper(), num_code + '%'])
-    elif q:
-        sql.append("AND (UPPER(subject) LIKE UPPER(?) OR UPPER(title) LIKE UPPER(?) OR cata_num LIKE ?)")
-        params.extend([q + '%', '%' + q + '%', q + '%'])
-
-    if subject and not code_match:
-        sql.append("AND subject = ?")
-        params.append(subject)
-
-    if level and level.isdigit():
-        first_digit = str(int(level) // 100) 
-        sql.append("AND cata_num LIKE ?")
-        params.append(first_digit + '%')
-
-    sql.append("ORDER BY subject, cata_num LIMIT 100")
-    rows = run_query("\n".join(sql), tuple(params))
-    return jsonify({'items': rows})
+    # ranked prefix / substring / typo tolerant matches from the in-memory index,
+    # a page at a time (?limit=, and ?cursor= from the page before)
+    rows, last = search_index.current(run_query).search(q, subject, level, limit, after)
+    return jsonify({'items': rows, 'next': pages.encode('search', last) if last else None})
+
+PREREQ_ROWS_SQL = statements.define('prereq_rows', """
+    SELECT pre.prereq_course_id, c2.subject, c2.cata_num, c2.title
+    FROM course_prereq pre
+    JOIN course c2 ON c2.course_id = pre.prereq_course_id
+    WHERE pre.course_id = ?
+    ORDER BY c2.subject, c2.cata_num
+""")
 
 # list missing prereqs for selectex course
 @app.get('/api/prereqs_missing')
@@ -393,22 +690,102 @@ def prereqs_missing():
     except:
         return jsonify({'error': 'stu_id and course_id required'}), 400
 
-    rows = run_query("""
-        SELECT pre.prereq_course_id, c2.subject, c2.cata_num, c2.title
-        FROM course_prereq pre
-        JOIN course c2 ON c2.course_id = pre.prereq_course_id
-        WHERE pre.course_id = ?
-          AND NOT EXISTS (
-            SELECT 1
-            FROM enrollment e
-            JOIN section s ON s.section_id = e.section_id
-            WHERE e.stu_id = ?
-              AND s.course_id = pre.prereq_course_id
-              AND e.grade IN ('A','A-','B+','B','B-','C+','C')
-          )
-        ORDER BY c2.subject, c2.cata_num
-    """, (course_id, stu_id))
-    return jsonify({'items': rows})
+    passed = student_cache.student_state(run_query, stu_id)['prereq_completed']
+    rows = run_query(PREREQ_ROWS_SQL, (course_id,))
+    return jsonify({'items': [r for r in rows if r['prereq_course_id'] not in passed]})
+
+# the whole prereq chain behind a course: every clause still open on the way
+# to it, nearest first, with the courses that meet it, and the fewest terms
+# until it can be passed. with stu_id, clauses their passed courses meet are
+# left out
+@app.get('/api/prereqs/chain')
+def prereq_chain():
+    try:
+        course_id = int(request.args.get('course_id', ''))
+        stu_id = int(request.args['stu_id']) if request.args.get('stu_id') else None
+    except:
+        return jsonify({'error': 'course_id required'}), 400
+
+    closure = prereq_closure.current(run_query)
+    if course_id not in closure.info:
+        return jsonify({'error': 'course not found'}), 404
+    done = 0
+    if stu_id is not None:
+        done = closure.graph.mask(student_cache.student_state(run_query, stu_id)['prereq_completed'])
+    terms, chain = closure.longest([course_id], done)
+    return jsonify({
+        'course': closure.info[course_id],
+        'terms': terms,
+        'chain': [closure.info[c] for c in chain],
+        'items': [{'needed_by': cid, 'depth': depth, 'options': [closure.info[o] for o in opts]}
+                  for cid, depth, opts in closure.missing(course_id, done)],
+    })
+
+# every course a course eventually unlocks, nearest first (depth 1 lists it
+# as a prereq directly)
+@app.get('/api/prereqs/unlocks')
+def prereq_unlocks():
+    try:
+        course_id = int(request.args.get('course_id', ''))
+    except:
+        return jsonify({'error': 'course_id required'}), 400
+
+    closure = prereq_closure.current(run_query)
+    if course_id not in closure.info:
+        return jsonify({'error': 'course not found'}), 404
+    items = [{**closure.info[c], 'depth': depth} for c, depth in closure.descendants.get(course_id, {}).items()]
+    items.sort(key=lambda r: (r['depth'], r['subject'], str(r['cata_num'])))
+    return jsonify({'course': closure.info[course_id], 'items': items})
+
+# the longest prereq chain left in the student's primary major: the fewest
+# terms before every remaining major course could be passed, however light
+# the load, and the chain of courses that sets it
+@app.get('/api/prereqs/longest_chain')
+def prereq_longest_chain():
+    try:
+        stu_id = int(request.args.get('stu_id', ''))
+    except:
+        return jsonify({'error': 'stu_id required'}), 400
+
+    state = student_cache.student_state(run_query, stu_id)
+    closure = prereq_closure.current(run_query)
+    graph = closure.graph
+    completed_mask = graph.mask(state['completed'])
+    remaining = sorted(r['course_id'] for r in run_query(MAJOR_COURSE_IDS_SQL, (stu_id,))
+                       if not graph.has_equiv(r['course_id'], completed_mask))
+    terms, chain = closure.longest(remaining, graph.mask(state['prereq_completed']))
+    return jsonify({'terms': terms, 'remaining': len(remaining), 'chain': [closure.info[c] for c in chain]})
+
+# meetings as (section_id, day, start, end) tuples for the conflict engine
+def meeting_tuples(sql, params=()):
+    cur = statements.execute(dbpool.get_con(db), sql, params)
+    return [tuple(r) for r in cur.fetchall()]
+
+PLAN_MEETINGS = """
+    SELECT section_id, days_of_week, start_time, end_time
+    FROM meeting
+    WHERE section_id IN (
+      SELECT section_id FROM planned_course
+      WHERE plan_id = ? AND section_id IS NOT NULL {term_filter}
+    )
+"""
+PLAN_MEETINGS_SQL = statements.define('plan_meetings', PLAN_MEETINGS.format(term_filter=''))
+PLAN_TERM_MEETINGS_SQL = statements.define('plan_term_meetings', PLAN_MEETINGS.format(term_filter='AND term_id = ?'))
+SECTION_MEETINGS_SQL = statements.define('section_meetings', """
+    SELECT section_id, days_of_week, start_time, end_time
+    FROM meeting WHERE section_id = ?
+""")
+
+def plan_meetings(plan_id, term_id=None):
+    if term_id is None:
+        return meeting_tuples(PLAN_MEETINGS_SQL, (plan_id,))
+    return meeting_tuples(PLAN_TERM_MEETINGS_SQL, (plan_id, term_id))
+
+def conflict_pair(a, b):
+    return {
+        'sec_a': a[0], 'sec_b': b[0], 'days_of_week': a[1],
+        'start_time': str(a[2]), 'end_time': str(a[3]), 'b_start': str(b[2]), 'b_end': str(b[3]),
+    }
 
 # find time conflicts
 @app.get('/api/time_conflicts')
@@ -418,45 +795,112 @@ def time_conflicts():
     except:
         return jsonify({'error': 'plan_id required'}), 400
 
-    rows = run_query("""
-        SELECT a.section_id AS sec_a, b.section_id AS sec_b,
-               a.days_of_week, a.start_time, a.end_time, b.start_time AS b_start, b.end_time AS b_end
-        FROM meeting a
-        JOIN meeting b
-          ON a.section_id <> b.section_id
-         AND a.days_of_week = b.days_of_week
-         AND a.start_time < b.end_time
-         AND b.start_time < a.end_time
-        WHERE a.section_id IN (
-          SELECT section_id FROM planned_course WHERE plan_id = ? AND section_id IS NOT NULL
-        )
-          AND b.section_id IN (
-          SELECT section_id FROM planned_course WHERE plan_id = ? AND section_id IS NOT NULL
-        )
-        ORDER BY a.days_of_week, a.start_time, b.start_time
-    """, (plan_id, plan_id))
+    # both directions of each overlap, like the old self-join
+    rows = conflicts.conflict_rows(plan_meetings(plan_id))
+    for r in rows:
+        for k in ('start_time', 'end_time', 'b_start', 'b_end'):
+            r[k] = str(r[k])
     return jsonify({'items': rows})
 
+# would adding a section to the plan clash with what is already planned
+@app.get('/api/time_conflicts/check')
+def time_conflicts_check():
+    try:
+        plan_id = int(request.args.get('plan_id', ''))
+        section_id = int(request.args.get('section_id', ''))
+    except:
+        return jsonify({'error': 'plan_id and section_id required'}), 400
+    term_id = request.args.get('term_id', type=int)
+
+    existing = [m for m in plan_meetings(plan_id, term_id) if m[0] != section_id]
+    candidate = meeting_tuples(SECTION_MEETINGS_SQL, (section_id,))
+    items = [conflict_pair(a, b) for a, b in conflicts.Schedule(existing).conflicts(candidate)]
+    return jsonify({'ok': not items, 'items': items})
+
+TERM_MEETINGS = """
+    SELECT x.stu_id, m.section_id, m.days_of_week, m.start_time, m.end_time
+    FROM (
+      SELECT dp.stu_id, pc.section_id
+      FROM planned_course pc
+      JOIN degree_plan dp ON dp.plan_id = pc.plan_id
+      WHERE pc.term_id = ? AND pc.section_id IS NOT NULL
+      UNION
+      SELECT e.stu_id, e.section_id
+      FROM enrollment e
+      JOIN section s ON s.section_id = e.section_id
+      WHERE s.term_id = ? AND e.status = 'ENROLLED'
+    ) x
+    JOIN student st ON st.stu_id = x.stu_id
+    JOIN meeting m ON m.section_id = x.section_id
+    WHERE TRUE {adv_filter}
+    ORDER BY x.stu_id
+"""
+TERM_MEETINGS_SQL = statements.define('term_meetings', TERM_MEETINGS.format(adv_filter=''))
+ADVISOR_TERM_MEETINGS_SQL = statements.define(
+    'advisor_term_meetings', TERM_MEETINGS.format(adv_filter='AND st.advisor_id = ?'))
+
+# conflicts for every student of a term (or one advisor's students): planned
+# and enrolled sections of the term, one sweep per student
+@app.get('/api/time_conflicts/term')
+def term_conflicts():
+    try:
+        term_id = int(request.args.get('term_id', ''))
+    except:
+        return jsonify({'error': 'term_id required'}), 400
+    adv_id = request.args.get('adv_id', type=int)
+
+    if adv_id is None:
+        cur = statements.execute(dbpool.get_con(db), TERM_MEETINGS_SQL, (term_id, term_id))
+    else:
+        cur = statements.execute(dbpool.get_con(db), ADVISOR_TERM_MEETINGS_SQL, (term_id, term_id, adv_id))
+
+    by_student = {}
+    for stu_id, *meeting in cur.fetchall():
+        by_student.setdefault(stu_id, []).append(tuple(meeting))
+    items = []
+    for stu_id, meetings in by_student.items():
+        pairs = conflicts.overlapping_pairs(meetings)
+        if pairs:
+            items.append({'stu_id': stu_id, 'conflicts': [conflict_pair(a, b) for a, b in pairs]})
+    return jsonify({'term_id': term_id, 'students_checked': len(by_student), 'items': items})
+
 @app.get('/api/subjects')
+@catalog_cache.cached()
 def subjects():
     rows = run_query("SELECT DISTINCT subject FROM course ORDER BY subject")
     return jsonify({'items': [r['subject'] for r in rows]})
 
 # list programs
 @app.get('/api/programs')
+@catalog_cache.cached()
 def programs():
     rows = run_query("SELECT prog_id, name, program_type, catalog_year_id FROM program ORDER BY name")
     return jsonify({'items': rows})
 
-# list advisors
-@app.get('/api/advisors')
-def advisors():
-    rows = run_query("""
+def advisor_items():
+    return run_query("""
         SELECT adv_id, f_name, l_name, email
         FROM advisor
         ORDER BY l_name, f_name
     """)
-    return jsonify({'items': rows})
+
+# list advisors
+@app.get('/api/advisors')
+@catalog_cache.cached()
+def advisors():
+    return jsonify({'items': advisor_items()})
+
+PRIMARY_MAJOR_SQL = statements.define('primary_major', """
+    SELECT sp.prog_id, p.name, p.program_type, p.catalog_year_id
+    FROM student_program sp
+    JOIN program p ON p.prog_id = sp.prog_id
+    WHERE sp.stu_id = ? AND sp.primary_flag = TRUE
+    LIMIT 1
+""")
+
+def primary_major(stu_id):
+    rows = run_query(PRIMARY_MAJOR_SQL, (stu_id,))
+    return rows[0] if rows else None
 
 # get primary major for a student
 @app.get('/api/student/major')
@@ -465,14 +909,7 @@ def get_student_major():
         stu_id = int(request.args.get('stu_id', ''))
     except:
         return jsonify({'error': 'stu_id required'}), 400
-    rows = run_query("""
-        SELECT sp.prog_id, p.name, p.program_type, p.catalog_year_id
-        FROM student_program sp
-        JOIN program p ON p.prog_id = sp.prog_id
-        WHERE sp.stu_id = ? AND sp.primary_flag = TRUE
-        LIMIT 1
-    """, (stu_id,))
-    return jsonify({'item': rows[0] if rows else None})
+    return jsonify({'item': primary_major(stu_id)})
 
 # set primary major for a student
 @app.post('/api/student/major')
@@ -484,42 +921,98 @@ def set_student_major():
     except:
         return jsonify({'error': 'stu_id and prog_id required'}), 400
 
-    # clear old primary
-    run_exec("UPDATE student_program SET primary_flag = FALSE WHERE stu_id = ?", (stu_id,))
-
-    exists = run_query("SELECT sp_id FROM student_program WHERE stu_id = ? AND prog_id = ?", (stu_id, prog_id))
-    if exists:
-        run_exec("UPDATE student_program SET primary_flag = TRUE WHERE sp_id = ?", (exists[0]['sp_id'],))
-    else:
-        next_sp = run_query("SELECT COALESCE(MAX(sp_id),0)+1 AS nid FROM student_program")[0]['nid']
-        run_exec("""
-            INSERT INTO student_program (sp_id, stu_id, prog_id, primary_flag, start_term)
-            VALUES (?, ?, ?, TRUE, NULL)
-        """, (next_sp, stu_id, prog_id))
+    # swap the primary flag atomically, never alongside a batch replacing
+    # the student's stored recommendations
+    with recommend.write_lock, transaction():
+        # clear old primary
+        run_exec("UPDATE student_program SET primary_flag = FALSE WHERE stu_id = ?", (stu_id,))
+
+        exists = run_query("SELECT sp_id FROM student_program WHERE stu_id = ? AND prog_id = ?", (stu_id, prog_id))
+        if exists:
+            run_exec("UPDATE student_program SET primary_flag = TRUE WHERE sp_id = ?", (exists[0]['sp_id'],))
+        else:
+            run_exec(f"""
+                INSERT INTO student_program (sp_id, stu_id, prog_id, primary_flag, start_term)
+                VALUES ({ids.nextval_sql('student_program')}, ?, ?, TRUE, NULL)
+            """, (stu_id, prog_id))
+        # stored recommendations were ranked for the old major
+        run_exec("DELETE FROM recommendation WHERE stu_id = ?", (stu_id,))
+    degree_audit.invalidate(stu_id)
 
     return jsonify({'ok': True})
 
-# list completed courses for a student
+# pages of a student's graded courses, by term (undated last), subject and
+# number; the first page starts after HISTORY_FIRST
+HISTORY_SQL = statements.define('history', """
+    SELECT c.course_id, c.subject, c.cata_num, c.title, e.grade, 
+                 CAST(c.credits AS INT) AS credits, tm.code as term_code,
+                 e.enroll_id AS enroll_id, s.class_num,
+                 CAST(COALESCE(tm.start_date, DATE '9999-12-31') AS VARCHAR) AS term_start
+    FROM enrollment e
+    JOIN section s ON s.section_id = e.section_id
+    LEFT JOIN term tm ON tm.term_id = s.term_id
+    JOIN course c ON c.course_id = s.course_id
+    WHERE e.stu_id = ?
+        AND e.grade IS NOT NULL
+        AND (COALESCE(tm.start_date, DATE '9999-12-31'), c.subject, c.cata_num, e.enroll_id)
+            > (CAST(? AS DATE), ?, ?, ?)
+    ORDER BY COALESCE(tm.start_date, DATE '9999-12-31'), c.subject, c.cata_num, e.enroll_id
+    LIMIT ?
+""")
+HISTORY_FIRST = ('0001-01-01', '', '', 0)
+HISTORY_KEY = (str, str, str, int)
+
+# graded credits and gpa over the whole history; the grade points go in as lists
+HISTORY_SUMMARY_SQL = statements.define('history_summary', """
+    SELECT COALESCE(SUM(CAST(c.credits AS INT)), 0) AS credits,
+           COALESCE(SUM(CAST(c.credits AS INT) * gp.points), 0) AS points
+    FROM enrollment e
+    JOIN section s ON s.section_id = e.section_id
+    JOIN course c ON c.course_id = s.course_id
+    JOIN (SELECT UNNEST(?) AS grade, UNNEST(?) AS points) gp ON gp.grade = upper(e.grade)
+    WHERE e.stu_id = ?
+        AND CAST(c.credits AS INT) > 0
+""")
+
+def history_page(stu_id, after=None, size=pages.DEFAULT_LIMIT):
+    rows = run_query(HISTORY_SQL, (stu_id, *(after or HISTORY_FIRST), size + 1))
+    items, cursor = pages.split('history', rows, size,
+                                lambda r: (r['term_start'], r['subject'], r['cata_num'], r['enroll_id']))
+    for r in items:
+        r.pop('term_start')
+    return items, cursor
+
+def history_summary(stu_id):
+    row = run_query(HISTORY_SUMMARY_SQL,
+                    (list(degree_audit.GRADE_POINTS), list(degree_audit.GRADE_POINTS.values()), stu_id))[0]
+    credits = int(row['credits'])
+    # unrounded, the page shows two places
+    return {'credits': credits, 'gpa': float(row['points']) / credits if credits else 0.0}
+
+# list completed courses for a student, a page at a time (?limit=, and
+# ?cursor= from the page before)
 @app.get('/api/history')
 def history():
     try:
         stu_id = int(request.args.get('stu_id', ''))
     except:
         return jsonify({'error': 'stu_id required'}), 400
+    try:
+        after, limit = pages.request_page(request.args, 'history', HISTORY_KEY)
+    except pages.BadPage as e:
+        return jsonify({'error': str(e)}), 400
 
-    rows = run_query("""
-        SELECT c.course_id, c.subject, c.cata_num, c.title, e.grade, 
-                     CAST(c.credits AS INT) AS credits, tm.code as term_code,
-                     e.enroll_id AS enroll_id, s.class_num
-        FROM enrollment e
-        JOIN section s ON s.section_id = e.section_id
-        LEFT JOIN term tm ON tm.term_id = s.term_id
-        JOIN course c ON c.course_id = s.course_id
-        WHERE e.stu_id = ?
-            AND e.grade IS NOT NULL
-        ORDER BY tm.start_date NULLS LAST, c.subject, c.cata_num
-    """, (stu_id,))
-    return jsonify({'items': rows})
+    items, cursor = history_page(stu_id, after, limit)
+    return jsonify({'items': items, 'next': cursor})
+
+# credits and gpa of every graded course, for the standing shown with the history
+@app.get('/api/history/summary')
+def history_summary_endpoint():
+    try:
+        stu_id = int(request.args.get('stu_id', ''))
+    except:
+        return jsonify({'error': 'stu_id required'}), 400
+    return jsonify(history_summary(stu_id))
 
 # mark a course as completed
 @app.post('/api/history/add_course')
@@ -532,31 +1025,43 @@ def history_add_course():
     except:
         return jsonify({'error': 'stu_id, course_id required'}), 400
 
-    # ensure section exists for course
-    sec = run_query("SELECT section_id FROM section WHERE class_num = ? LIMIT 1", (f'HIST-{course_id}',))
-    if sec:
-        section_id = sec[0]['section_id']
-    else:
-        next_sec = run_query("SELECT COALESCE(MAX(section_id),0)+1 AS nid FROM section")[0]['nid']
-        run_exec("""
-            INSERT INTO section (section_id, class_num, capacity, campus, meet_type, term_id, course_id)
-            VALUES (?, ?, 999, 'HISTORY', 'HISTORY', 8, ?)
-        """, (next_sec, f'HIST-{course_id}', course_id))
-        section_id = next_sec
+    # synthetic section and enrollment are written together
+    with transaction():
+        # ensure section exists for course
+        sec = run_query(f"SELECT section_id FROM {catalog_snapshot.disk('section')} WHERE class_num = ? LIMIT 1",
+                        (f'HIST-{course_id}',))
+        if sec:
+            section_id = sec[0]['section_id']
+        else:
+            section_id = run_query(f"""
+                INSERT INTO {catalog_snapshot.disk('section')} (section_id, class_num, capacity, campus, meet_type, term_id, course_id)
+                VALUES ({ids.nextval_sql('section')}, ?, 999, 'HISTORY', 'HISTORY', 8, ?)
+                RETURNING section_id
+            """, (f'HIST-{course_id}', course_id))[0]['section_id']
     
-    # insert or update enrollment
-    has = run_query("SELECT enroll_ID FROM enrollment WHERE stu_ID = ? AND section_ID = ?", (stu_id, section_id))
-    if has:
-        run_exec("UPDATE enrollment SET grade = ?, status = 'COMPLETE' WHERE enroll_ID = ?", (grade, has[0]['enroll_id']))
-    else:
-        next_enr = run_query("SELECT COALESCE(MAX(enroll_ID),0)+1 AS nid FROM enrollment")[0]['nid']
-        run_exec("""
-            INSERT INTO enrollment (enroll_ID, stu_ID, section_ID, grade, status, credits_earned)
-            VALUES (?, ?, ?, ?, 'COMPLETE', NULL)
-        """, (next_enr, stu_id, section_id, grade))
+        # insert or update enrollment
+        has = run_query("SELECT enroll_ID FROM enrollment WHERE stu_ID = ? AND section_ID = ?", (stu_id, section_id))
+        if has:
+            enroll_id = has[0]['enroll_id']
+            run_exec("UPDATE enrollment SET grade = ?, status = 'COMPLETE' WHERE enroll_ID = ?", (grade, enroll_id))
+        else:
+            enroll_id = run_query(f"""
+                INSERT INTO enrollment (enroll_ID, stu_ID, section_ID, grade, status, credits_earned)
+                VALUES ({ids.nextval_sql('enrollment')}, ?, ?, ?, 'COMPLETE', NULL)
+                RETURNING enroll_id
+            """, (stu_id, section_id, grade))[0]['enroll_id']
+    if not sec:
+        with transaction():
+            catalog_snapshot.sync_rows(run_exec, 'section', 'section_id', [section_id])
+    seats.invalidate([section_id])
+    student_cache.invalidate_student(stu_id)
+    degree_audit.record_grade(stu_id, enroll_id, course_id, grade)
 
     return jsonify({'ok': True})
 
+UPDATE_GRADE_SQL = statements.define(
+    'update_grade', "UPDATE enrollment SET grade = ? WHERE enroll_ID = ? AND stu_ID = ?")
+
 @app.post('/api/history/update_grade')
 def history_update_grade():
     data = request.get_json(force=True)
@@ -571,9 +1076,18 @@ def history_update_grade():
     if grade not in allowed:
         return jsonify({'error': 'invalid grade'}), 400
 
-    run_exec("UPDATE enrollment SET grade = ? WHERE enroll_ID = ? AND stu_ID = ?", (grade, enroll_id, stu_id))
+    run_exec(UPDATE_GRADE_SQL, (grade, enroll_id, stu_id))
+    student_cache.invalidate_student(stu_id)
+    degree_audit.update_grade(stu_id, enroll_id, grade)
     return jsonify({'ok': True})
 
+ENROLLMENT_SECTION_SQL = statements.define(
+    'enrollment_section', "SELECT section_id FROM enrollment WHERE enroll_ID = ? AND stu_ID = ?")
+DELETE_ENROLLMENT_SQL = statements.define(
+    'delete_enrollment', "DELETE FROM enrollment WHERE enroll_ID = ? AND stu_ID = ?")
+SECTION_ENROLLMENTS_SQL = statements.define(
+    'section_enrollments', "SELECT COUNT(*) AS n FROM enrollment WHERE section_id = ?")
+
 @app.post('/api/history/remove')
 def history_remove():
     data = request.get_json(force=True)
@@ -584,20 +1098,91 @@ def history_remove():
         return jsonify({'error': 'stu_id and enroll_id required'}), 400
 
     # capture section before delete
-    sec = run_query("SELECT section_id FROM enrollment WHERE enroll_ID = ? AND stu_ID = ?", (enroll_id, stu_id))
+    sec = run_query(ENROLLMENT_SECTION_SQL, (enroll_id, stu_id))
     if not sec:
         return jsonify({'ok': True})
     section_id = sec[0]['section_id']
 
-    run_exec("DELETE FROM enrollment WHERE enroll_ID = ? AND stu_ID = ?", (enroll_id, stu_id))
+    run_exec(DELETE_ENROLLMENT_SQL, (enroll_id, stu_id))
+    student_cache.invalidate_student(stu_id)
+    degree_audit.drop_enrollment(stu_id, enroll_id)
+    seats_promoted(seats.refresh(run_query, transaction, section_id))
 
     # clean up synthetic section if orphaned
-    left = run_query("SELECT COUNT(*) AS n FROM enrollment WHERE section_id = ?", (section_id,))
+    left = run_query(SECTION_ENROLLMENTS_SQL, (section_id,))
     if left and int(left[0]['n']) == 0:
-        run_exec("DELETE FROM section WHERE section_id = ?", (section_id,))
+        run_exec(f"DELETE FROM {catalog_snapshot.disk('section')} WHERE section_id = ?", (section_id,))
+        with transaction():
+            catalog_snapshot.sync_rows(run_exec, 'section', 'section_id', [section_id])
 
     return jsonify({'ok': True})
 
+MAX_TRANSCRIPT_ROWS = 200000
+_transcript_lock = threading.Lock()
+
+# completed courses for many students at once, as a csv upload (form field
+# "file" or a text/csv body) or json {"rows": [...]}. each row has stu_id,
+# course_id or subject and cata_num, and grade. rows are checked and written
+# together; rows that fail a check are skipped and listed in "rejected".
+# ?dry_run=1 only checks
+@app.post('/api/history/import')
+def history_import():
+    upload = request.files.get('file')
+    if upload is not None or request.mimetype == 'text/csv':
+        text = (upload.read() if upload is not None else request.get_data()).decode('utf-8-sig')
+        rows = [{(k or '').strip().lower(): v for k, v in r.items()} for r in csv.DictReader(io.StringIO(text))]
+    else:
+        data = request.get_json(force=True, silent=True) or {}
+        rows = data.get('rows')
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            return jsonify({'error': 'a csv file or a json list of rows required'}), 400
+    if len(rows) > MAX_TRANSCRIPT_ROWS:
+        return jsonify({'error': f'at most {MAX_TRANSCRIPT_ROWS} rows per import'}), 400
+    dry_run = request.args.get('dry_run', '') not in ('', '0', 'false')
+
+    # imports run one at a time; a history section created by a concurrent
+    # add_course makes the insert conflict, and a second try sees it
+    try:
+        with _transcript_lock, db.connection() as con, catalog_snapshot.on_disk(con):
+            try:
+                report = import_transcripts.run_import(con, rows=rows, dry_run=dry_run)
+            except (duckdb.ConstraintException, duckdb.TransactionException):
+                report = import_transcripts.run_import(con, rows=rows, dry_run=dry_run)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if report['new_sections']:
+        with transaction():
+            catalog_snapshot.sync_rows(run_exec, 'section', 'section_id', report['new_sections'])
+    if not dry_run:
+        # enrollments may have been written or completed in any section
+        seats.invalidate()
+    for stu_id in report['students'] if not dry_run else ():
+        student_cache.invalidate_student(stu_id)
+        degree_audit.invalidate(stu_id)
+    return jsonify(dict(report, ok=True))
+
+# degree audit of a student's primary major: each requirement area with
+# completed and planned credits, major gpa and whether it is met
+@app.get('/api/audit')
+def audit():
+    try:
+        stu_id = int(request.args.get('stu_id', ''))
+    except:
+        return jsonify({'error': 'stu_id required'}), 400
+    return jsonify(degree_audit.audit(run_query, stu_id))
+
+# the same audit for every student whose primary major is prog_id
+@app.get('/api/audit/program')
+def audit_program():
+    try:
+        prog_id = int(request.args.get('prog_id', ''))
+    except:
+        return jsonify({'error': 'prog_id required'}), 400
+    out = degree_audit.audit_program(run_query, prog_id)
+    if out['program'] is None:
+        return jsonify({'error': 'program not found'}), 404
+    return jsonify(out)
+
 # course recommendations based on major and completed courses
 @app.get('/api/recommendations')
 def recommendations():
@@ -606,332 +1191,281 @@ def recommendations():
         plan_id = int(request.args.get('plan_id', ''))
     except:
         return jsonify({'error': 'stu_id and plan_id required'}), 400
+    try:
+        after, limit = pages.request_page(request.args, 'recommendations', recommend.KEY_TYPES,
+                                          recommend.PAGE_SIZE)
+    except pages.BadPage as e:
+        return jsonify({'error': str(e)}), 400
 
-    # primary major
-    major = run_query("SELECT prog_id FROM student_program WHERE stu_id = ? AND primary_flag = TRUE LIMIT 1", (stu_id,))
-    if not major:
-        return jsonify({'items': []})
-    prog_id = major[0]['prog_id']
-
-    # completed credits to estimate semester standing
-    credits_rows = run_query("""
-        SELECT COALESCE(SUM(CAST(c.credits AS INT)), 0) AS total_credits
-        FROM enrollment e
-        JOIN section s ON s.section_id = e.section_id
+    items, cursor = recommendation_items(stu_id, plan_id, after=after, size=limit)
+    return jsonify({'items': items, 'next': cursor})
+
+# a page of the major courses to take next: the batch job's stored ranking
+# while it is current, ranked now otherwise. prog_id and state can be passed
+# in when the caller already looked them up. returns (items, next cursor)
+def recommendation_items(stu_id, plan_id, prog_id=None, state=None, after=None, size=recommend.PAGE_SIZE):
+    # courses of the primary major (prog_id when given), the student's
+    # completed courses and the plan do not depend on each other
+    def major_rows():
+        return run_query(recommend.MAJOR_ROWS_SQL, (prog_id, stu_id))
+
+    def stored_rows():
+        return run_query(recommend.STORED_SQL, (plan_id, stu_id)) if recommend.has_stored() else []
+
+    found, state, plan = parallel(
+        stored_rows,
+        (lambda: state) if state is not None else (lambda: student_cache.student_state(run_query, stu_id)),
+        lambda: student_cache.plan_state(run_query, plan_id),
+    )
+    completed, credits, planned = state['completed'], state['credits'], plan['planned']
+    sheets = flowsheet.current(run_query)
+    items = recommend.stored(found, completed, credits, planned)
+    if items is not None and prog_id in (None, found[0]['prog_id']):
+        return recommend.page(items, found[0]['prog_id'], sheets, after, size)
+
+    rows = major_rows()
+    # the major the rows came from, for its flowsheet
+    for r in rows:
+        prog_id = r.pop('major_id')
+    items = recommend.rank(rows, prog_id, completed, credits, planned, prereq_graph.current(run_query), sheets)
+    return recommend.page(items, prog_id, sheets, after, size)
+
+STUDENT_PLANS_SQL = statements.define(
+    'student_plans', "SELECT plan_id FROM degree_plan WHERE stu_id = ? ORDER BY plan_id")
+
+# everything the plan page shows after sign-in, in one round trip: profile,
+# plan with credit totals, primary major, history, recommendations and
+# advisors, all read in one transaction from one copy of the student state.
+# signs in (creating the student as needed) with login_id, or loads stu_id
+@app.get('/api/bootstrap')
+def bootstrap():
+    login_id = request.args.get('login_id', '').strip()
+    if login_id:
+        stu, plan_id = sign_in(login_id)
+        stu_id = stu['stu_id']
+    else:
+        try:
+            stu_id = int(request.args.get('stu_id', ''))
+        except:
+            return jsonify({'error': 'login_id or stu_id required'}), 400
+        plan_id = request.args.get('plan_id', type=int)
+
+    with transaction():
+        if not login_id:
+            found = run_query(PROFILE_BY_ID_SQL, (stu_id,))
+            if not found:
+                return jsonify({'error': 'student not found'}), 404
+            stu = found[0]
+            plans = [r['plan_id'] for r in run_query(STUDENT_PLANS_SQL, (stu_id,))]
+            if plan_id is None:
+                plan_id = plans[0] if plans else None
+            elif plan_id not in plans:
+                return jsonify({'error': 'plan_id does not belong to this student'}), 400
+
+        state = student_cache.student_state(run_query, stu_id)
+        major = primary_major(stu_id)
+        # first pages only; the lists continue from the *_next cursors
+        history_rows, history_next = history_page(stu_id)
+        recommendations, recommendations_next = (
+            recommendation_items(stu_id, plan_id, major['prog_id'], state)
+            if major and plan_id is not None else ([], None)
+        )
+        return jsonify({
+            'student': stu,
+            'plan_id': plan_id,
+            'plan': plan_payload(plan_id, state) if plan_id is not None else None,
+            'major': major,
+            'history': history_rows,
+            'history_next': history_next,
+            'summary': history_summary(stu_id),
+            'recommendations': recommendations,
+            'recommendations_next': recommendations_next,
+            'advisors': advisor_items(),
+        })
+
+# schedule listings page by section, (subject, number, section_id) after the
+# cursor, and return every meeting of each section on the page
+SECTION_PAGE = """
+    WITH page AS (
+        SELECT s.section_id, c.subject, c.cata_num, c.title
+        FROM ({sections}) picked
+        JOIN section s ON s.section_id = picked.section_id
         JOIN course c ON c.course_id = s.course_id
-        WHERE e.stu_id = ?
-          AND e.grade IN ('A','A-','B+','B','B-','C+','C','P')
-    """, (stu_id,))
-    total_credits = credits_rows[0]['total_credits'] if credits_rows else 0
+        WHERE EXISTS (SELECT 1 FROM meeting m WHERE m.section_id = s.section_id)
+            AND (c.subject, c.cata_num, s.section_id) > (?, ?, ?)
+        ORDER BY c.subject, c.cata_num, s.section_id
+        LIMIT ?
+    )
+    SELECT
+        p.section_id,
+        p.subject,
+        p.cata_num,
+        p.subject || ' ' || p.cata_num AS course_code,
+        p.title,
+        m.days_of_week,
+        CAST(m.start_time AS VARCHAR) AS start_time,
+        CAST(m.end_time AS VARCHAR) AS end_time,
+        m.location
+    FROM page p
+    JOIN meeting m ON m.section_id = p.section_id
+    ORDER BY p.subject, p.cata_num, p.section_id, m.days_of_week, m.start_time
+"""
+SECTION_FIRST = ('', '', -1)
+SECTION_KEY = (str, str, int)
+
+PLAN_SECTIONS_SQL = statements.define('plan_sections', SECTION_PAGE.format(sections="""
+    SELECT s.section_id
+    FROM (SELECT DISTINCT course_id FROM planned_course WHERE plan_id = ?) pc
+    JOIN section s ON s.course_id = pc.course_id
+    WHERE s.class_num != '12346'
+"""))
+
+def section_page(kind, sql, owner, after, size):
+    rows = run_query(sql, (owner, *(after or SECTION_FIRST), size + 1))
+    items, cursor = pages.split_groups(kind, rows, size,
+                                       lambda r: (r['subject'], r['cata_num'], r['section_id']))
+    for r in items:
+        del r['subject'], r['cata_num']
+    return items, cursor
+
+# list available sections for courses in plan, ?limit= sections at a time
+# (and ?cursor= from the page before)
+@app.get('/api/schedule')
+def available_schedule():
     try:
-        total_credits = int(total_credits)
+        plan_id = int(request.args.get('plan_id', ''))
     except:
-        total_credits = 0
-
-    sem_standing = (total_credits // 15) + 1
-    if sem_standing < 1:
-        sem_standing = 1
-
-    rows = run_query("""
-        SELECT c.course_id, c.subject, c.cata_num, c.title, CAST(c.credits AS INT) AS credits
-        FROM major_courses mc
-        JOIN program p ON p.prog_id = mc.major_id AND p.program_type = 'Major'
-        JOIN course c ON c.course_id = mc.course_id
-        WHERE mc.major_id = ?
-          AND mc.eligible_course = TRUE
-          AND NOT EXISTS (
-            SELECT 1 FROM enrollment e
-            JOIN section s ON s.section_id = e.section_id
-            WHERE e.stu_id = ?
-              AND s.course_id = c.course_id
-              AND e.grade IN ('A','A-','B+','B','B-','C+','C','P')
-          )
-          AND NOT EXISTS (
-            SELECT 1 FROM planned_course pc
-            LEFT JOIN section sec ON sec.section_id = pc.section_id
-            WHERE pc.plan_id = ?
-              AND COALESCE(pc.course_id, sec.course_id) = c.course_id
-          )
-        ORDER BY c.subject, c.cata_num
-        LIMIT 50
-    """, (prog_id, stu_id, plan_id))
-
-    if not rows:
-        return jsonify({'items': []})
-
-    # completed courses (subject, cata_num) for prereqs and equivalence
-    taken_rows = run_query("""
-        SELECT DISTINCT s.course_id, c.subject, c.cata_num
-        FROM enrollment e
-        JOIN section s ON s.section_id = e.section_id
-        JOIN course c ON c.course_id = s.course_id
-        WHERE e.stu_id = ?
-          AND e.grade IN ('A','A-','B+','B','B-','C+','C','P')
-    """, (stu_id,))
-    completed_sc = {(r['subject'], str(r['cata_num'])) for r in taken_rows}
-
-    # planned courses (subject, cata_num) for this plan
-    plan_courses = run_query("""
-        SELECT COALESCE(pc.course_id, sec.course_id) AS course_id,
-               c.subject, c.cata_num
-        FROM planned_course pc
-        LEFT JOIN section sec ON sec.section_id = pc.section_id
-        LEFT JOIN course c ON c.course_id = COALESCE(pc.course_id, sec.course_id)
-        WHERE pc.plan_id = ?
-    """, (plan_id,))
-    planned_sc = {(r['subject'], str(r['cata_num'])) for r in plan_courses if r['subject'] is not None}
-
-    # equivalence sets (treat these as the same course)
-    EQUIV_SETS = [
-        {('CMPSC', '121'), ('CMPSC', '131')},
-        {('CMPSC', '122'), ('CMPSC', '132')},
-        {('CAS',   '100A'), ('CAS',   '100B')},
-        {('CMPSC', '483W'), ('CMPSC', '431W')},
-    ]
-
-    def equiv_group(key):
-        for group in EQUIV_SETS:
-            if key in group:
-                return group
-        return {key}
-
-    def has_equiv_in_set(key, key_set):
-        group = equiv_group(key)
-        for k in group:
-            if k in key_set:
-                return True
-        return False
-
-    blocked_sc = completed_sc.union(planned_sc)
-
-    # prereqs for all candidate courses
-    prereq_map = {}
-    course_ids = [r['course_id'] for r in rows]
-    if course_ids:
-        placeholders = ",".join(["?"] * len(course_ids))
-        pre_rows = run_query(f"""
-            SELECT pre.course_id, pre.prereq_course_id, c.subject, c.cata_num
-            FROM course_prereq pre
-            JOIN course c ON c.course_id = pre.prereq_course_id
-            WHERE pre.course_id IN ({placeholders})
-        """, tuple(course_ids))
-        for pr in pre_rows:
-            cid = pr['course_id']
-            prereq_map.setdefault(cid, []).append(pr)
-
-    # explicit OR prereq sets (MATH 110 or 140)
-    OR_PREREQ_SETS = [
-        {('MATH', '110'), ('MATH', '140')},
-    ]
-
-    def prereqs_ok(row):
-        plist = prereq_map.get(row['course_id'], [])
-        if not plist:
-            return True
-
-        used = set()
-        alt_groups = []
-
-        # build OR groups based on OR_PREREQ_SETS
-        for alt_def in OR_PREREQ_SETS:
-            group_keys = set()
-            for p in plist:
-                key_sc = (p['subject'], str(p['cata_num']))
-                if key_sc in alt_def:
-                    group_keys.add(key_sc)
-            if group_keys:
-                alt_groups.append(group_keys)
-                used.update(group_keys)
-
-        # everything else is a required prereq (AND)
-        required_prereqs = [
-            (p['subject'], str(p['cata_num']))
-            for p in plist
-            if (p['subject'], str(p['cata_num'])) not in used
-        ]
-
-        # all required prereqs must be satisfied (respecting equivalence)
-        for subj, cata in required_prereqs:
-            if not has_equiv_in_set((subj, cata), completed_sc):
-                return False
-
-        # each OR group must have at least one satisfied prereq
-        for group in alt_groups:
-            if not any(has_equiv_in_set(key_sc, completed_sc) for key_sc in group):
-                return False
-
-        return True
-
-    # order of courses for reccs
-    flowsheet_order = [
-        ('CMPSC', '121'),
-        ('CMPSC', '131'),
-        ('MATH', '140'),
-        ('ENGL', '15'),
-        # first year spring
-        ('CMPSC', '122'),
-        ('CMPSC', '132'),
-        ('MATH', '141'),
-        ('PHYS', '211'),
-        # second year fall
-        ('CMPSC', '221'),
-        ('MATH', '230'),
-        ('MATH', '220'),
-        ('PHYS', '212'),
-        ('CAS', '100A'),
-        ('CAS', '100B'),
-        # second year spring
-        ('CMPSC', '360'),
-        ('CMPEN', '270'),
-        ('CMPSC', '311'),
-        # third year fall
-        ('CMPSC', '465'),
-        ('CMPEN', '331'),
-        ('STAT', '318'),
-        ('CMPSC', '461'),
-        # third year spring
-        ('CMPSC', '464'),
-        ('CMPSC', '473'),
-        ('STAT', '319'),
-        ('ENGL', '202C'),
-        # fourth year
-        ('CMPSC', '483W'),
-        ('CMPSC', '431W'),
-    ]
-
-    # semester index for each flowsheet course (1 = first fall, 2 = first spring, etc.)
-    flowsheet_semester = {
-        ('CMPSC', '121'): 1,
-        ('CMPSC', '131'): 1,
-        ('MATH',  '140'): 1,
-        ('ENGL',  '15'):  1,
-        ('CMPSC', '122'): 2,
-        ('CMPSC', '132'): 2,
-        ('MATH',  '141'): 2,
-        ('PHYS',  '211'): 2,
-        ('CMPSC', '221'): 3,
-        ('MATH',  '230'): 3,
-        ('MATH',  '220'): 3,
-        ('PHYS',  '212'): 3,
-        ('CAS',   '100A'): 3,
-        ('CAS',   '100B'): 3,
-        ('CMPSC', '360'): 4,
-        ('CMPEN', '270'): 4,
-        ('CMPSC', '311'): 4,
-        ('CMPSC', '465'): 5,
-        ('CMPEN', '331'): 5,
-        ('STAT',  '318'): 5,
-        ('CMPSC', '461'): 5,
-        ('CMPSC', '464'): 6,
-        ('CMPSC', '473'): 6,
-        ('STAT',  '319'): 6,
-        ('ENGL',  '202C'): 6,
-        ('CMPSC', '483W'): 7,
-        ('CMPSC', '431W'): 7,
-    }
-
-    max_sem_to_show = sem_standing + 1
-    if max_sem_to_show < 1:
-        max_sem_to_show = 1
-
-    def course_sem(row):
-        key = (row['subject'], str(row['cata_num']))
-        if key in flowsheet_semester:
-            return flowsheet_semester[key]
-        m = re.search(r'\d+', str(row['cata_num']))
-        if m:
-            num = int(m.group(0))
-            if num < 200:
-                return 1
-            elif num < 300:
-                return 3
-            elif num < 400:
-                return 5
-            else:
-                return 7
-        return 8
-
-    # only current or upcoming semester courses, with prereqs satisfied,
-    # and no equivalent already completed or planned
-    filtered = []
-    for r in rows:
-        key_sc = (r['subject'], str(r['cata_num']))
-        if course_sem(r) > max_sem_to_show:
-            continue
-        if not prereqs_ok(r):
-            continue
-        if has_equiv_in_set(key_sc, blocked_sc):
-            continue
-        filtered.append(r)
-    rows = filtered
-
-    # map (subject, cata_num) to an index
-    priority = {k: i for i, k in enumerate(flowsheet_order)}
-
-    def sort_key(row):
-        key = (row['subject'], str(row['cata_num']))
-        if key in priority:
-            return (priority[key], 0, 0)
-        m = re.search(r'\d+', str(row['cata_num']))  # fallback
-        num = int(m.group(0)) if m else 999
-        return (len(priority) + num, row['subject'], str(row['cata_num']))
+        return jsonify({'error': 'plan_id required'}), 400
+    try:
+        after, limit = pages.request_page(request.args, 'schedule', SECTION_KEY)
+    except pages.BadPage as e:
+        return jsonify({'error': str(e)}), 400
 
-    rows.sort(key=sort_key)  # reorder based on flowsheet
+    items, cursor = section_page('schedule', PLAN_SECTIONS_SQL, plan_id, after, limit)
+    return jsonify({'items': items, 'next': cursor})
 
-    return jsonify({'items': rows})
+# rank conflict-free section choices for the plan's courses. query params:
+# term_id, earliest / latest (HH:MM), free_days (day numbers, e.g. 5,6),
+# max_results, budget_ms. the ranking is only known once the search ends, so
+# the schedules come back together, best first, with the search stats
+MAX_SCHEDULES = 50
+MAX_BUDGET_MS = 10000
 
-# list available sections for courses in plan
-@app.get('/api/schedule')
-def available_schedule():
+SCHEDULE_SECTIONS = """
+    SELECT
+        c.course_id,
+        c.subject || ' ' || c.cata_num AS course_code,
+        c.title,
+        s.section_id,
+        s.class_num,
+        m.days_of_week,
+        m.start_time,
+        m.end_time,
+        m.location
+    FROM (SELECT DISTINCT course_id FROM planned_course WHERE plan_id = ? AND course_id IS NOT NULL) pc
+    JOIN course c ON c.course_id = pc.course_id
+    LEFT JOIN section s ON s.course_id = c.course_id AND s.class_num != '12346' {term_filter}
+    LEFT JOIN meeting m ON m.section_id = s.section_id
+    ORDER BY c.subject, c.cata_num, s.section_id, m.days_of_week, m.start_time
+"""
+SCHEDULE_SECTIONS_SQL = statements.define('schedule_sections', SCHEDULE_SECTIONS.format(term_filter=''))
+SCHEDULE_TERM_SECTIONS_SQL = statements.define(
+    'schedule_term_sections', SCHEDULE_SECTIONS.format(term_filter='AND s.term_id = ?'))
+
+@app.get('/api/schedule/generate')
+def generate_schedules():
     try:
         plan_id = int(request.args.get('plan_id', ''))
     except:
         return jsonify({'error': 'plan_id required'}), 400
+    try:
+        term_id = request.args.get('term_id', type=int)
+        earliest = request.args.get('earliest') or None
+        latest = request.args.get('latest') or None
+        earliest = datetime.time.fromisoformat(earliest) if earliest else None
+        latest = datetime.time.fromisoformat(latest) if latest else None
+        free_days = {int(d) for d in request.args.get('free_days', '').split(',') if d.strip()}
+        max_results = min(max(int(request.args.get('max_results', 10)), 1), MAX_SCHEDULES)
+        budget_ms = min(max(int(request.args.get('budget_ms', 2000)), 1), MAX_BUDGET_MS)
+    except ValueError:
+        return jsonify({'error': 'bad constraint value'}), 400
+
+    if term_id is None:
+        rows = run_query(SCHEDULE_SECTIONS_SQL, (plan_id,))
+    else:
+        rows = run_query(SCHEDULE_TERM_SECTIONS_SQL, (plan_id, term_id))
 
-    rows = run_query("""
-        SELECT
-            s.section_id,
-            c.subject || ' ' || c.cata_num AS course_code,
-            c.title,
-            m.days_of_week,
-            CAST(m.start_time AS VARCHAR) AS start_time,
-            CAST(m.end_time AS VARCHAR) AS end_time,
-            m.location
-        FROM planned_course pc
-        JOIN course c ON c.course_id = pc.course_id
-        JOIN section s ON s.course_id = c.course_id
-        JOIN meeting m ON m.section_id = s.section_id
-        WHERE pc.plan_id = ?
-        AND s.class_num != '12346'
-        ORDER BY c.subject, c.cata_num, m.days_of_week, m.start_time
-    """, (plan_id,))
-    return jsonify({'items': rows})
-
+    courses = {}
+    meetings = {}
+    for r in rows:
+        courses.setdefault(r['course_id'], r)
+        if r['days_of_week'] is not None:
+            meetings.setdefault((r['course_id'], r['section_id']), []).append(
+                (r['days_of_week'], r['start_time'], r['end_time'], r['location']))
+
+    by_course = {cid: [] for cid in courses}
+    for (cid, section_id), ms in meetings.items():
+        info = courses[cid]
+        sec = schedule_gen.Section(section_id, cid, ms, {
+            'course_code': info['course_code'], 'title': info['title'],
+        })
+        if sec.allowed(earliest, latest, free_days):
+            by_course[cid].append(sec)
+    unscheduled = [courses[cid]['course_code'] for cid, secs in by_course.items() if not secs]
+    by_course = {cid: secs for cid, secs in by_course.items() if secs}
+
+    started = time.monotonic()
+    schedules, stats = schedule_gen.Generator(by_course).search(max_results, budget_ms / 1000)
+    elapsed_ms = round((time.monotonic() - started) * 1000)
+
+    def section_json(sec):
+        return {
+            'section_id': sec.section_id,
+            'course_code': sec.info['course_code'],
+            'title': sec.info['title'],
+            'meetings': [
+                {'days_of_week': d, 'start_time': str(a), 'end_time': str(b), 'location': loc}
+                for d, a, b, loc in sec.meetings
+            ],
+        }
+
+    def schedule_json(rank, chosen):
+        days, gaps, first = schedule_gen.score(chosen)
+        return {
+            'rank': rank,
+            'score': {'days': days, 'gap_minutes': gaps, 'first_start': f'{-first // 60:02d}:{-first % 60:02d}'},
+            'sections': [section_json(sec) for sec in chosen],
+        }
+
+    return jsonify({
+        'courses': len(courses),
+        'scheduled_courses': len(by_course),
+        'unscheduled': unscheduled,
+        'schedules': [schedule_json(rank, chosen) for rank, chosen in enumerate(schedules, 1)],
+        'found': stats['found'],
+        'nodes': stats['nodes'],
+        'timed_out': stats['timed_out'],
+        'elapsed_ms': elapsed_ms,
+    })
+
+FINAL_SCHEDULE_SQL = statements.define('final_schedule', SECTION_PAGE.format(sections="""
+    SELECT DISTINCT section_id FROM enrollment WHERE stu_id = ? AND status = 'ENROLLED'
+"""))
+
+# the student's enrolled sections, paged like /api/schedule
 @app.get('/api/final_schedule')
 def final_schedule():
     try:
         stu_id = int(request.args.get('stu_id', ''))
     except:
         return jsonify({'error': 'stu_id required'}), 400
+    try:
+        after, limit = pages.request_page(request.args, 'final_schedule', SECTION_KEY)
+    except pages.BadPage as e:
+        return jsonify({'error': str(e)}), 400
 
-    rows = run_query("""
-        SELECT
-            s.section_id,
-            c.subject || ' ' || c.cata_num AS course_code,
-            c.title,
-            m.days_of_week,
-            CAST(m.start_time AS VARCHAR) AS start_time,
-            CAST(m.end_time AS VARCHAR) AS end_time,
-            m.location
-        FROM enrollment e
-        JOIN section s ON s.section_id = e.section_id
-        JOIN course c ON c.course_id = s.course_id
-        JOIN meeting m ON m.section_id = s.section_id
-        WHERE e.stu_id = ?
-        AND e.status = 'ENROLLED'
-        ORDER BY c.subject, c.cata_num, m.days_of_week, m.start_time
-    """, (stu_id,))
-    return jsonify({'items': rows})
+    items, cursor = section_page('final_schedule', FINAL_SCHEDULE_SQL, stu_id, after, limit)
+    return jsonify({'items': items, 'next': cursor})
 
 @app.post('/api/final_schedule/remove')
 def final_schedule_remove():
@@ -942,13 +1476,21 @@ def final_schedule_remove():
     except:
         return jsonify({'error': 'stu_id and section_id required'}), 400
 
-    run_exec(
-        "DELETE FROM enrollment WHERE stu_id = ? AND section_id = ? AND status = 'ENROLLED'",
-        (stu_id, section_id)
-    )
-    return jsonify({'ok': True})
-
-# enroll student in a chosen section
+    # a freed seat goes to the head of the section's waitlist
+    dropped, promoted = seats.drop(run_query, transaction, stu_id, section_id)
+    student_cache.invalidate_student(stu_id)
+    for enroll_id in dropped:
+        degree_audit.drop_enrollment(stu_id, enroll_id)
+    seats_promoted(promoted)
+    return jsonify({'ok': True, 'promoted': [p[0] for p in promoted]})
+
+# enrollments made by the seat engine
+def seats_promoted(promoted):
+    for stu_id, enroll_id, course_id in promoted:
+        student_cache.invalidate_student(stu_id)
+        degree_audit.record_grade(stu_id, enroll_id, course_id, None)
+
+# enroll student in a chosen section, or put them on its waitlist when it is full
 @app.post('/api/enroll')
 def enroll_student():
     data = request.get_json(force=True)
@@ -958,18 +1500,139 @@ def enroll_student():
     except:
         return jsonify({'error': 'stu_id and section_id required'}), 400
 
-    # right selection
-    sec = run_query("SELECT course_id FROM section WHERE section_id = ?", (section_id,))
-    if not sec:
+    result, promoted = seats.enroll(run_query, transaction, stu_id, section_id)
+    seats_promoted(promoted)
+    if result is None:
         return jsonify({'error': 'section not found'}), 400
+    status = result['status']
+    if status == 'ALREADY_ENROLLED':
+        return jsonify({'error': 'already enrolled in this section'}), 409
+    if status == 'ALREADY_WAITLISTED':
+        return jsonify({'error': f"already on the waitlist, position {result['position']}"}), 409
+
+    if status == 'ENROLLED':
+        student_cache.invalidate_student(stu_id)
+        degree_audit.record_grade(stu_id, result['enroll_id'], result['course_id'], None)
+        return jsonify({'ok': True, 'status': status, 'enroll_id': result['enroll_id']})
+    return jsonify({'ok': True, 'status': status, 'wait_id': result['wait_id'], 'position': result['position']})
+
+WAITLIST_SQL = statements.define('waitlist', """
+    SELECT w.section_id, c.subject || ' ' || c.cata_num AS course_code, c.title, s.capacity,
+        (SELECT COUNT(*) FROM waitlist a WHERE a.section_id = w.section_id AND a.position <= w.position) AS position,
+        (SELECT COUNT(*) FROM waitlist a WHERE a.section_id = w.section_id) AS waiting,
+        CAST(w.time_added AS VARCHAR) AS time_added
+    FROM waitlist w
+    JOIN section s ON s.section_id = w.section_id
+    JOIN course c ON c.course_id = s.course_id
+    WHERE w.stu_id = ?
+    ORDER BY w.time_added, w.section_id
+""")
+
+# a student's waitlisted sections with their place in line (1 is next for
+# a seat); ?section_id= narrows it to one section
+@app.get('/api/waitlist')
+def waitlist():
+    try:
+        stu_id = int(request.args.get('stu_id', ''))
+        section_id = int(request.args['section_id']) if request.args.get('section_id') else None
+    except:
+        return jsonify({'error': 'stu_id required'}), 400
 
-    next_enr = run_query("SELECT COALESCE(MAX(enroll_id),0)+1 AS nid FROM enrollment")[0]['nid']
-    run_exec("""
-        INSERT INTO enrollment (enroll_id, stu_id, section_id, status, grade, credits_earned)
-        VALUES (?, ?, ?, 'ENROLLED', NULL, NULL)
-    """, (next_enr, stu_id, section_id))
-    return jsonify({'ok': True, 'enroll_id': next_enr})
+    rows = run_query(WAITLIST_SQL, (stu_id,))
+    if section_id is not None:
+        rows = [r for r in rows if r['section_id'] == section_id]
+    return jsonify({'items': rows})
+
+@app.post('/api/waitlist/remove')
+def waitlist_remove():
+    data = request.get_json(force=True)
+    try:
+        stu_id = int(data.get('stu_id'))
+        section_id = int(data.get('section_id'))
+    except:
+        return jsonify({'error': 'stu_id and section_id required'}), 400
+
+    if not seats.leave(run_query, stu_id, section_id):
+        return jsonify({'error': 'student is not on the waitlist for this section'}), 404
+    return jsonify({'ok': True})
+
+# re-import db/catalog into the running server's database. the server holds
+# the duckdb file lock, so imports run here rather than as a separate process
+_import_lock = threading.Lock()
+
+# the catalog as of the last import: file hashes and when they were stamped.
+# imports run elsewhere (before a restart, or on a copy swapped in) change it
+# too, and catalog_hooks announces any change it sees
+CATALOG_STAMP_SQL = statements.define('catalog_stamp', """
+    SELECT list(name || ':' || sha256 ORDER BY name) AS files, max(imported_at) AS imported_at
+    FROM catalog_file
+""")
+
+def catalog_stamp():
+    # databases never imported into have no catalog_file yet
+    if not run_query("SELECT 1 FROM duckdb_tables() WHERE table_name = 'catalog_file' AND NOT temporary"):
+        return None
+    row = run_query(CATALOG_STAMP_SQL)[0]
+    return tuple(row['files'] or ()), row['imported_at']
+
+catalog_hooks.watch(catalog_stamp)
+
+@app.post('/api/admin/import_catalog')
+def admin_import_catalog():
+    mode = request.args.get('mode')
+    if not _import_lock.acquire(blocking=False):
+        return jsonify({'error': 'an import is already running'}), 409
+    try:
+        with db.connection() as con:
+            with catalog_snapshot.on_disk(con):
+                import_catalog.run_import(con, bulk=mode == 'bulk', incremental=mode == 'incremental')
+            # the new catalog is served once the import has committed
+            catalog_snapshot.reload(con)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        _import_lock.release()
+    # a new stamp rebuilds the compiled catalog structures before the next
+    # search; an incremental run that found nothing to do leaves them be
+    catalog_hooks.check(force=True)
+    return jsonify({'ok': True})
+
+# rank and store recommendations for every student of the prog_id programs
+# (every major when none are given), for advisors and outreach; programs run
+# in parallel. /api/recommendations serves the stored rows while they are current
+_recommend_lock = threading.Lock()
+
+@app.post('/api/admin/recommendations')
+def admin_recommendations():
+    try:
+        prog_ids = [int(p) for p in request.args.getlist('prog_id')] or None
+    except ValueError:
+        return jsonify({'error': 'prog_id must be an integer'}), 400
+    if not _recommend_lock.acquire(blocking=False):
+        return jsonify({'error': 'a recommendation run is already running'}), 409
+    try:
+        programs = recommend.run_batch(db, prog_ids)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        _recommend_lock.release()
+    return jsonify({'programs': programs})
+
+# build the in-memory catalog structures up front instead of on first use, and
+# again after every catalog change (registered last, so after every other
+# listener has dropped what the change made stale)
+@catalog_hooks.on_change
+def warm_caches():
+    with app.app_context():
+        prereq_graph.current(run_query)
+        prereq_closure.current(run_query)
+        flowsheet.current(run_query)
+        search_index.current(run_query)
 
 
 if __name__ == '__main__':
+    # the debug reloader runs the app in a child process; warming in the
+    # watching parent would hold the db file lock the child needs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warm_caches()
     app.run(debug=True)
\ No newline at end of file
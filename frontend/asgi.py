@@ -0,0 +1,175 @@
+# the flask app as an asgi application, for serve.py
+#
+# the event loop only parses requests and writes responses. each request's
+# flask view, with its duckdb calls, runs on a bounded thread pool sized to
+# the cursor pool, so a worker never waits for a cursor. requests past
+# ASGI_MAX_PENDING (running plus queued) get a 503 with Retry-After right away
+# instead of queueing without bound. a streamed response is produced on the
+# request's worker thread and each chunk waits for the client, so a slow
+# reader holds back its own stream and nothing else.
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import dbpool
+
+WORKERS = int(os.environ.get('ASGI_WORKERS', str(dbpool.POOL_SIZE)))
+MAX_PENDING = int(os.environ.get('ASGI_MAX_PENDING', str(WORKERS * 8)))
+MAX_BODY = 16 * 1024 * 1024
+
+
+class WSGIAdapter:
+    def __init__(self, wsgi_app, workers=WORKERS, max_pending=MAX_PENDING, on_startup=None, on_shutdown=None):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='wsgi')
+        self.max_pending = max_pending
+        self.on_startup = on_startup
+        self.on_shutdown = on_shutdown
+        self.pending = 0   # only touched on the event loop
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    if self.on_startup is not None:
+                        await loop.run_in_executor(self.executor, self.on_startup)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # requests still running finish first
+                await loop.run_in_executor(None, self.executor.shutdown)
+                if self.on_shutdown is not None:
+                    self.on_shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            await simple_response(send, 503, b'server busy, retry shortly\n', [(b'retry-after', b'1')])
+            return
+        self.pending += 1
+        try:
+            chunks = []
+            size = 0
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                chunks.append(message.get('body', b''))
+                size += len(chunks[-1])
+                if size > MAX_BODY:
+                    await simple_response(send, 413, b'request body too large\n')
+                    return
+                if not message.get('more_body'):
+                    break
+            environ = build_environ(scope, b''.join(chunks))
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self.run_wsgi, environ, send, loop)
+        finally:
+            self.pending -= 1
+
+    def run_wsgi(self, environ, send, loop):
+        # on a worker thread: the whole view and its response body
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and started and started[0]:
+                raise exc_info[1].with_traceback(exc_info[2])
+            code = int(status.split(' ', 1)[0])
+            started[:] = [False, code, [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]]
+            return lambda data: None
+
+        def flush_start():
+            if not started[0]:
+                emit({'type': 'http.response.start', 'status': started[1], 'headers': started[2]})
+                started[0] = True
+
+        body = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in body:
+                if chunk:
+                    flush_start()
+                    emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            flush_start()
+            emit({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        except OSError:
+            # the client went away mid stream
+            pass
+        finally:
+            close = getattr(body, 'close', None)
+            if close is not None:
+                close()
+
+    def stats(self):
+        return {'workers': self.executor._max_workers, 'pending': self.pending,
+                'max_pending': self.max_pending, 'rejected': self.rejected}
+
+
+async def simple_response(send, status, body, headers=()):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain'), *headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def create():
+    import app as flask_app
+
+    def shutdown():
+        flask_app.db.close()
+
+    adapter = WSGIAdapter(flask_app.app, on_startup=flask_app.warm_caches, on_shutdown=shutdown)
+    flask_app.server_stats = adapter.stats
+    return adapter
+
+
+application = create() if __name__ != '__main__' else None
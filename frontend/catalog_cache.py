@@ -0,0 +1,88 @@
+# responses of catalog endpoints kept until the catalog changes
+#
+# subjects, programs, advisors and course searches without a query only
+# change when the catalog does. their bodies are cached per url and catalog
+# version under a strong etag (a hash of the body), so repeat requests are
+# answered from memory, conditional ones with a 304, and neither touches the
+# database beyond catalog_hooks' periodic look at the catalog stamp.
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, request
+
+import catalog_hooks
+
+CACHE_SIZE = int(os.environ.get('CATALOG_CACHE_SIZE', '256'))
+
+_items = OrderedDict()   # key -> (catalog version, body, etag, mimetype)
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+
+def respond(body, etag, mimetype):
+    resp = Response(body, mimetype=mimetype)
+    resp.set_etag(etag)
+    # browsers keep the body but ask again each time; unchanged is a 304
+    resp.cache_control.no_cache = True
+    resp = resp.make_conditional(request)
+    if resp.status_code == 304:
+        with _lock:
+            _stats['not_modified'] += 1
+    return resp
+
+
+def cached(vary=None):
+    """
+    Serve a view's successful responses from memory until the catalog
+    changes. vary() returns what the response depends on besides the path,
+    or None to skip the cache for this request; by default the query string.
+    """
+    def decorate(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            extra = vary() if vary is not None else tuple(sorted(request.args.items(multi=True)))
+            if extra is None:
+                return view(*args, **kwargs)
+            key = (request.path, extra)
+            catalog_hooks.check()
+            version = catalog_hooks.version()
+            with _lock:
+                item = _items.get(key)
+                if item is not None and item[0] == version:
+                    _items.move_to_end(key)
+                    _stats['hits'] += 1
+                else:
+                    item = None
+                    _stats['misses'] += 1
+            if item is not None:
+                return respond(*item[1:])
+
+            resp = current_app.make_response(view(*args, **kwargs))
+            if resp.status_code != 200 or resp.is_streamed:
+                return resp
+            body = resp.get_data()
+            etag = hashlib.sha256(body).hexdigest()[:32]
+            with _lock:
+                # a load that raced with an import is not kept
+                if version == catalog_hooks.version():
+                    _items[key] = (version, body, etag, resp.mimetype)
+                    _items.move_to_end(key)
+                    while len(_items) > CACHE_SIZE:
+                        _items.popitem(last=False)
+            return respond(body, etag, resp.mimetype)
+        return wrapper
+    return decorate
+
+
+def stats():
+    with _lock:
+        return dict(_stats, size=len(_items), max_size=CACHE_SIZE, version=catalog_hooks.version())
+
+
+@catalog_hooks.on_change
+def clear():
+    with _lock:
+        _items.clear()
@@ -0,0 +1,67 @@
+# callbacks that must run whenever catalog tables change (imports, catalog writes)
+#
+# every import stamps the catalog_file table. the stamp is read again at most
+# every CATALOG_STAMP_INTERVAL seconds, so an import run by another process
+# (import_catalog.py, build.py --refresh) is announced like one run here.
+import os
+import threading
+import time
+
+STAMP_INTERVAL = float(os.environ.get('CATALOG_STAMP_INTERVAL', '5'))
+
+_listeners = []
+_version = 0
+_lock = threading.Lock()
+
+_read_stamp = None
+_stamp = None
+_checked = 0.0
+_check_lock = threading.Lock()
+
+
+def on_change(fn):
+    _listeners.append(fn)
+    return fn
+
+
+def version():
+    # bumped before the listeners run, so anything tagged with an older
+    # version is stale
+    return _version
+
+
+def notify():
+    global _version
+    with _lock:
+        _version += 1
+    for fn in list(_listeners):
+        fn()
+
+
+def watch(read_stamp):
+    # read_stamp() returns what identifies the catalog in the database
+    global _read_stamp
+    _read_stamp = read_stamp
+
+
+def check(force=False):
+    """
+    Read the catalog stamp if the last read is older than STAMP_INTERVAL (or
+    force) and notify when it changed. A forced check with no earlier read
+    notifies too, since nothing tells it what the catalog was before.
+    """
+    global _stamp, _checked
+    if _read_stamp is None or (not force and time.monotonic() - _checked < STAMP_INTERVAL):
+        return
+    # one reader at a time; the others go on with what they have
+    if not _check_lock.acquire(blocking=force):
+        return
+    try:
+        _checked = time.monotonic()
+        stamp = _read_stamp()
+        changed = stamp != _stamp and (_stamp is not None or force)
+        _stamp = stamp
+    finally:
+        _check_lock.release()
+    if changed:
+        notify()
@@ -0,0 +1,107 @@
+# catalog tables served from an in-memory copy (CATALOG_SNAPSHOT=1)
+#
+# course, section, meeting, course_prereq and major_courses only change on
+# imports and when history adds or drops a synthetic section. in snapshot
+# mode they are copied at startup into an in-memory database attached to the
+# server's duckdb handle, and pooled cursors resolve table names there first,
+# so catalog reads, including the catalog side of joins with student tables,
+# never touch the file; student tables still resolve to the file. an import
+# rebuilds the copy beside the old one and swaps it in one transaction, so a
+# statement sees either the old catalog or the new one, never a mix.
+import os
+from contextlib import contextmanager
+
+ENABLED = os.environ.get('CATALOG_SNAPSHOT', '') not in ('', '0')
+NAME = 'catalog_snapshot'
+TABLES = ('course', 'section', 'meeting', 'course_prereq', 'major_courses')
+
+_file_db = None   # catalog name of the database file
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def disk(table):
+    """
+    The table in the database file, for statements that write catalog
+    tables (or must read what was just written) from a pooled cursor.
+    """
+    if _file_db is None:
+        return table
+    return f'{_quote(_file_db)}.main.{table}'
+
+
+def attach(root):
+    # on_open hook: copy the catalog once the file is open
+    global _file_db
+    if not ENABLED:
+        return
+    _file_db = root.execute("SELECT current_database()").fetchone()[0]
+    root.execute(f"ATTACH ':memory:' AS {NAME}")
+    reload(root)
+
+
+def use(con):
+    # on_cursor hook: catalog names resolve to the snapshot, the rest to the file
+    if _file_db is not None:
+        con.execute(f"SET search_path = '{NAME}.main,{_quote(_file_db)}.main'")
+
+
+@contextmanager
+def on_disk(con):
+    # names on con resolve to the file only, e.g. while an import writes
+    if _file_db is None:
+        yield con
+        return
+    con.execute("RESET search_path")
+    try:
+        yield con
+    finally:
+        use(con)
+
+
+def reload(con):
+    """
+    Copy the catalog tables from the file into new snapshot tables, then
+    swap them in with one transaction. Statements already running finish on
+    the old tables.
+    """
+    if _file_db is None:
+        return
+    keys = {t: cols for t, cols in con.execute("""
+        SELECT table_name, constraint_column_names
+        FROM duckdb_constraints()
+        WHERE database_name = ? AND schema_name = 'main' AND constraint_type = 'PRIMARY KEY'
+    """, (_file_db,)).fetchall()}
+    for t in TABLES:
+        con.execute(f"CREATE OR REPLACE TABLE {NAME}.{t}__next AS SELECT * FROM {disk(t)}")
+        if keys.get(t):
+            # keeps id lookups on index scans as on the file
+            con.execute(f"ALTER TABLE {NAME}.{t}__next ADD PRIMARY KEY ({', '.join(keys[t])})")
+    con.execute("BEGIN TRANSACTION")
+    try:
+        for t in TABLES:
+            con.execute(f"DROP TABLE IF EXISTS {NAME}.{t}")
+            con.execute(f"ALTER TABLE {NAME}.{t}__next RENAME TO {t}")
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    con.execute("COMMIT")
+
+
+def sync_rows(run_exec, table, key, ids):
+    """
+    Copy rows of a catalog table from the file after a write to them
+    committed; rows gone from the file are dropped. Run it in a transaction
+    so readers see the old rows or the new ones.
+    """
+    if _file_db is None:
+        return
+    run_exec(f"DELETE FROM {NAME}.{table} WHERE list_contains(?, {key})", (list(ids),))
+    run_exec(f"INSERT INTO {NAME}.{table} SELECT * FROM {disk(table)} WHERE list_contains(?, {key})",
+             (list(ids),))
+
+
+def stats():
+    return {'enabled': _file_db is not None, 'tables': list(TABLES) if _file_db is not None else []}
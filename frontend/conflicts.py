@@ -0,0 +1,96 @@
+# meeting time conflict detection
+#
+# meetings are (section_id, day, start, end) tuples; start/end are anything
+# orderable (datetime.time from duckdb). overlapping pairs are found per day
+# with a sort and sweep: meetings are visited by start time while a heap keeps
+# the ones still running, so every meeting left in the heap overlaps the one
+# being visited. that is O(n log n + k) for k conflicts instead of the n^2
+# self-join.
+import bisect
+import heapq
+from collections import defaultdict
+
+
+def by_day(meetings):
+    days = defaultdict(list)
+    for m in meetings:
+        days[m[1]].append(m)
+    return days
+
+
+def overlapping_pairs(meetings):
+    # each overlapping pair of meetings from different sections, once,
+    # earlier start first
+    pairs = []
+    for day, items in sorted(by_day(meetings).items()):
+        items.sort(key=lambda m: (m[2], m[3], m[0]))
+        active = []  # (end, seq, meeting)
+        for seq, m in enumerate(items):
+            while active and active[0][0] <= m[2]:
+                heapq.heappop(active)
+            for _, _, other in active:
+                if other[0] != m[0]:
+                    pairs.append((other, m))
+            heapq.heappush(active, (m[3], seq, m))
+    return pairs
+
+
+def conflict_rows(meetings):
+    # same rows (and order) the old self-join returned: both directions
+    rows = []
+    for a, b in overlapping_pairs(meetings):
+        for x, y in ((a, b), (b, a)):
+            rows.append({
+                'sec_a': x[0], 'sec_b': y[0], 'days_of_week': x[1],
+                'start_time': x[2], 'end_time': x[3], 'b_start': y[2], 'b_end': y[3],
+            })
+    rows.sort(key=lambda r: (r['days_of_week'], r['start_time'], r['b_start']))
+    return rows
+
+
+class Schedule:
+    """
+    Meetings of an existing schedule indexed per day for checking candidates
+    one at a time. Each day keeps its meetings sorted by start with a running
+    max of end times, so a lookup bisects to the last meeting starting before
+    the candidate ends and walks back only while something can still overlap.
+    """
+
+    def __init__(self, meetings=()):
+        self._days = {}
+        self._starts = {}
+        self._max_end = {}
+        self.add(meetings)
+
+    def _index(self, day, items):
+        items.sort(key=lambda m: (m[2], m[3], m[0]))
+        max_end = []
+        for m in items:
+            max_end.append(m[3] if not max_end or m[3] > max_end[-1] else max_end[-1])
+        self._days[day] = items
+        self._starts[day] = [m[2] for m in items]
+        self._max_end[day] = max_end
+
+    def add(self, meetings):
+        for day, items in by_day(meetings).items():
+            self._index(day, self._days.get(day, []) + items)
+
+    def remove(self, section_id):
+        for day in list(self._days):
+            self._index(day, [m for m in self._days[day] if m[0] != section_id])
+
+    def conflicts(self, meetings):
+        # (candidate meeting, existing meeting) pairs that overlap
+        out = []
+        for m in meetings:
+            items = self._days.get(m[1])
+            if not items:
+                continue
+            max_end = self._max_end[m[1]]
+            i = bisect.bisect_left(self._starts[m[1]], m[3]) - 1
+            while i >= 0 and max_end[i] > m[2]:
+                other = items[i]
+                if other[3] > m[2] and other[0] != m[0]:
+                    out.append((m, other))
+                i -= 1
+        return out
@@ -0,0 +1,223 @@
+# pooled duckdb connections shared by the whole process
+#
+# duckdb allows one read-write handle per database file, so the process opens
+# the file once and hands out cursors (cheap child connections) from a pool.
+# a flask request checks out one cursor on first use and returns it at
+# teardown, so every query in the request shares it and can share a transaction.
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import duckdb
+from flask import g, has_app_context
+
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '8'))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+class Database:
+    def __init__(self, path, pool_size=POOL_SIZE, timeout=POOL_TIMEOUT, on_open=None, on_cursor=None):
+        self.path = path
+        self.on_open = on_open
+        self.on_cursor = on_cursor
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._root = None
+        self._lock = threading.Lock()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._in_use = 0
+
+    def root(self):
+        # open the file once, lazily, so importing app.py never takes the lock
+        with self._lock:
+            if self._root is None:
+                root = duckdb.connect(self.path)
+                if self.on_open is not None:
+                    # migrations run once, before any cursor is handed out
+                    self.on_open(root)
+                self._root = root
+            return self._root
+
+    def acquire(self, blocking=True):
+        # blocking=False returns None instead of waiting for a free slot
+        if not blocking:
+            if not self._slots.acquire(blocking=False):
+                return None
+        elif not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f'no database connection free after {self.timeout}s')
+        try:
+            try:
+                con = self._idle.get_nowait()
+            except queue.Empty:
+                con = self.root().cursor()
+                if self.on_cursor is not None:
+                    # per-cursor settings, applied once
+                    self.on_cursor(con)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return con
+
+    def release(self, con, broken=False):
+        with self._lock:
+            self._in_use -= 1
+        if broken:
+            try:
+                con.close()
+            except duckdb.Error:
+                pass
+        else:
+            self._idle.put(con)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        # for code running outside a request (scripts, worker threads)
+        con = self.acquire()
+        try:
+            yield con
+        finally:
+            self.release(con)
+
+    def stats(self):
+        with self._lock:
+            in_use = self._in_use
+        return {'pool_size': self.pool_size, 'in_use': in_use, 'idle': self._idle.qsize()}
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            if self._root is not None:
+                self._root.close()
+                self._root = None
+
+
+# request scoped unit of work
+
+_local = threading.local()
+
+
+def _scope():
+    # flask's g inside a request, a plain thread local everywhere else
+    return g if has_app_context() else _local
+
+
+def get_con(db):
+    scope = _scope()
+    con = getattr(scope, 'db_con', None)
+    if con is None:
+        con = db.acquire()
+        scope.db_con = con
+        scope.db_txn = False
+    return con
+
+
+def current_con():
+    # the connection this request or thread holds, if any
+    return getattr(_scope(), 'db_con', None)
+
+
+def in_transaction():
+    # whether this request or thread has a transaction open
+    return getattr(_scope(), 'db_txn', False)
+
+
+def release_con(db):
+    scope = _scope()
+    con = getattr(scope, 'db_con', None)
+    if con is None:
+        return
+    broken = False
+    if getattr(scope, 'db_txn', False):
+        # request ended inside a transaction, never hand it to the next one
+        try:
+            con.execute('ROLLBACK')
+        except duckdb.Error:
+            broken = True
+    scope.db_con = None
+    scope.db_txn = False
+    db.release(con, broken=broken)
+
+
+@contextmanager
+def transaction(db):
+    con = get_con(db)
+    scope = _scope()
+    if scope.db_txn:
+        # nested: join the outer transaction
+        yield con
+        return
+    con.execute('BEGIN TRANSACTION')
+    scope.db_txn = True
+    try:
+        yield con
+    except BaseException:
+        scope.db_txn = False
+        con.execute('ROLLBACK')
+        raise
+    scope.db_txn = False
+    con.execute('COMMIT')
+
+
+# independent reads of one request, run side by side
+
+_side = None
+_side_lock = threading.Lock()
+
+
+def _side_executor(db):
+    global _side
+    with _side_lock:
+        if _side is None:
+            _side = ThreadPoolExecutor(max_workers=db.pool_size, thread_name_prefix='db-side')
+        return _side
+
+
+def _run_on(db, con, fn):
+    # worker threads have no app context, so their scope is the thread local
+    _local.db_con = con
+    _local.db_txn = False
+    try:
+        return fn()
+    finally:
+        _local.db_con = None
+        db.release(con)
+
+
+def parallel(db, *calls):
+    """
+    Results of independent read-only calls, in order. Each call after the
+    first runs on a worker thread with a cursor of its own when the pool has
+    one free right away; the rest, and all of them inside a transaction
+    (they must read its snapshot), run on the caller's connection.
+    """
+    if len(calls) < 2 or in_transaction():
+        return [fn() for fn in calls]
+    cons = []
+    for _ in calls[1:]:
+        con = db.acquire(blocking=False)
+        if con is None:
+            break
+        cons.append(con)
+    futures = [_side_executor(db).submit(_run_on, db, con, fn) for con, fn in zip(cons, calls[1:])]
+    first = calls[0]()
+    return [first] + [f.result() for f in futures] + [fn() for fn in calls[1 + len(cons):]]
+
+
+def init_app(app, db):
+    @app.teardown_appcontext
+    def _release_db(exc):
+        release_con(db)
@@ -0,0 +1,258 @@
+# degree audit against the requirements table
+#
+# every requirement area of a program (min credits, min gpa) is checked
+# against the student's grades and planned courses in the program's eligible
+# major courses. a student's audit keeps their enrollments and planned
+# courses in memory: it is read from the database once, then the history and
+# plan endpoints hand it each change after their write commits, so later
+# audits come straight from memory. a whole program is audited with one
+# aggregate query instead.
+import threading
+
+import catalog_hooks
+import statements
+from student_cache import LRUCache, PASSING
+
+GRADE_POINTS = {'A': 4.0, 'A-': 3.7, 'B+': 3.3, 'B': 3.0, 'B-': 2.7, 'C+': 2.3, 'C': 2.0, 'C-': 1.7,
+                'D': 1.0, 'F': 0.0}
+
+_audits = LRUCache()
+_programs = {}   # prog_id -> program, requirements and major course credits
+_lock = threading.Lock()
+
+
+def program_info(run_query, prog_id):
+    info = _programs.get(prog_id)
+    if info is not None:
+        return info
+    prog = run_query("SELECT prog_id, name, program_type FROM program WHERE prog_id = ?", (prog_id,))
+    reqs = run_query("""
+        SELECT req_id, area_id, name, min_credits, CAST(min_gpa AS DOUBLE) AS min_gpa
+        FROM requirements WHERE prog_id = ? ORDER BY req_id
+    """, (prog_id,))
+    credits = {r['course_id']: r['credits'] or 0 for r in run_query("""
+        SELECT mc.course_id, CAST(c.credits AS INT) AS credits
+        FROM major_courses mc
+        JOIN course c ON c.course_id = mc.course_id
+        WHERE mc.major_id = ? AND mc.eligible_course = TRUE
+    """, (prog_id,))}
+    info = {'program': prog[0] if prog else None, 'requirements': reqs, 'credits': credits}
+    with _lock:
+        _programs[prog_id] = info
+    return info
+
+
+def evaluate(requirements, totals):
+    """
+    Areas with their status: met (credits and gpa reached), on_track
+    (reached once planned courses pass) or short.
+    """
+    gpa = round(totals['points'] / totals['gpa_credits'], 2) if totals['gpa_credits'] else None
+    areas = []
+    for r in requirements:
+        gpa_ok = gpa is None or gpa >= r['min_gpa']
+        if totals['completed_credits'] >= r['min_credits'] and gpa_ok and gpa is not None:
+            status = 'met'
+        elif totals['completed_credits'] + totals['planned_credits'] >= r['min_credits'] and gpa_ok:
+            status = 'on_track'
+        else:
+            status = 'short'
+        areas.append(dict(
+            r,
+            completed_credits=totals['completed_credits'],
+            planned_credits=totals['planned_credits'],
+            gpa=gpa,
+            remaining_credits=max(0, r['min_credits'] - totals['completed_credits']),
+            status=status,
+        ))
+    return {
+        'areas': areas,
+        'complete': bool(areas) and all(a['status'] == 'met' for a in areas),
+        **totals,
+        'gpa': gpa,
+    }
+
+
+class StudentAudit:
+    def __init__(self, stu_id, prog_id, enrollments, planned):
+        # enrollments: {enroll_id: (course_id, grade)}; planned: {pc_id: course_id}
+        self.stu_id = stu_id
+        self.prog_id = prog_id
+        self.enrollments = enrollments
+        self.planned = planned
+
+    def totals(self, credits):
+        # credits: the program's major courses; other courses do not count
+        passed = set()
+        points = gpa_credits = 0.0
+        for course_id, grade in self.enrollments.values():
+            if course_id not in credits or grade is None:
+                continue
+            if grade in PASSING:
+                passed.add(course_id)
+            if grade in GRADE_POINTS:
+                points += GRADE_POINTS[grade] * credits[course_id]
+                gpa_credits += credits[course_id]
+        planned = {c for c in self.planned.values() if c in credits and c not in passed}
+        return {
+            'completed_credits': sum(credits[c] for c in passed),
+            'planned_credits': sum(credits[c] for c in planned),
+            'points': points,
+            'gpa_credits': gpa_credits,
+        }
+
+
+PRIMARY_MAJOR_ID_SQL = statements.define(
+    'primary_major_id', "SELECT prog_id FROM student_program WHERE stu_id = ? AND primary_flag = TRUE LIMIT 1")
+ENROLLMENTS_SQL = statements.define('audit_enrollments', """
+    SELECT e.enroll_id, s.course_id, e.grade
+    FROM enrollment e
+    JOIN section s ON s.section_id = e.section_id
+    WHERE e.stu_id = ?
+""")
+PLANNED_SQL = statements.define('audit_planned', """
+    SELECT pc.pc_id, COALESCE(pc.course_id, sec.course_id) AS course_id
+    FROM planned_course pc
+    JOIN degree_plan dp ON dp.plan_id = pc.plan_id
+    LEFT JOIN section sec ON sec.section_id = pc.section_id
+    WHERE dp.stu_id = ?
+""")
+
+
+def load(run_query, stu_id):
+    major = run_query(PRIMARY_MAJOR_ID_SQL, (stu_id,))
+    enrollments = {r['enroll_id']: (r['course_id'], r['grade']) for r in run_query(ENROLLMENTS_SQL, (stu_id,))}
+    planned = {r['pc_id']: r['course_id'] for r in run_query(PLANNED_SQL, (stu_id,))}
+    return StudentAudit(stu_id, major[0]['prog_id'] if major else None, enrollments, planned)
+
+
+def audit(run_query, stu_id):
+    student = _audits.get(stu_id, lambda: load(run_query, stu_id))
+    if student.prog_id is None:
+        return {'stu_id': stu_id, 'program': None, 'areas': [], 'complete': False}
+    info = program_info(run_query, student.prog_id)
+    with _lock:
+        totals = student.totals(info['credits'])
+    return {'stu_id': stu_id, 'program': info['program'], **evaluate(info['requirements'], totals)}
+
+
+def audit_program(run_query, prog_id):
+    # every student whose primary major is prog_id, from one aggregate
+    info = program_info(run_query, prog_id)
+    rows = run_query("""
+        WITH major AS (
+            SELECT mc.course_id, CAST(c.credits AS INT) AS credits
+            FROM major_courses mc
+            JOIN course c ON c.course_id = mc.course_id
+            WHERE mc.major_id = ? AND mc.eligible_course = TRUE
+        ),
+        students AS (
+            SELECT stu_id FROM student_program WHERE prog_id = ? AND primary_flag = TRUE
+        ),
+        graded AS (
+            SELECT e.stu_id, s.course_id, e.grade, m.credits
+            FROM enrollment e
+            JOIN students st ON st.stu_id = e.stu_id
+            JOIN section s ON s.section_id = e.section_id
+            JOIN major m ON m.course_id = s.course_id
+            WHERE e.grade IS NOT NULL
+        ),
+        passed AS (
+            SELECT DISTINCT stu_id, course_id, credits FROM graded WHERE list_contains(?, grade)
+        ),
+        planned AS (
+            SELECT DISTINCT dp.stu_id, m.course_id, m.credits
+            FROM planned_course pc
+            JOIN degree_plan dp ON dp.plan_id = pc.plan_id
+            JOIN students st ON st.stu_id = dp.stu_id
+            LEFT JOIN section sec ON sec.section_id = pc.section_id
+            JOIN major m ON m.course_id = COALESCE(pc.course_id, sec.course_id)
+        ),
+        points AS (
+            SELECT g.stu_id, SUM(gp.points * g.credits) AS points, SUM(g.credits) AS gpa_credits
+            FROM graded g
+            JOIN (SELECT UNNEST(?) AS grade, UNNEST(?) AS points) gp ON gp.grade = g.grade
+            GROUP BY g.stu_id
+        )
+        SELECT st.stu_id,
+               COALESCE((SELECT SUM(credits) FROM passed p WHERE p.stu_id = st.stu_id), 0) AS completed_credits,
+               COALESCE((SELECT SUM(credits) FROM planned p WHERE p.stu_id = st.stu_id
+                         AND NOT EXISTS (SELECT 1 FROM passed x
+                                         WHERE x.stu_id = p.stu_id AND x.course_id = p.course_id)), 0)
+                   AS planned_credits,
+               COALESCE(pt.points, 0) AS points,
+               COALESCE(pt.gpa_credits, 0) AS gpa_credits
+        FROM students st
+        LEFT JOIN points pt ON pt.stu_id = st.stu_id
+        ORDER BY st.stu_id
+    """, (prog_id, prog_id, list(PASSING), list(GRADE_POINTS), list(GRADE_POINTS.values())))
+    students = []
+    for r in rows:
+        totals = {k: r[k] for k in ('completed_credits', 'planned_credits')}
+        totals['points'] = float(r['points'])
+        totals['gpa_credits'] = float(r['gpa_credits'])
+        students.append({'stu_id': r['stu_id'], **evaluate(info['requirements'], totals)})
+    return {
+        'program': info['program'],
+        'requirements': info['requirements'],
+        'students': students,
+        'summary': {
+            'students': len(students),
+            'complete': sum(1 for s in students if s['complete']),
+            'on_track': sum(1 for s in students if all(a['status'] != 'short' for a in s['areas'])),
+        },
+    }
+
+
+# changes from the write endpoints, applied after they commit. a student
+# whose audit is not in memory is invalidated instead, so a load that raced
+# with the write is not kept
+
+def _update(stu_id, change):
+    student = _audits.peek(stu_id)
+    if student is None:
+        _audits.invalidate(stu_id)
+        return
+    with _lock:
+        ok = change(student)
+    if ok is False:
+        _audits.invalidate(stu_id)
+
+
+def record_grade(stu_id, enroll_id, course_id, grade):
+    def change(student):
+        student.enrollments[enroll_id] = (course_id, grade)
+    _update(stu_id, change)
+
+
+def update_grade(stu_id, enroll_id, grade):
+    def change(student):
+        if enroll_id not in student.enrollments:
+            return False
+        student.enrollments[enroll_id] = (student.enrollments[enroll_id][0], grade)
+    _update(stu_id, change)
+
+
+def drop_enrollment(stu_id, enroll_id):
+    _update(stu_id, lambda student: student.enrollments.pop(enroll_id, None) and None)
+
+
+def record_planned(stu_id, pc_id, course_id):
+    def change(student):
+        student.planned[pc_id] = course_id
+    _update(stu_id, change)
+
+
+def drop_planned(stu_id, pc_id):
+    _update(stu_id, lambda student: student.planned.pop(pc_id, None) and None)
+
+
+def invalidate(stu_id):
+    _audits.invalidate(stu_id)
+
+
+@catalog_hooks.on_change
+def clear():
+    with _lock:
+        _programs.clear()
+    _audits.clear()
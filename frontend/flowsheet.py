@@ -0,0 +1,77 @@
+# suggested course order per program, compiled once from the catalog
+#
+# the flowsheet table places some of a program's courses in a semester and an
+# order. every other course falls back to a semester and an order from its
+# course number (course.cata_number, filled in by import_catalog). both
+# compile to dicts keyed by course id, so ranking recommendations is a lookup
+# per course instead of string keys and a regex per comparison.
+import threading
+
+import catalog_hooks
+
+
+def level_semester(number):
+    # 100-level courses are first year, 200-level second year and so on;
+    # courses without a number go last
+    if number is None:
+        return 8
+    if number < 200:
+        return 1
+    if number < 300:
+        return 3
+    if number < 400:
+        return 5
+    return 7
+
+
+class Flowsheets:
+    def __init__(self, courses, rows):
+        # courses: rows with course_id, subject, cata_num, cata_number
+        # rows: flowsheet rows with prog_id, course_id, semester, priority
+        self.default = {}
+        for r in courses:
+            number = r['cata_number']
+            self.default[r['course_id']] = (
+                level_semester(number), 999 if number is None else number, r['subject'], str(r['cata_num']))
+
+        # sheet courses sort by priority, ahead of every other course
+        self.sheets = {}
+        for r in sorted(rows, key=lambda r: (r['prog_id'], r['priority'])):
+            sheet = self.sheets.setdefault(r['prog_id'], {})
+            sheet[r['course_id']] = (r['semester'], (len(sheet), '', ''))
+
+    def rank(self, prog_id, course_id):
+        # (semester, sort key) of a course for students of prog_id
+        sheet = self.sheets.get(prog_id)
+        size = 0
+        if sheet is not None:
+            found = sheet.get(course_id)
+            if found is not None:
+                return found
+            size = len(sheet)
+        semester, number, subject, cata_num = self.default[course_id]
+        return semester, (size + number, subject, cata_num)
+
+
+_sheets = None
+_lock = threading.Lock()
+
+
+def current(run_query):
+    global _sheets
+    sheets = _sheets
+    if sheets is not None:
+        return sheets
+    with _lock:
+        if _sheets is None:
+            courses = run_query("SELECT course_id, subject, cata_num, cata_number FROM course")
+            rows = run_query("SELECT prog_id, course_id, semester, priority FROM flowsheet")
+            _sheets = Flowsheets(courses, rows)
+        return _sheets
+
+
+@catalog_hooks.on_change
+def invalidate():
+    global _sheets
+    with _lock:
+        _sheets = None
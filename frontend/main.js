@@ -40,6 +40,60 @@ async function api(path, opts={}){
     return j;
 }
 
+// the element after el that pageInto watches, created on first use
+function markerAfter(el){
+    let m = el.nextElementSibling;
+    if (!m || !m.classList.contains('page-marker')){
+        m = document.createElement('div');
+        m.className = 'page-marker';
+        el.after(m);
+    }
+    return m;
+}
+
+// infinite scroll over a paged listing ({items, next}). fetchPage(cursor)
+// gets a page, null for the first; render(items, first) shows one. the next
+// page loads when marker scrolls into view. first is an already fetched first
+// page (e.g. from bootstrap). a newer call for the same marker replaces this one
+const pagers = new WeakMap();
+function pageInto(marker, fetchPage, render, first){
+    pagers.get(marker)?.disconnect();
+    let next = null, busy = false;
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(e => e.isIntersecting)) more();
+    });
+    pagers.set(marker, observer);
+    const current = () => pagers.get(marker) === observer;
+
+    function take(j, isFirst){
+        if (!current()) return;
+        render(j.items || [], isFirst);
+        next = j.next;
+        // observing again reports the marker at once if it is still in view
+        observer.unobserve(marker);
+        if (next) observer.observe(marker);
+        else observer.disconnect();
+    }
+    async function more(){
+        if (busy || !next || !current()) return;
+        busy = true;
+        try { take(await fetchPage(next), false); }
+        catch(e){ toast(e.message); }
+        finally { busy = false; }
+    }
+    return (first ? Promise.resolve(first) : fetchPage(null)).then(j => take(j, true));
+}
+
+function stopPaging(el){
+    const m = markerAfter(el);
+    pagers.get(m)?.disconnect();
+    pagers.delete(m);
+}
+
+function pageQuery(cursor){
+    return cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+}
+
 function renderRoute(){
     const p = location.pathname;
     let page = '#home';
@@ -57,7 +111,7 @@ function renderRoute(){
 
     // load data for the page
     if (page === '#plan' && state.stu_id && state.plan_id){
-        Promise.all([loadPlan(), loadRecommendations(), loadSummary(), loadAdvisors()]);
+        loadBootstrap(`stu_id=${state.stu_id}&plan_id=${state.plan_id}`).catch(e => toast(e.message));
     } else if (page === '#history' && state.stu_id){
         loadHistoryPage();
     }
@@ -114,10 +168,6 @@ function renderPlan(data){
     });
 }
 
-function gradePoints(g){
-  const m = {'A':4,'A-':3.7,'B+':3.3,'B':3,'B-':2.7,'C+':2.3,'C':2,'C-':1.7,'D':1,'F':0};
-  return m[g] ?? null;
-}
 function standingFromCredits(c){
   if(c>=90) return 'Senior';
   if(c>=60) return 'Junior';
@@ -130,22 +180,17 @@ function dayName(n){
   return map[n] || n;
 }
 
-async function loadSummary(target = {credits:'#sum_credits', gpa:'#sum_gpa', standing:'#sum_standing'}){
+async function loadSummary(target){
   if(!state.stu_id) return;
-  const j = await api(`/api/history?stu_id=${state.stu_id}`);
-  let credits = 0, points = 0;
-  j.items.forEach(it=>{
-    const gp = gradePoints(String(it.grade||'').toUpperCase());
-    const cr = Number(it.credits||0);
-    if(gp !== null && cr > 0){
-      credits += cr;
-      points  += gp * cr;
-    }
-  });
-  const gpa = credits ? (points / credits) : 0;
-  document.querySelector(target.credits).textContent  = credits;
-  document.querySelector(target.gpa).textContent      = gpa.toFixed(2);
-  document.querySelector(target.standing).textContent = standingFromCredits(credits);
+  // the whole history's totals; the history itself comes a page at a time
+  const j = await api(`/api/history/summary?stu_id=${state.stu_id}`);
+  renderSummary(j, target);
+}
+
+function renderSummary(summary, target = {credits:'#sum_credits', gpa:'#sum_gpa', standing:'#sum_standing'}){
+  document.querySelector(target.credits).textContent  = summary.credits;
+  document.querySelector(target.gpa).textContent      = summary.gpa.toFixed(2);
+  document.querySelector(target.standing).textContent = standingFromCredits(summary.credits);
 }
 
 
@@ -165,9 +210,13 @@ async function fetchPrograms(){
 async function loadCurrentMajor(){
   if(!state.stu_id) return;
   const j = await api(`/api/student/major?stu_id=${state.stu_id}`);
+  renderCurrentMajor(j.item);
+}
+
+function renderCurrentMajor(item){
   const sel = $('#major_select');
-  if(j.item){
-    sel.value = j.item.prog_id;
+  if(sel && item){
+    sel.value = item.prog_id;
   }
 }
 
@@ -186,42 +235,49 @@ async function saveMajor(){
 
 async function loadRecommendations(){
     if(!state.stu_id || !state.plan_id) return;
-    const j = await api(`/api/recommendations?stu_id=${state.stu_id}&plan_id=${state.plan_id}`);
+    await renderRecommendations();
+}
+
+// first is the first page when bootstrap already fetched it
+function renderRecommendations(first){
     const div = $('#rec_list');
-    div.innerHTML = '';
-    if(!j.items.length){
-        div.innerHTML = `<div class="meta">No recommendations. You may have satisfied all core courses or need to mark more completed.</div>`;
-        return;
-    }
-    // items ordered by semester standing
-    j.items.forEach(it => {
-        const row = document.createElement('div');
-        row.innerHTML = `<div>
-        <div><b>${it.subject} ${it.cata_num}</b> · ${it.title}</div>
-        <div class="meta">id ${it.course_id} · ${it.credits} credits</div>
-        </div>`;
-        const add = document.createElement('button');
-        add.textContent = 'Add to plan';
-        add.addEventListener('click', async () => {
-        try {
-            await api('/api/plan/add_course', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({
-                plan_id: state.plan_id,
-                term_id: 8,
-                course_id: it.course_id
-            })
-            });
-            toast('Added');
-            await Promise.all([loadPlan(), loadRecommendations(), loadSummary()]);
-        } catch (e) {
-            toast(e.message);
+    const path = `/api/recommendations?stu_id=${state.stu_id}&plan_id=${state.plan_id}`;
+    return pageInto(markerAfter(div), cursor => api(path + pageQuery(cursor)), (items, isFirst) => {
+        if (isFirst) div.innerHTML = '';
+        if (isFirst && !items.length){
+            div.innerHTML = `<div class="meta">No recommendations. You may have satisfied all core courses or need to mark more completed.</div>`;
+            return;
         }
+        // items ordered by semester standing
+        items.forEach(it => {
+            const row = document.createElement('div');
+            row.innerHTML = `<div>
+            <div><b>${it.subject} ${it.cata_num}</b> · ${it.title}</div>
+            <div class="meta">id ${it.course_id} · ${it.credits} credits</div>
+            </div>`;
+            const add = document.createElement('button');
+            add.textContent = 'Add to plan';
+            add.addEventListener('click', async () => {
+                try {
+                    await api('/api/plan/add_course', {
+                        method: 'POST',
+                        headers: {'Content-Type': 'application/json'},
+                        body: JSON.stringify({
+                            plan_id: state.plan_id,
+                            term_id: 8,
+                            course_id: it.course_id
+                        })
+                    });
+                    toast('Added');
+                    await Promise.all([loadPlan(), loadRecommendations(), loadSummary()]);
+                } catch (e) {
+                    toast(e.message);
+                }
+            });
+            row.appendChild(add);
+            div.appendChild(row);
         });
-        row.appendChild(add);
-        div.appendChild(row);
-    });
+    }, first);
 }
 
 async function fetchSubjects(){
@@ -246,7 +302,19 @@ async function loadAdvisors(){
 
   try {
     const j = await api('/api/advisors');
-    const items = j.items || [];
+    renderAdvisors(j.items || []);
+  } catch (e) {
+    tableBody.innerHTML = `
+      <tr>
+        <td colspan="2" class="muted">Error loading advisors.</td>
+      </tr>`;
+    toast(e.message);
+  }
+}
+
+function renderAdvisors(items){
+    const tableBody = document.querySelector('#advisor_table tbody');
+    if (!tableBody) return;
 
     if (!items.length){
       tableBody.innerHTML = `
@@ -266,13 +334,6 @@ async function loadAdvisors(){
       `;
       tableBody.appendChild(tr);
     });
-  } catch (e) {
-    tableBody.innerHTML = `
-      <tr>
-        <td colspan="2" class="muted">Error loading advisors.</td>
-      </tr>`;
-    toast(e.message);
-  }
 }
 
 async function loadPlan(){
@@ -280,66 +341,140 @@ async function loadPlan(){
     const j = await api(`/api/plan?plan_id=${state.plan_id}`);
     renderPlan(j);
 }
+
+// profile, plan, major, summary, recommendations and advisors in one request
+async function loadBootstrap(query){
+    const j = await api(`/api/bootstrap?${query}`);
+    state.plan_id = j.plan_id;
+    state.stu_id = j.student.stu_id;
+    renderProfile(j.student);
+    if (j.plan) renderPlan(j.plan);
+    renderCurrentMajor(j.major);
+    renderSummary(j.summary);
+    renderRecommendations({items: j.recommendations, next: j.recommendations_next});
+    renderAdvisors(j.advisors);
+    return j;
+}
 async function loadHistoryPage(){
     if(!state.stu_id) return;
-    const j = await api(`/api/history?stu_id=${state.stu_id}`);
     const tbody = document.querySelector('#history_table tbody');
-    tbody.innerHTML = '';
-    if(!j.items.length){
-        const tr = document.createElement('tr');
-        tr.innerHTML = `<td colspan="5" class="muted">No completed courses recorded yet.</td>`;
-        tbody.appendChild(tr);
-    } else {
-        j.items.forEach(h=>{
-        const tr = document.createElement('tr');
-
-        // grade select
-        const sel = document.createElement('select');
-        ['A','A-','B+','B','B-','C+','C','C-','D','F','P','NP'].forEach(g=>{
-            const o = document.createElement('option'); o.value=g; o.textContent=g;
-            if ((h.grade||'').toUpperCase() === g) o.selected = true;
-            sel.appendChild(o);
-        });
-        const save = document.createElement('button');
-        save.textContent = 'Save';
-        save.addEventListener('click', async ()=>{
-            try{
-            await api('/api/history/update_grade', {
-                method:'POST',
-                headers:{'Content-Type':'application/json'},
-                body:JSON.stringify({ stu_id: state.stu_id, enroll_id: h.enroll_id, grade: sel.value })
+    const path = `/api/history?stu_id=${state.stu_id}`;
+    await pageInto(markerAfter($('#history_table')), cursor => api(path + pageQuery(cursor)), (items, isFirst) => {
+        if (isFirst) tbody.innerHTML = '';
+        if (isFirst && !items.length){
+            const tr = document.createElement('tr');
+            tr.innerHTML = `<td colspan="5" class="muted">No completed courses recorded yet.</td>`;
+            tbody.appendChild(tr);
+            return;
+        }
+        items.forEach(h=>{
+            const tr = document.createElement('tr');
+
+            // grade select
+            const sel = document.createElement('select');
+            ['A','A-','B+','B','B-','C+','C','C-','D','F','P','NP'].forEach(g=>{
+                const o = document.createElement('option'); o.value=g; o.textContent=g;
+                if ((h.grade||'').toUpperCase() === g) o.selected = true;
+                sel.appendChild(o);
             });
-            toast('Grade updated');
-            await Promise.all([loadHistoryPage(), loadRecommendations(), loadSummary()]);
-            }catch(e){ toast(e.message); }
-        });
-        const del = document.createElement('button');
-        del.className = 'ghost';
-        del.textContent = 'Remove';
-        del.addEventListener('click', async ()=>{
-            try{
-            await api('/api/history/remove', {
-                method:'POST',
-                headers:{'Content-Type':'application/json'},
-                body:JSON.stringify({ stu_id: state.stu_id, enroll_id: h.enroll_id })
+            const save = document.createElement('button');
+            save.textContent = 'Save';
+            save.addEventListener('click', async ()=>{
+                try{
+                    await api('/api/history/update_grade', {
+                        method:'POST',
+                        headers:{'Content-Type':'application/json'},
+                        body:JSON.stringify({ stu_id: state.stu_id, enroll_id: h.enroll_id, grade: sel.value })
+                    });
+                    toast('Grade updated');
+                    await Promise.all([loadHistoryPage(), loadRecommendations(), loadSummary()]);
+                }catch(e){ toast(e.message); }
+            });
+            const del = document.createElement('button');
+            del.className = 'ghost';
+            del.textContent = 'Remove';
+            del.addEventListener('click', async ()=>{
+                try{
+                    await api('/api/history/remove', {
+                        method:'POST',
+                        headers:{'Content-Type':'application/json'},
+                        body:JSON.stringify({ stu_id: state.stu_id, enroll_id: h.enroll_id })
+                    });
+                    toast('Removed');
+                    await Promise.all([loadHistoryPage(), loadRecommendations(), loadSummary()]);
+                }catch(e){ toast(e.message); }
             });
-            toast('Removed');
-            await Promise.all([loadHistoryPage(), loadRecommendations(), loadSummary()]);
-            }catch(e){ toast(e.message); }
-        });
 
-        tr.innerHTML = `<td>${h.term_code || ''}</td>
-                        <td>${h.subject} ${h.cata_num}</td>
-                        <td>${h.title}</td>
-                        <td>${h.credits}</td>
-                        <td>${h.grade || ''}</td>`;
-        tr.children[4].appendChild(sel);
-        tr.children[4].appendChild(save);
-        tr.children[4].appendChild(del);
-        tbody.appendChild(tr);
+            tr.innerHTML = `<td>${h.term_code || ''}</td>
+                            <td>${h.subject} ${h.cata_num}</td>
+                            <td>${h.title}</td>
+                            <td>${h.credits}</td>
+                            <td>${h.grade || ''}</td>`;
+            tr.children[4].appendChild(sel);
+            tr.children[4].appendChild(save);
+            tr.children[4].appendChild(del);
+            tbody.appendChild(tr);
         });
-  }
-  await loadSummary({credits:'#sum_credits_hist', gpa:'#sum_gpa_hist', standing:'#sum_standing_hist'});
+    });
+    await loadSummary({credits:'#sum_credits_hist', gpa:'#sum_gpa_hist', standing:'#sum_standing_hist'});
+}
+
+// meetings grouped by section, so each section is one row. a page never
+// splits a section's meetings
+function groupSections(items){
+    const sections = new Map();
+    items.forEach(sec => {
+        let entry = sections.get(sec.section_id);
+        if (!entry) {
+            entry = {
+                section_id: sec.section_id,
+                course_code: sec.course_code,
+                title: sec.title,
+                location: sec.location,
+                start_time: sec.start_time,
+                end_time: sec.end_time,
+                days: []
+            };
+            sections.set(sec.section_id, entry);
+        }
+        entry.days.push(dayName(sec.days_of_week));
+    });
+    return Array.from(sections.values());
+}
+
+// a table row for a section, with its action button
+function sectionRow(sec, label, className, onClick){
+    const start = sec.start_time ? String(sec.start_time).substring(0,5) : '';
+    const end = sec.end_time ? String(sec.end_time).substring(0,5)   : '';
+    const tr = document.createElement('tr');
+    tr.innerHTML = `
+        <td>${sec.course_code}</td>
+        <td>${sec.title}</td>
+        <td>${sec.days.join(', ')}</td>
+        <td>${start}–${end}</td>
+        <td>${sec.location || ''}</td>
+        <td><button class="${className}" data-sec="${sec.section_id}">${label}</button></td>
+    `;
+    tr.querySelector('button').addEventListener('click', onClick);
+    return tr;
+}
+
+function sectionTable(lastHeading){
+    return `
+        <table>
+            <thead>
+                <tr>
+                    <th>Course</th>
+                    <th>Title</th>
+                    <th>Day(s)</th>
+                    <th>Time</th>
+                    <th>Location</th>
+                    <th>${lastHeading}</th>
+                </tr>
+            </thead>
+            <tbody></tbody>
+        </table>
+    `;
 }
 
 async function loadFinalSchedule(){
@@ -349,84 +484,33 @@ async function loadFinalSchedule(){
     if (!div) return;
 
     try {
-        const j = await api(`/api/final_schedule?stu_id=${state.stu_id}`);
-        const items = j.items || [];
-
-        if (!items.length){
-            div.innerHTML = `<div class="muted">No classes chosen yet.</div>`;
-            return;
-        }
-
-        // Group meetings by section_id so each enrolled section is one row
-        const sections = new Map();
-
-        items.forEach(sec => {
-            let entry = sections.get(sec.section_id);
-            if (!entry) {
-                entry = {
-                    section_id: sec.section_id,
-                    course_code: sec.course_code,
-                    title: sec.title,
-                    location: sec.location,
-                    start_time: sec.start_time,
-                    end_time: sec.end_time,
-                    days: []
-                };
-                sections.set(sec.section_id, entry);
-            }
-            entry.days.push(dayName(sec.days_of_week));
-        });
-
-        const rowsHtml = Array.from(sections.values()).map(sec => {
-            const start = sec.start_time ? String(sec.start_time).substring(0,5) : '';
-            const end = sec.end_time ? String(sec.end_time).substring(0,5)   : '';
-            const daysText = sec.days.join(', ');
-            return `
-                <tr>
-                    <td>${sec.course_code}</td>
-                    <td>${sec.title}</td>
-                    <td>${daysText}</td>
-                    <td>${start}–${end}</td>
-                    <td>${sec.location || ''}</td>
-                    <td><button class="ghost" data-sec="${sec.section_id}">Remove</button></td>
-                </tr>
-            `;
-        }).join('');
-
-        div.innerHTML = `
-            <table>
-                <thead>
-                    <tr>
-                        <th>Course</th>
-                        <th>Title</th>
-                        <th>Day(s)</th>
-                        <th>Time</th>
-                        <th>Location</th>
-                        <th>Actions</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    ${rowsHtml}
-                </tbody>
-            </table>
-        `;
-
-        div.querySelectorAll('button[data-sec]').forEach(btn => {
-            btn.addEventListener('click', async () => {
-                try {
-                    await api('/api/final_schedule/remove', {
-                        method:'POST',
-                        headers:{'Content-Type':'application/json'},
-                        body: JSON.stringify({
-                            stu_id: state.stu_id,
-                            section_id: Number(btn.dataset.sec)
-                        })
-                    });
-                    toast('Removed from schedule');
-                    await loadFinalSchedule();
-                } catch(e) {
-                    toast(e.message);
+        const path = `/api/final_schedule?stu_id=${state.stu_id}`;
+        await pageInto(markerAfter(div), cursor => api(path + pageQuery(cursor)), (items, isFirst) => {
+            if (isFirst){
+                if (!items.length){
+                    div.innerHTML = `<div class="muted">No classes chosen yet.</div>`;
+                    return;
                 }
+                div.innerHTML = sectionTable('Actions');
+            }
+            const tbody = div.querySelector('tbody');
+            groupSections(items).forEach(sec => {
+                tbody.appendChild(sectionRow(sec, 'Remove', 'ghost', async () => {
+                    try {
+                        await api('/api/final_schedule/remove', {
+                            method:'POST',
+                            headers:{'Content-Type':'application/json'},
+                            body: JSON.stringify({
+                                stu_id: state.stu_id,
+                                section_id: sec.section_id
+                            })
+                        });
+                        toast('Removed from schedule');
+                        await loadFinalSchedule();
+                    } catch(e) {
+                        toast(e.message);
+                    }
+                }));
             });
         });
 
@@ -445,85 +529,35 @@ async function loadSchedulePage(){
     div.innerHTML = '<div class="muted">Loading available class times...</div>';
 
     try {
-        const j = await api(`/api/schedule?plan_id=${state.plan_id}`);
-        const items = j.items || [];
-
-        if (!items.length){
-            div.innerHTML = `<div class="muted">No available schedule times found for your planned courses.</div>`;
-            await loadFinalSchedule();
-            return;
-        }
-
-        // Group meetings by section_id so each section is one row
-        const sections = new Map();
-
-        items.forEach(sec => {
-            let entry = sections.get(sec.section_id);
-            if (!entry) {
-                entry = {
-                    section_id: sec.section_id,
-                    course_code: sec.course_code,
-                    title: sec.title,
-                    location: sec.location,
-                    start_time: sec.start_time,
-                    end_time: sec.end_time,
-                    days: []
-                };
-                sections.set(sec.section_id, entry);
-            }
-            entry.days.push(dayName(sec.days_of_week));
-        });
-
-        const rowsHtml = Array.from(sections.values()).map(sec => {
-            const start = sec.start_time ? String(sec.start_time).substring(0,5) : '';
-            const end = sec.end_time ? String(sec.end_time).substring(0,5)   : '';
-            const daysText = sec.days.join(', ');  
-            return `
-                <tr>
-                    <td>${sec.course_code}</td>
-                    <td>${sec.title}</td>
-                    <td>${daysText}</td>
-                    <td>${start}–${end}</td>
-                    <td>${sec.location || ''}</td>
-                    <td><button data-sec="${sec.section_id}">Choose</button></td>
-                </tr>
-            `;
-        }).join('');
-
-        div.innerHTML = `
-            <table>
-                <thead>
-                    <tr>
-                        <th>Course</th>
-                        <th>Title</th>
-                        <th>Day(s)</th>
-                        <th>Time</th>
-                        <th>Location</th>
-                        <th></th>
-                    </tr>
-                </thead>
-                <tbody>
-                    ${rowsHtml}
-                </tbody>
-            </table>
-        `;
-
-        div.querySelectorAll('button[data-sec]').forEach(btn => {
-            btn.addEventListener('click', async () => {
-                try {
-                    await api('/api/enroll', {
-                        method:'POST',
-                        headers:{'Content-Type':'application/json'},
-                        body: JSON.stringify({
-                            stu_id: state.stu_id,
-                            section_id: Number(btn.dataset.sec)
-                        })
-                    });
-                    toast('Enrolled successfully!');
-                    await loadFinalSchedule();
-                } catch(e) {
-                    toast(e.message);
+        const path = `/api/schedule?plan_id=${state.plan_id}`;
+        await pageInto(markerAfter(div), cursor => api(path + pageQuery(cursor)), (items, isFirst) => {
+            if (isFirst){
+                if (!items.length){
+                    div.innerHTML = `<div class="muted">No available schedule times found for your planned courses.</div>`;
+                    return;
                 }
+                div.innerHTML = sectionTable('');
+            }
+            const tbody = div.querySelector('tbody');
+            groupSections(items).forEach(sec => {
+                tbody.appendChild(sectionRow(sec, 'Choose', '', async () => {
+                    try {
+                        const j = await api('/api/enroll', {
+                            method:'POST',
+                            headers:{'Content-Type':'application/json'},
+                            body: JSON.stringify({
+                                stu_id: state.stu_id,
+                                section_id: sec.section_id
+                            })
+                        });
+                        toast(j.status === 'WAITLISTED'
+                            ? `Section is full, waitlisted at position ${j.position}`
+                            : 'Enrolled successfully!');
+                        await loadFinalSchedule();
+                    } catch(e) {
+                        toast(e.message);
+                    }
+                }));
             });
         });
 
@@ -537,31 +571,94 @@ async function loadSchedulePage(){
     }
 }
 
+// ranked conflict-free schedules for the plan's courses, best first
+async function generateSchedules(){
+    if (!state.plan_id) return;
+    const status = $('#gen_status');
+    const out = $('#gen_results');
+    const params = new URLSearchParams({ plan_id: state.plan_id, max_results: $('#gen_max').value });
+    if ($('#gen_earliest').value) params.set('earliest', $('#gen_earliest').value);
+    if ($('#gen_latest').value) params.set('latest', $('#gen_latest').value);
+    const off = Array.from($$('#gen_free_days input:checked')).map(cb => cb.value);
+    if (off.length) params.set('free_days', off.join(','));
+
+    status.textContent = 'Searching...';
+    out.innerHTML = '';
+    try {
+        const j = await api(`/api/schedule/generate?${params}`);
+        status.textContent = j.unscheduled.length
+            ? `No sections fit for: ${j.unscheduled.join(', ')}`
+            : '';
+        j.schedules.forEach(renderGeneratedSchedule);
+        const note = j.timed_out ? ' (time limit reached, showing the best found)' : '';
+        if (!j.schedules.length) status.textContent += ' No conflict-free schedule found.';
+        else status.textContent += ` ${j.schedules.length} of ${j.found} schedules${note}`;
+    } catch(e){
+        status.textContent = '';
+        toast(e.message);
+    }
+}
+
+function renderGeneratedSchedule(msg){
+    const out = $('#gen_results');
+    const row = document.createElement('div');
+    const lines = msg.sections.map(sec => {
+        const days = sec.meetings.map(m => dayName(m.days_of_week)).join(', ');
+        const m = sec.meetings[0];
+        const time = m ? `${m.start_time.substring(0,5)}–${m.end_time.substring(0,5)}` : '';
+        return `<div>${sec.course_code} · ${days} ${time}</div>`;
+    }).join('');
+    row.innerHTML = `
+        <div>
+            <b>#${msg.rank}</b>
+            <span class="meta">${msg.score.days} days · ${msg.score.gap_minutes} min between classes · starts ${msg.score.first_start}</span>
+            ${lines}
+        </div>`;
+    const btn = document.createElement('button');
+    btn.textContent = 'Enroll in all';
+    btn.addEventListener('click', async () => {
+        try {
+            let waitlisted = 0;
+            for (const sec of msg.sections){
+                const j = await api('/api/enroll', {
+                    method:'POST',
+                    headers:{'Content-Type':'application/json'},
+                    body: JSON.stringify({ stu_id: state.stu_id, section_id: sec.section_id })
+                });
+                if (j.status === 'WAITLISTED') waitlisted++;
+            }
+            toast(waitlisted ? `Enrolled, waitlisted for ${waitlisted} full section(s)` : 'Enrolled successfully!');
+            await loadFinalSchedule();
+        } catch(e){
+            toast(e.message);
+        }
+    });
+    row.appendChild(btn);
+    out.appendChild(row);
+}
+
 
 async function onSignin(){
     const login_id = $('#login_id').value.trim();
     if(!login_id){ toast('Enter login id'); return; }
     try{
-        const j = await api(`/api/signin?login_id=${encodeURIComponent(login_id)}`);
-        state.plan_id = j.plan_id;
-        state.stu_id = j.student.stu_id;
-        localStorage.setItem('stu_id', String(state.stu_id));
-        localStorage.setItem('plan_id', String(state.plan_id));
-        renderProfile(j.student);
-        // if a major is selected save it as the primary major
+        // a major picked before signing in is kept over the stored one
         const majorSel = $('#major_select');
         const prog_id = majorSel && majorSel.value ? Number(majorSel.value) : 0;
-        if (prog_id) {
+        const j = await loadBootstrap(`login_id=${encodeURIComponent(login_id)}`);
+        localStorage.setItem('stu_id', String(state.stu_id));
+        localStorage.setItem('plan_id', String(state.plan_id));
+        if (prog_id && prog_id !== j.major?.prog_id) {
             await api('/api/student/major', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
                 body: JSON.stringify({ stu_id: state.stu_id, prog_id })
             });
+            renderCurrentMajor({prog_id});
+            await Promise.all([loadPlan(), loadRecommendations()]);
         }
-        await loadPlan();
-        await loadCurrentMajor();
-        await Promise.all([loadRecommendations(), loadSummary()]);
-        routeTo('/plan');
+        history.pushState({path: '/plan'}, '', '/plan');
+        showTab('#plan');
         $('#gotoHome').classList.remove('active');
         $('#gotoPlan').classList.add('active');
     }catch(e){
@@ -576,6 +673,7 @@ async function onSearch(){
 
     // if nothing provided, do nothing
     if(!q && !subject && !level){
+        stopPaging($('#search_results'));
         $('#search_results').innerHTML = '';
         toast('Enter a query or choose a filter');
         return;
@@ -587,50 +685,52 @@ async function onSearch(){
         if(subject) qs.set('subject', subject);
         if(level) qs.set('level', level);
 
-        const j = await api(`/api/courses/search?${qs.toString()}`);
         const div = $('#search_results');
-        div.innerHTML = '';
-        j.items.forEach(it=>{
-        const row = document.createElement('div');
-        row.innerHTML = `<div>
-            <div><b>${it.subject} ${it.cata_num}</b> · ${it.title}</div>
-            <div class="meta">id ${it.course_id} · ${it.credits} credits</div>
-            </div>`;
-        const add = document.createElement('button');
-        add.textContent = 'Add';
-        add.addEventListener('click', async ()=>{
-            try{
-            await api('/api/plan/add_course',{
-                method:'POST',
-                headers:{'Content-Type':'application/json'},
-                body:JSON.stringify({plan_id:state.plan_id, term_id:8, course_id:it.course_id})
+        const path = `/api/courses/search?${qs.toString()}`;
+        await pageInto(markerAfter(div), cursor => api(path + pageQuery(cursor)), (items, isFirst) => {
+            if (isFirst) div.innerHTML = '';
+            items.forEach(it=>{
+                const row = document.createElement('div');
+                row.innerHTML = `<div>
+                    <div><b>${it.subject} ${it.cata_num}</b> · ${it.title}</div>
+                    <div class="meta">id ${it.course_id} · ${it.credits} credits</div>
+                    </div>`;
+                const add = document.createElement('button');
+                add.textContent = 'Add';
+                add.addEventListener('click', async ()=>{
+                    try{
+                        await api('/api/plan/add_course',{
+                            method:'POST',
+                            headers:{'Content-Type':'application/json'},
+                            body:JSON.stringify({plan_id:state.plan_id, term_id:8, course_id:it.course_id})
+                        });
+                        toast('Added');
+                        // update plan and recommendations after adding a class
+                        await Promise.all([loadPlan(), loadRecommendations(), loadSummary()]);
+                    }catch(e){ toast(e.message); }
+                });
+                const gradeSel = document.createElement('select');
+                ['A','A-','B+','B','B-','C+','C','C-','D','F'].forEach(g=>{
+                    const o = document.createElement('option'); o.value=g; o.textContent=g; gradeSel.appendChild(o);
+                });
+                const comp = document.createElement('button');
+                comp.textContent = 'Mark completed';
+                comp.addEventListener('click', async ()=>{
+                    try{
+                        await api('/api/history/add_course',{
+                            method:'POST',
+                            headers:{'Content-Type':'application/json'},
+                            body:JSON.stringify({stu_id:state.stu_id, course_id:it.course_id, grade:gradeSel.value})
+                        });
+                        toast('Recorded as completed');
+                        await Promise.all([loadRecommendations(), loadSummary(), onHistoryPage() ? loadHistoryPage() : Promise.resolve()]);
+                    }catch(e){ toast(e.message); }
+                });
+                row.appendChild(add);
+                row.appendChild(gradeSel);
+                row.appendChild(comp);
+                div.appendChild(row);
             });
-            toast('Added');
-            // update plan and recommendations after adding a class
-            await Promise.all([loadPlan(), loadRecommendations(), loadSummary()]);
-            }catch(e){ toast(e.message); }
-        });
-        const gradeSel = document.createElement('select');
-            ['A','A-','B+','B','B-','C+','C','C-','D','F'].forEach(g=>{
-            const o = document.createElement('option'); o.value=g; o.textContent=g; gradeSel.appendChild(o);
-        });
-        const comp = document.createElement('button');
-        comp.textContent = 'Mark completed';
-        comp.addEventListener('click', async ()=>{
-            try{
-            await api('/api/history/add_course',{
-                method:'POST',
-                headers:{'Content-Type':'application/json'},
-                body:JSON.stringify({stu_id:state.stu_id, course_id:it.course_id, grade:gradeSel.value})
-            });
-                toast('Recorded as completed');
-                await Promise.all([loadRecommendations(), loadSummary(), onHistoryPage() ? loadHistoryPage() : Promise.resolve()]); 
-            }catch(e){ toast(e.message); }
-        });
-        row.appendChild(add);
-        row.appendChild(gradeSel);
-        row.appendChild(comp);
-        div.appendChild(row);
         });
     }catch(e){ toast(e.message); }
 }
@@ -647,6 +747,7 @@ document.addEventListener('DOMContentLoaded', () => {
     e.preventDefault();
     routeTo('/schedule');
     });
+    $('#btn_generate')?.addEventListener('click', generateSchedules);
 
 
 
@@ -0,0 +1,345 @@
+# request and sql instrumentation, served in prometheus text format
+#
+# every request records its latency per route, how many statements it ran
+# and where its time went: waiting for a pooled connection, executing sql,
+# turning result rows into dicts, and encoding json. every statement records
+# its time and row count under a fingerprint of its text (literals and
+# in-lists collapsed, so the label set stays bounded), or under its name for
+# the prepared statements of statements.py. statements slower than
+# METRICS_SLOW_QUERY_MS are sampled into a log, and routes listed in
+# DB_PROFILE_ROUTES get duckdb's profiler output for each statement.
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+import statements
+
+SLOW_QUERY_MS = float(os.environ.get('METRICS_SLOW_QUERY_MS', '100'))
+SLOW_QUERY_SAMPLE = float(os.environ.get('METRICS_SLOW_QUERY_SAMPLE', '0.1'))
+SLOW_LOG_SIZE = 200
+MAX_STATEMENTS = 500
+PROFILE_ROUTES = {r.strip() for r in os.environ.get('DB_PROFILE_ROUTES', '').split(',') if r.strip()}
+PROFILE_DIR = Path(os.environ.get('DB_PROFILE_DIR') or Path(__file__).resolve().parent.parent / 'profile')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+PHASES = ('db_wait', 'sql', 'fetch', 'json')
+
+log = logging.getLogger(__name__)
+_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        total = 0
+        for le, n in zip(self.buckets, self.counts):
+            total += n
+            yield f'{name}_bucket{{{labels},le="{le}"}} {total}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+_requests = {}      # (route, method, status) -> count
+_latency = {}       # (route, method) -> Histogram of seconds
+_queries = {}       # route -> Histogram of statements per request
+_phases = {}        # (route, phase) -> seconds
+_statements = {}    # fingerprint -> {'sql', 'seconds': Histogram, 'fetch', 'rows', 'errors'}
+_slow = deque(maxlen=SLOW_LOG_SIZE)
+_slow_total = 0
+
+_WS = re.compile(r'\s+')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+
+
+_fingerprints = {}  # sql text -> (key, normalized text), most statements are constants
+
+
+def fingerprint(sql):
+    # the same statement with other literals or in-list lengths maps to one
+    # key; a named statement's key is its name
+    name = getattr(sql, 'name', None)
+    found = _fingerprints.get(name or sql)
+    if found is None:
+        text = _LIST.sub('?, ...', _LITERAL.sub('?', _WS.sub(' ', sql).strip()))
+        found = name or hashlib.sha1(text.encode()).hexdigest()[:12], text
+        if len(_fingerprints) >= 4 * MAX_STATEMENTS:
+            _fingerprints.clear()
+        _fingerprints[name or sql] = found
+    return found
+
+
+def route():
+    if not has_request_context():
+        return 'none'
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _request_stats():
+    # per-request totals, or None outside a request
+    if not has_request_context():
+        return None
+    stats = g.get('metrics')
+    if stats is None:
+        stats = g.metrics = {'queries': 0, 'profiled': 0, **{p: 0.0 for p in PHASES}}
+    return stats
+
+
+def _record(sql, params, seconds, fetch_seconds, rows, error=None):
+    global _slow_total
+    key, text = fingerprint(sql)
+    with _lock:
+        st = _statements.get(key)
+        if st is None:
+            if len(_statements) >= MAX_STATEMENTS:
+                key, text = 'other', f'statements past the first {MAX_STATEMENTS}'
+                st = _statements.get(key)
+            if st is None:
+                st = _statements[key] = {'sql': text, 'seconds': Histogram(LATENCY_BUCKETS),
+                                         'fetch': 0.0, 'rows': 0, 'errors': 0}
+        st['seconds'].observe(seconds)
+        st['fetch'] += fetch_seconds
+        st['rows'] += rows
+        if error is not None:
+            st['errors'] += 1
+        slow = (seconds + fetch_seconds) * 1000 >= SLOW_QUERY_MS
+        if slow:
+            _slow_total += 1
+    if slow and random.random() < SLOW_QUERY_SAMPLE:
+        entry = {
+            'at': time.time(), 'route': route(), 'statement': key,
+            'ms': round(seconds * 1000, 2), 'fetch_ms': round(fetch_seconds * 1000, 2),
+            'rows': rows, 'params': len(params), 'sql': _WS.sub(' ', sql).strip()[:2000],
+        }
+        if error is not None:
+            entry['error'] = str(error)
+        with _lock:
+            _slow.append(entry)
+        log.warning('slow query %s on %s: %.1f ms, %d rows: %s',
+                    key, entry['route'], entry['ms'] + entry['fetch_ms'], rows, entry['sql'][:300])
+
+
+def execute(get_con, sql, params, fetch=None):
+    """
+    Run sql on the request's connection and record it. fetch(cursor)
+    materializes the result (its time is counted apart from execution);
+    without it the statement's affected row count is recorded. Returns
+    fetch's result, or the cursor.
+    """
+    stats = _request_stats()
+    start = time.perf_counter()
+    con = get_con()
+    ready = time.perf_counter()
+    profile = stats is not None and route() in PROFILE_ROUTES
+    if profile:
+        _start_profile(con, stats)
+    fetched = rows = 0
+    try:
+        cur = statements.execute(con, sql, params)
+    except Exception as e:
+        failed = time.perf_counter() - ready
+        if stats is not None:
+            stats['queries'] += 1
+            stats['db_wait'] += ready - start
+            stats['sql'] += failed
+        _record(sql, params, failed, 0.0, 0, error=e)
+        raise
+    executed = time.perf_counter()
+    if fetch is not None:
+        out = fetch(cur)
+        rows = len(out)
+        fetched = time.perf_counter() - executed
+    else:
+        out = cur
+        if cur.description and cur.description[0][0] == 'Count':
+            rows = cur.fetchone()[0]
+    if profile:
+        _write_profile(con, stats)
+    if stats is not None:
+        stats['queries'] += 1
+        stats['db_wait'] += ready - start
+        stats['sql'] += executed - ready
+        stats['fetch'] += fetched
+    _record(sql, params, executed - ready, fetched, rows)
+    return out
+
+
+# duckdb profiling for the routes in DB_PROFILE_ROUTES
+
+def _start_profile(con, stats):
+    if stats['profiled'] == 0:
+        con.execute("PRAGMA enable_profiling = 'no_output'")
+        stats['profiled'] = 1
+        stats['profile_id'] = f"{int(time.time() * 1000)}-{threading.get_ident()}"
+
+
+def _write_profile(con, stats):
+    info = json.loads(con.get_profiling_information(format='json'))
+    if info.get('result') in ('error', 'disabled'):
+        # statements without a physical plan have nothing to show
+        return
+    name = re.sub(r'[^A-Za-z0-9]+', '_', route()).strip('_') or 'root'
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DIR / f"{name}-{stats['profile_id']}-{stats['profiled']:03d}.json"
+    path.write_text(json.dumps(info, indent=2))
+    stats['profiled'] += 1
+
+
+def stop_profile(con):
+    # before a profiled request's cursor goes back to the pool
+    stats = g.get('metrics') if has_request_context() else None
+    if stats and stats['profiled'] and con is not None:
+        con.execute('PRAGMA disable_profiling')
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    # jsonify's encoding time counts as the request's json phase
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        out = super().dumps(obj, **kwargs)
+        stats = _request_stats()
+        if stats is not None:
+            stats['json'] += time.perf_counter() - start
+        return out
+
+
+def init_app(app, get_con):
+    """
+    Time every request of app. get_con returns the request's pooled
+    connection if it has one, so profiling can be switched off before the
+    connection is released.
+    """
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _keep_status(resp):
+        g.metrics_status = resp.status_code
+        return resp
+
+    @app.teardown_request
+    def _observe(exc):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        seconds = time.perf_counter() - start
+        stats = _request_stats()
+        if stats['profiled']:
+            try:
+                stop_profile(get_con())
+            except Exception:
+                log.exception('could not switch profiling off')
+        status = g.get('metrics_status', 500)
+        rule, method = route(), request.method
+        with _lock:
+            key = (rule, method, status)
+            _requests[key] = _requests.get(key, 0) + 1
+            hist = _latency.get((rule, method))
+            if hist is None:
+                hist = _latency[(rule, method)] = Histogram(LATENCY_BUCKETS)
+            hist.observe(seconds)
+            hist = _queries.get(rule)
+            if hist is None:
+                hist = _queries[rule] = Histogram(COUNT_BUCKETS)
+            hist.observe(stats['queries'])
+            for phase in PHASES:
+                _phases[(rule, phase)] = _phases.get((rule, phase), 0.0) + stats[phase]
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render(gauges=()):
+    """
+    Everything recorded so far in prometheus text format. gauges are extra
+    (name, help, {label tuple: value}) samples such as pool and cache sizes.
+    """
+    out = []
+
+    def header(name, kind, text):
+        out.append(f'# HELP {name} {text}')
+        out.append(f'# TYPE {name} {kind}')
+
+    with _lock:
+        header('planner_requests_total', 'counter', 'Requests by route, method and status.')
+        for (rule, method, status), n in sorted(_requests.items()):
+            out.append(f'planner_requests_total{{route="{_label(rule)}",method="{method}",status="{status}"}} {n}')
+
+        header('planner_request_seconds', 'histogram', 'Request latency by route.')
+        for (rule, method), hist in sorted(_latency.items()):
+            out.extend(hist.lines('planner_request_seconds', f'route="{_label(rule)}",method="{method}"'))
+
+        header('planner_request_queries', 'histogram', 'SQL statements per request by route.')
+        for rule, hist in sorted(_queries.items()):
+            out.extend(hist.lines('planner_request_queries', f'route="{_label(rule)}"'))
+
+        header('planner_request_phase_seconds_total', 'counter',
+               'Request time spent waiting for a connection (db_wait), executing sql, '
+               'building rows (fetch) and encoding json.')
+        for (rule, phase), seconds in sorted(_phases.items()):
+            out.append(f'planner_request_phase_seconds_total{{route="{_label(rule)}",phase="{phase}"}} {seconds:.6f}')
+
+        header('planner_sql_seconds', 'histogram', 'SQL execution time by statement fingerprint.')
+        for key, st in sorted(_statements.items()):
+            out.extend(st['seconds'].lines('planner_sql_seconds', f'statement="{key}"'))
+
+        header('planner_sql_fetch_seconds_total', 'counter', 'Time building result rows by statement fingerprint.')
+        for key, st in sorted(_statements.items()):
+            out.append(f'planner_sql_fetch_seconds_total{{statement="{key}"}} {st["fetch"]:.6f}')
+
+        header('planner_sql_rows_total', 'counter', 'Rows returned or affected by statement fingerprint.')
+        for key, st in sorted(_statements.items()):
+            out.append(f'planner_sql_rows_total{{statement="{key}"}} {st["rows"]}')
+
+        header('planner_sql_errors_total', 'counter', 'Failed executions by statement fingerprint.')
+        for key, st in sorted(_statements.items()):
+            out.append(f'planner_sql_errors_total{{statement="{key}"}} {st["errors"]}')
+
+        header('planner_sql_statement_info', 'gauge', 'Normalized text of each statement fingerprint.')
+        for key, st in sorted(_statements.items()):
+            out.append(f'planner_sql_statement_info{{statement="{key}",sql="{_label(st["sql"][:500])}"}} 1')
+
+        header('planner_slow_queries_total', 'counter', f'Statements slower than {SLOW_QUERY_MS:g} ms.')
+        out.append(f'planner_slow_queries_total {_slow_total}')
+
+    for name, text, samples in gauges:
+        header(name, 'gauge', text)
+        for labels, value in samples.items():
+            pairs = ','.join(f'{k}="{_label(v)}"' for k, v in labels)
+            out.append(f'{name}{{{pairs}}} {value}' if pairs else f'{name} {value}')
+    return '\n'.join(out) + '\n'
+
+
+def slow_queries():
+    # the sampled slow-query log, newest first
+    with _lock:
+        return list(reversed(_slow))
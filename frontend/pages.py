@@ -0,0 +1,88 @@
+# keyset pagination for the list endpoints
+#
+# a page is the rows that sort after a cursor, at most limit of them. the
+# cursor holds the sort key of the last row sent, so every page is one seek
+# (WHERE (key) > (cursor) ORDER BY key LIMIT n in sql, a bisect for lists
+# kept in memory) and a deep page costs what the first one does; nothing is
+# kept on the server between pages. to clients a cursor is an opaque token:
+# the key as url-safe base64 json, tagged with its listing so a cursor from
+# one endpoint is refused by another. a page is fetched with one row more
+# than it returns, which tells whether a next cursor is needed.
+import base64
+import binascii
+import json
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+
+class BadPage(ValueError):
+    pass
+
+
+def encode(kind, key):
+    raw = json.dumps([kind, list(key)], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode(kind, cursor, types):
+    """
+    The key of a cursor made by encode(kind, ...), checked against types
+    (one per key column), or None when there is no cursor.
+    """
+    if not cursor:
+        return None
+    try:
+        tag, key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError):
+        raise BadPage('invalid cursor')
+    if tag != kind or not isinstance(key, list) or len(key) != len(types):
+        raise BadPage('invalid cursor')
+    for value, t in zip(key, types):
+        # bool is an int to python but never a key column
+        if not isinstance(value, t) or isinstance(value, bool):
+            raise BadPage('invalid cursor')
+    return tuple(key)
+
+
+def limit(args, default=DEFAULT_LIMIT):
+    value = args.get('limit')
+    if not value:
+        return default
+    try:
+        n = int(value)
+    except ValueError:
+        raise BadPage('limit must be a positive number')
+    if n < 1:
+        raise BadPage('limit must be a positive number')
+    return min(n, MAX_LIMIT)
+
+
+def request_page(args, kind, types, default=DEFAULT_LIMIT):
+    # (key the page starts after or None, page size) from the query string
+    return decode(kind, args.get('cursor'), types), limit(args, default)
+
+
+def split(kind, rows, size, key):
+    """
+    (the first size rows, cursor after the last of them or None) from rows
+    fetched with size + 1. key(row) is the row's sort key.
+    """
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode(kind, key(rows[-1]))
+
+
+def split_groups(kind, rows, size, key):
+    """
+    split() for rows that come in runs sharing one key, such as the meetings
+    of a section: the rows of the first size keys and a cursor after the last
+    of them, from rows of size + 1 keys.
+    """
+    keys = list(dict.fromkeys(key(r) for r in rows))
+    if len(keys) <= size:
+        return rows, None
+    last = keys[size - 1]
+    end = max(i for i, r in enumerate(rows) if key(r) == last) + 1
+    return rows[:end], encode(kind, last)
@@ -0,0 +1,156 @@
+# lay the courses a student still needs out over future terms
+#
+# a course can go in a term once each of its prereq clauses is met by a
+# completed course or one placed in an earlier term. clauses come from the
+# compiled prereq graph, so OR sets and equivalent courses are handled by one
+# AND against the running mask of done courses. terms are filled in order,
+# courses heading the longest remaining prereq chain first, so long chains
+# start early and the plan finishes as soon as the credit caps allow.
+import re
+from datetime import date
+
+# generated terms: season order and (start, end) month/day
+SEASONS = ['SP', 'SU', 'FA']
+SEASON_DATES = {
+    'SP': ((1, 12), (5, 5)),
+    'SU': ((5, 18), (8, 8)),
+    'FA': ((8, 26), (12, 12)),
+}
+CODE_RE = re.compile(r'^(SP|SU|FA)(\d{4})$')
+
+
+def following_terms(code, count, summers=False):
+    """
+    The count terms after a term code like FA2026, as dicts with code,
+    start_date and end_date; None if the code is not in that form.
+    """
+    m = CODE_RE.match(code or '')
+    if not m:
+        return None
+    season, year = SEASONS.index(m.group(1)), int(m.group(2))
+    out = []
+    while len(out) < count:
+        season += 1
+        if season == len(SEASONS):
+            season, year = 0, year + 1
+        name = SEASONS[season]
+        if name == 'SU' and not summers:
+            continue
+        (sm, sd), (em, ed) = SEASON_DATES[name]
+        out.append({'term_id': None, 'code': f'{name}{year}',
+                    'start_date': date(year, sm, sd), 'end_date': date(year, em, ed)})
+    return out
+
+
+def closure(graph, wanted, done_mask):
+    """
+    wanted plus, transitively, one course for every prereq clause that
+    nothing done or wanted satisfies. Returns (course ids, ids added as
+    prereqs); a clause gets the course with the fewest prereqs of its own.
+    """
+    courses = list(dict.fromkeys(wanted))
+    have = done_mask | graph.mask(courses)
+    added = []
+    i = 0
+    while i < len(courses):
+        for clause in graph.clauses.get(courses[i], ()):
+            if clause & have:
+                continue
+            options = graph.members(clause)
+            if not options:
+                continue
+            pick = min(options, key=lambda c: (len(graph.clauses.get(c, ())), graph.key_of[c], c))
+            courses.append(pick)
+            added.append(pick)
+            have |= graph.bit_of.get(pick, 0)
+        i += 1
+    return courses, added
+
+
+def pack(graph, courses, credits, levels, done_mask, fixed, n_terms, max_credits):
+    """
+    Place courses into terms 0..n_terms-1.
+
+    credits: {course_id: credits}; levels: {course_id: course.cata_number},
+    lower levels first among equal chains; done_mask: courses done before the first
+    term; fixed: (term index, course_id, credits) already planned in a term.
+    Returns ({course_id: term index}, {course_id: reason} for the rest).
+    """
+    clauses = graph.clauses
+    bit_of = graph.bit_of
+
+    # one course per equivalence class
+    todo = []
+    seen = done_mask
+    for c in courses:
+        bit = bit_of.get(c, 0)
+        if not bit & seen:
+            todo.append(c)
+            seen |= bit
+
+    # courses that need each course (through any clause), for chain heights
+    by_bit = {bit_of.get(c, 0): c for c in todo}
+    needed_by = {c: [] for c in todo}
+    for c in todo:
+        for clause in clauses.get(c, ()):
+            m = clause
+            while m:
+                low = m & -m
+                m ^= low
+                p = by_bit.get(low)
+                if p is not None and p != c:
+                    needed_by[p].append(c)
+
+    height = {}
+
+    def chain(c, visiting=()):
+        # longest run of courses waiting on c, cycles count once
+        if c not in height:
+            best = 0
+            for d in needed_by[c]:
+                if d not in visiting:
+                    best = max(best, chain(d, visiting + (c,)))
+            height[c] = best + 1
+        return height[c]
+
+    for c in todo:
+        chain(c)
+
+    def level(c):
+        n = levels.get(c)
+        return 999 if n is None else n
+
+    order = sorted(todo, key=lambda c: (-height[c], level(c), graph.key_of.get(c, ('', '')), c))
+
+    fixed_load = [0] * n_terms
+    fixed_mask = [0] * n_terms
+    for t, c, cr in fixed:
+        fixed_load[t] += cr or 0
+        fixed_mask[t] |= bit_of.get(c, 0)
+
+    placed = {}
+    crowded = set()
+    mask = done_mask
+    for t in range(n_terms):
+        load = fixed_load[t]
+        added = 0
+        for c in order:
+            if c in placed:
+                continue
+            if any(not clause & mask for clause in clauses.get(c, ())):
+                continue
+            cr = credits.get(c) or 0
+            if load + cr > max_credits:
+                crowded.add(c)
+                continue
+            placed[c] = t
+            load += cr
+            added |= bit_of.get(c, 0)
+        # this term's courses count for prereqs from the next term on
+        mask |= added | fixed_mask[t]
+
+    unplaced = {
+        c: 'no room before the last term' if c in crowded else 'prerequisites not met in time'
+        for c in order if c not in placed
+    }
+    return placed, unplaced
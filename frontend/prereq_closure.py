@@ -0,0 +1,233 @@
+# transitive prerequisite closure, compiled from the prereq graph
+#
+# every course gets its ancestors (each course some chain of prereq clauses
+# leads to, at the fewest steps), its descendants (each course it eventually
+# unlocks) and the fewest terms it takes from scratch. a clause is met by its
+# cheapest option, any course of its OR set or of an equivalence class, and a
+# course waits for its slowest clause. whole-chain questions are then dict
+# lookups, or for one student a walk over the clauses they still have open,
+# instead of recursive queries. it is built when the server warms up and after
+# every catalog change; a change redoes only the courses whose prereqs it
+# touched and the courses they lead to. cycles in the catalog are cut where
+# they are found.
+import threading
+
+import prereq_graph
+
+
+class Closure:
+    def __init__(self, graph, courses, previous=None):
+        # courses: rows with course_id, subject, cata_num, title
+        # previous: the closure of the catalog before a change, reused where
+        # the change leaves it as it was
+        self.graph = graph
+        self.info = {r['course_id']: r for r in courses}
+
+        # each course's clauses as (mask, option course ids). with the same
+        # courses and classes as before a change, only courses whose clauses
+        # changed, and everything they lead to, can get a different chain
+        same = previous is not None and previous.graph.bit_of == graph.bit_of
+        self.clauses = {}
+        changed = []
+        for cid, clauses in graph.clauses.items():
+            if same and previous.graph.clauses.get(cid) == clauses:
+                self.clauses[cid] = previous.clauses[cid]
+            else:
+                self.clauses[cid] = [(clause, graph.members(clause)) for clause in clauses]
+                changed.append(cid)
+        redo = None
+        if same:
+            changed.extend(cid for cid in previous.clauses if cid not in self.clauses)
+            redo = set(changed)
+            for cid in changed:
+                redo.update(previous.descendants.get(cid, ()))
+        if redo is None:
+            self.ancestors = {}
+            self.height = {}
+            self.through = {}   # the prereq a course's slowest chain goes through
+            self.descendants = {}
+            self.behind_mask = {}
+            copied = None
+        else:
+            # the rest starts as the previous closure's; a descendants map is
+            # copied before it changes, so readers of that closure never see it
+            self.ancestors = dict(previous.ancestors)
+            self.height = dict(previous.height)
+            self.through = dict(previous.through)
+            self.descendants = dict(previous.descendants)
+            self.behind_mask = dict(previous.behind_mask)
+            copied = set()
+            for cid in redo:
+                for a in self.ancestors.pop(cid, ()):
+                    if a not in copied:
+                        copied.add(a)
+                        self.descendants[a] = dict(self.descendants[a])
+                    del self.descendants[a][cid]
+                    if not self.descendants[a]:
+                        del self.descendants[a]
+                        copied.discard(a)
+                self.height.pop(cid, None)
+                self.through.pop(cid, None)
+                self.behind_mask.pop(cid, None)
+        self.chain(redo, copied)
+        if redo is not None:
+            # a course without prereqs is only listed while something needs it
+            for cid in changed:
+                for _, opts in previous.clauses.get(cid, ()):
+                    for o in opts:
+                        if o not in self.clauses and o not in self.descendants and o in self.ancestors:
+                            del self.ancestors[o], self.height[o], self.through[o], self.behind_mask[o]
+
+    def chain(self, redo=None, copied=None):
+        # ancestors, heights and descendants of the redo courses (all when
+        # None), on top of the ones already worked out. descendants not in
+        # copied may be shared with an older closure and are copied first
+        options = {}
+        for cid, clauses in self.clauses.items():
+            if redo is not None and cid not in redo:
+                continue
+            found = dict.fromkeys(o for _, opts in clauses for o in opts if o != cid)
+            if found:
+                options[cid] = list(found)
+
+        # prereqs before the courses that need them; an edge back into the
+        # walk closes a cycle and is dropped
+        order = []
+        state = dict.fromkeys(self.ancestors, 2)
+        for root in options:
+            if root in state:
+                continue
+            state[root] = 1
+            stack = [(root, iter(options[root]))]
+            while stack:
+                cid, it = stack[-1]
+                for p in it:
+                    if p not in state:
+                        state[p] = 1
+                        stack.append((p, iter(options.get(p, ()))))
+                        break
+                else:
+                    stack.pop()
+                    state[cid] = 2
+                    order.append(cid)
+
+        graph = self.graph
+        for cid in order:
+            anc = {}
+            for p in options.get(cid, ()):
+                if p in self.ancestors:
+                    anc[p] = 1
+            for p in list(anc):
+                for a, depth in self.ancestors[p].items():
+                    if a != cid and anc.get(a, depth + 2) > depth + 1:
+                        anc[a] = depth + 1
+            self.ancestors[cid] = anc
+            self.height[cid], self.through[cid] = self.step(cid, self.height.get)
+            for a, depth in anc.items():
+                if copied is not None and a not in copied:
+                    copied.add(a)
+                    self.descendants[a] = dict(self.descendants.get(a, ()))
+                self.descendants.setdefault(a, {})[cid] = depth
+            # equivalence classes anywhere behind the course: a student who
+            # has done none of them gets the precomputed height
+            self.behind_mask[cid] = graph.mask(anc)
+
+    def step(self, cid, terms_of):
+        """
+        (1 + terms for the slowest clause of cid, the option that chain goes
+        through), each clause met by its quickest option. terms_of(course)
+        is None for options to leave out.
+        """
+        worst, through = 0, None
+        for _, opts in self.clauses.get(cid, ()):
+            best, pick = None, None
+            for o in opts:
+                h = terms_of(o)
+                if h is not None and (best is None or h < best):
+                    best, pick = h, o
+            if best is not None and best > worst:
+                worst, through = best, pick
+        return worst + 1, through
+
+    def longest(self, course_ids, done_mask=0):
+        """
+        (fewest terms until every course of course_ids is passed, the chain
+        of courses that sets it, in the order they are taken) for a student
+        who has done done_mask, however light the load. (0, []) when all are
+        done.
+        """
+        bit_of = self.graph.bit_of
+        memo = {}
+        visiting = set()
+
+        def terms_of(cid):
+            if bit_of.get(cid, 0) & done_mask:
+                return 0
+            if not done_mask & self.behind_mask.get(cid, 0):
+                return self.height.get(cid, 1)
+            if cid in memo:
+                return memo[cid][0]
+            if cid in visiting:
+                return None
+            visiting.add(cid)
+            memo[cid] = self.step(cid, terms_of)
+            visiting.discard(cid)
+            return memo[cid][0]
+
+        total, last = 0, None
+        for cid in course_ids:
+            t = terms_of(cid)
+            if t > total:
+                total, last = t, cid
+        chain = []
+        cid = last
+        while cid is not None and not bit_of.get(cid, 0) & done_mask:
+            chain.append(cid)
+            cid = memo[cid][1] if cid in memo else self.through.get(cid)
+        chain.reverse()
+        return total, chain
+
+    def missing(self, course_id, done_mask=0):
+        """
+        Every prereq clause still open on the way to course_id, nearest
+        first, as (course that needs it, depth, option course ids). The walk
+        goes through every option of an open clause and stops at clauses
+        already met.
+        """
+        out = []
+        seen = {course_id}
+        frontier = [course_id]
+        depth = 0
+        while frontier:
+            depth += 1
+            following = []
+            for cid in frontier:
+                for clause, opts in self.clauses.get(cid, ()):
+                    if clause & done_mask:
+                        continue
+                    out.append((cid, depth, opts))
+                    for o in opts:
+                        if o not in seen:
+                            seen.add(o)
+                            following.append(o)
+            frontier = following
+        return out
+
+
+_closure = None
+_lock = threading.Lock()
+
+
+def current(run_query):
+    # a catalog change replaces the graph; the closure follows it from the
+    # one it had, redoing only what the change reaches
+    global _closure
+    graph = prereq_graph.current(run_query)
+    closure = _closure
+    if closure is not None and closure.graph is graph:
+        return closure
+    with _lock:
+        if _closure is None or _closure.graph is not graph:
+            courses = run_query("SELECT course_id, subject, cata_num, title FROM course")
+            _closure = Closure(graph, courses, _closure)
+        return _closure
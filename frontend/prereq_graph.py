@@ -0,0 +1,137 @@
+# prerequisite / equivalence graph compiled once from the catalog
+#
+# every equivalence class of courses gets one bit. a student's completed (or
+# planned) courses collapse to one int mask, and each course's prereqs compile
+# to a list of clause masks: a clause is satisfied when it shares a bit with
+# the completed mask. checking hundreds of candidates is then a few int ANDs
+# per course instead of SQL round-trips and set scans.
+import threading
+
+import catalog_hooks
+
+# equivalence sets (treat these as the same course)
+EQUIV_SETS = [
+    {('CMPSC', '121'), ('CMPSC', '131')},
+    {('CMPSC', '122'), ('CMPSC', '132')},
+    {('CAS',   '100A'), ('CAS',   '100B')},
+    {('CMPSC', '483W'), ('CMPSC', '431W')},
+]
+
+# explicit OR prereq sets (MATH 110 or 140)
+OR_PREREQ_SETS = [
+    {('MATH', '110'), ('MATH', '140')},
+]
+
+
+class PrereqGraph:
+    def __init__(self, courses, prereqs):
+        # courses: rows with course_id, subject, cata_num
+        # prereqs: rows with course_id, prereq_course_id
+        self.key_of = {}
+        self.id_of = {}
+        for r in courses:
+            key = (r['subject'], str(r['cata_num']))
+            self.key_of[r['course_id']] = key
+            self.id_of[key] = r['course_id']
+
+        # canonical bit per equivalence class, O(1) lookup per key
+        self._bit_of_key = {}
+        for group in EQUIV_SETS:
+            bit = 1 << len(self._bit_of_key)
+            for key in group:
+                self._bit_of_key[key] = bit
+        for key in self.id_of:
+            if key not in self._bit_of_key:
+                self._bit_of_key[key] = 1 << len(self._bit_of_key)
+
+        self.bit_of = {cid: self._bit_of_key[key] for cid, key in self.key_of.items()}
+        self.ids_of_bit = {}
+        for cid, bit in self.bit_of.items():
+            self.ids_of_bit.setdefault(bit, []).append(cid)
+
+        direct = {}
+        for r in prereqs:
+            direct.setdefault(r['course_id'], []).append(r['prereq_course_id'])
+        self.prereqs = direct
+
+        # compile each course's prereqs to AND-of-OR clause masks
+        self.clauses = {}
+        for cid, plist in direct.items():
+            keys = {self.key_of[p] for p in plist if p in self.key_of}
+            clauses = []
+            used = set()
+            for alt_def in OR_PREREQ_SETS:
+                group_keys = keys & alt_def
+                if group_keys:
+                    clauses.append(self.key_mask(group_keys))
+                    used.update(group_keys)
+            for key in keys - used:
+                clauses.append(self._bit_of_key[key])
+            self.clauses[cid] = clauses
+
+    def key_mask(self, keys):
+        mask = 0
+        for key in keys:
+            mask |= self._bit_of_key.get(key, 0)
+        return mask
+
+    def mask(self, course_ids):
+        mask = 0
+        bit_of = self.bit_of
+        for cid in course_ids:
+            mask |= bit_of.get(cid, 0)
+        return mask
+
+    def members(self, mask):
+        # course ids of every class with a bit in mask
+        out = []
+        while mask:
+            low = mask & -mask
+            out.extend(self.ids_of_bit.get(low, ()))
+            mask ^= low
+        return out
+
+    def has_equiv(self, course_id, mask):
+        return bool(self.bit_of.get(course_id, 0) & mask)
+
+    def prereqs_ok(self, course_id, completed_mask):
+        for clause in self.clauses.get(course_id, ()):
+            if not clause & completed_mask:
+                return False
+        return True
+
+    def eligible(self, course_ids, completed_mask):
+        # one pass over all candidates against the same completed mask
+        clauses = self.clauses
+        out = set()
+        for cid in course_ids:
+            for clause in clauses.get(cid, ()):
+                if not clause & completed_mask:
+                    break
+            else:
+                out.add(cid)
+        return out
+
+
+_graph = None
+_lock = threading.Lock()
+
+
+def current(run_query):
+    global _graph
+    graph = _graph
+    if graph is not None:
+        return graph
+    with _lock:
+        if _graph is None:
+            courses = run_query("SELECT course_id, subject, cata_num FROM course")
+            prereqs = run_query("SELECT course_id, prereq_course_id FROM course_prereq")
+            _graph = PrereqGraph(courses, prereqs)
+        return _graph
+
+
+@catalog_hooks.on_change
+def invalidate():
+    global _graph
+    with _lock:
+        _graph = None
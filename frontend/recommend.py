@@ -0,0 +1,322 @@
+# next-term course recommendations, one student at a time or a whole cohort
+#
+# rank() narrows a major's courses to what a student should take next and
+# orders them; /api/recommendations runs it per request. the batch job runs
+# the same ranking for every plan of every student in a program: the cohort's
+# passed courses, credits and planned courses come from one aggregate query,
+# the major's courses from one more, and the results are written to the
+# recommendation table with one insert. programs run in parallel, each on a
+# cursor of its own.
+#
+# each stored row carries a fingerprint of what it was ranked from (major,
+# completed courses, credits, planned courses). /api/recommendations serves
+# the stored row while the student's current state still has the same
+# fingerprint and ranks live otherwise. changing a student's major drops
+# their rows and catalog imports clear the table.
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import flowsheet
+import pages
+import prereq_graph
+import statements
+from student_cache import PASSING
+
+# recommendations per page of /api/recommendations
+PAGE_SIZE = 50
+
+# whether the recommendation table may have rows; requests skip the lookup
+# while it is empty
+_stored = False
+
+# held while a program's rows are replaced and while a student's major
+# changes, so the two never delete the same row in overlapping transactions
+write_lock = threading.Lock()
+
+# eligible courses of a major, or of the student's primary major when the
+# major is NULL
+MAJOR_ROWS_SQL = statements.define('major_rows', """
+    SELECT mc.major_id, c.course_id, c.subject, c.cata_num, c.title, CAST(c.credits AS INT) AS credits
+    FROM major_courses mc
+    JOIN program p ON p.prog_id = mc.major_id AND p.program_type = 'Major'
+    JOIN course c ON c.course_id = mc.course_id
+    WHERE mc.major_id = COALESCE(?, (
+            SELECT prog_id FROM student_program WHERE stu_id = ? AND primary_flag = TRUE LIMIT 1))
+      AND mc.eligible_course = TRUE
+    ORDER BY c.subject, c.cata_num
+""")
+
+# the stored ranking of a plan
+STORED_SQL = statements.define('stored_recommendations', """
+    SELECT prog_id, basis, items FROM recommendation WHERE plan_id = ? AND stu_id = ?
+""")
+
+# every plan of every student whose primary major is the program, with the
+# student's passed courses and credits and the plan's courses
+COHORT_SQL = statements.define('recommendation_cohort', """
+    WITH students AS (
+        SELECT stu_id FROM student_program WHERE prog_id = ? AND primary_flag = TRUE
+    ),
+    passed AS (
+        SELECT e.stu_id, list(DISTINCT s.course_id) AS completed,
+               COALESCE(SUM(CAST(c.credits AS INT)), 0) AS credits
+        FROM enrollment e
+        JOIN students st ON st.stu_id = e.stu_id
+        JOIN section s ON s.section_id = e.section_id
+        JOIN course c ON c.course_id = s.course_id
+        WHERE list_contains(?, e.grade)
+        GROUP BY e.stu_id
+    ),
+    planned AS (
+        SELECT pc.plan_id, list(DISTINCT COALESCE(pc.course_id, sec.course_id)) AS planned
+        FROM planned_course pc
+        JOIN degree_plan dp ON dp.plan_id = pc.plan_id
+        JOIN students st ON st.stu_id = dp.stu_id
+        LEFT JOIN section sec ON sec.section_id = pc.section_id
+        WHERE COALESCE(pc.course_id, sec.course_id) IS NOT NULL
+        GROUP BY pc.plan_id
+    )
+    SELECT dp.stu_id, dp.plan_id,
+           COALESCE(p.completed, []) AS completed, COALESCE(p.credits, 0) AS credits,
+           COALESCE(pl.planned, []) AS planned
+    FROM degree_plan dp
+    JOIN students st ON st.stu_id = dp.stu_id
+    LEFT JOIN passed p ON p.stu_id = dp.stu_id
+    LEFT JOIN planned pl ON pl.plan_id = dp.plan_id
+    ORDER BY dp.plan_id
+""")
+
+# plans of students who left the program go too
+DELETE_SQL = statements.define('recommendation_delete', """
+    DELETE FROM recommendation WHERE prog_id = ? OR list_contains(CAST(? AS JSON)::INT[], plan_id)
+""")
+# the lists go in as json text: the python client converts list parameters a
+# value at a time, which dominates a cohort-sized insert, while one string is
+# bound as is and cast in a single pass. items is the /api/recommendations
+# response for the plan, built here in one pass
+INSERT_SQL = statements.define('recommendation_insert', """
+    INSERT INTO recommendation (plan_id, stu_id, prog_id, course_ids, items, basis, computed_at)
+    WITH ranked AS (
+        SELECT unnest(CAST(? AS JSON)::INT[]) AS plan_id, unnest(CAST(? AS JSON)::INT[]) AS stu_id,
+               unnest(CAST(? AS JSON)::INT[][]) AS course_ids, unnest(CAST(? AS JSON)::VARCHAR[]) AS basis
+    )
+    SELECT r.plan_id, r.stu_id, sp.prog_id, r.course_ids,
+           COALESCE((
+               SELECT CAST(to_json(list({'course_id': c.course_id, 'subject': c.subject, 'cata_num': c.cata_num,
+                                         'title': c.title, 'credits': CAST(c.credits AS INT)} ORDER BY u.pos))
+                           AS VARCHAR)
+               FROM unnest(r.course_ids) WITH ORDINALITY AS u(course_id, pos)
+               JOIN course c ON c.course_id = u.course_id
+           ), '[]'),
+           r.basis, now()
+    FROM ranked r
+    -- students who changed major since the cohort was read are left out
+    JOIN student_program sp ON sp.stu_id = r.stu_id AND sp.prog_id = ? AND sp.primary_flag = TRUE
+""")
+
+
+def ensure_schema(con):
+    # migration for databases built before the batch job
+    global _stored
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS recommendation (
+          plan_id INT PRIMARY KEY,
+          stu_id INT NOT NULL,
+          prog_id INT NOT NULL,
+          course_ids INT[] NOT NULL,
+          items VARCHAR NOT NULL,
+          basis VARCHAR NOT NULL,
+          computed_at TIMESTAMP NOT NULL
+        )
+    """)
+    _stored = con.execute("SELECT EXISTS (SELECT 1 FROM recommendation)").fetchone()[0]
+
+
+def has_stored():
+    return _stored
+
+
+def basis(prog_id, completed, credits, planned):
+    # fingerprint of everything rank() reads about a student. the leading
+    # version changes with rank() itself, so rows ranked the old way go stale
+    key = repr((2, prog_id, credits, sorted(completed), sorted(planned)))
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def rank(rows, prog_id, completed, credits, planned, graph, sheets):
+    """
+    The major course rows (in major order) a student with these completed
+    and planned course ids and credits should take next, best first.
+    """
+    # completed credits to estimate semester standing
+    sem_standing = (credits // 15) + 1
+    if sem_standing < 1:
+        sem_standing = 1
+
+    # not completed and not already in the plan
+    rows = [r for r in rows if r['course_id'] not in completed and r['course_id'] not in planned]
+
+    if not rows:
+        return []
+
+    # completed and planned courses for prereqs and equivalence
+    completed_mask = graph.mask(completed)
+    blocked_mask = completed_mask | graph.mask(planned)
+
+    # prereqs for all candidate courses in one pass
+    eligible = graph.eligible([r['course_id'] for r in rows], completed_mask)
+
+    # semester and order of each course in the major's flowsheet, or from
+    # its course number when the flowsheet does not list it
+    ranks = {r['course_id']: sheets.rank(prog_id, r['course_id']) for r in rows}
+
+    max_sem_to_show = sem_standing + 1
+    if max_sem_to_show < 1:
+        max_sem_to_show = 1
+
+    # only current or upcoming semester courses, with prereqs satisfied,
+    # and no equivalent already completed or planned
+    filtered = []
+    for r in rows:
+        if ranks[r['course_id']][0] > max_sem_to_show:
+            continue
+        if r['course_id'] not in eligible:
+            continue
+        if graph.has_equiv(r['course_id'], blocked_mask):
+            continue
+        filtered.append(r)
+    rows = filtered
+
+    # reorder based on flowsheet, the same order page() walks
+    rows.sort(key=lambda r: (*ranks[r['course_id']][1], r['course_id']))
+
+    return rows
+
+
+def key(sheets, prog_id, course_id):
+    # where a course sorts in rank() output, as a page cursor
+    return (*sheets.rank(prog_id, course_id)[1], course_id)
+
+
+KEY_TYPES = (int, str, str, int)
+
+
+def page(items, prog_id, sheets, after=None, size=PAGE_SIZE):
+    """
+    (the size recommendations of items, ranked for prog_id, that come after
+    the cursor key after, cursor for the next page or None).
+    """
+    if after is not None:
+        items = [r for r in items if key(sheets, prog_id, r['course_id']) > after]
+    return pages.split('recommendations', items[:size + 1], size,
+                       lambda r: key(sheets, prog_id, r['course_id']))
+
+
+def stored(rows, completed, credits, planned):
+    # the items of a STORED_SQL result, or None when there is no stored
+    # ranking or it was made from another state
+    if not rows or rows[0]['basis'] != basis(rows[0]['prog_id'], completed, credits, planned):
+        return None
+    return json.loads(rows[0]['items'])
+
+
+def fetch(con, sql, params=()):
+    cur = statements.execute(con, sql, params)
+    cols = [d[0].lower() for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+def run_program(con, prog_id):
+    # rank every plan of the program's students and replace their stored rows
+    global _stored
+    started = time.monotonic()
+
+    def run_query(sql, params=()):
+        return fetch(con, sql, params)
+
+    graph = prereq_graph.current(run_query)
+    sheets = flowsheet.current(run_query)
+    rows = run_query(MAJOR_ROWS_SQL, (prog_id, None))
+    for r in rows:
+        r.pop('major_id')
+    cohort = run_query(COHORT_SQL, (prog_id, list(PASSING)))
+
+    plan_ids, stu_ids, course_ids, bases = [], [], [], []
+    for c in cohort:
+        completed, planned = frozenset(c['completed']), frozenset(c['planned'])
+        ranked = rank(rows, prog_id, completed, c['credits'], planned, graph, sheets)
+        plan_ids.append(c['plan_id'])
+        stu_ids.append(c['stu_id'])
+        course_ids.append([r['course_id'] for r in ranked])
+        bases.append(basis(prog_id, completed, c['credits'], planned))
+
+    with write_lock:
+        con.execute("BEGIN")
+        try:
+            statements.execute(con, DELETE_SQL, (prog_id, json.dumps(plan_ids)))
+            statements.execute(con, INSERT_SQL, (json.dumps(plan_ids), json.dumps(stu_ids), json.dumps(course_ids),
+                                                 json.dumps(bases), prog_id))
+            con.execute("COMMIT")
+            _stored = True
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+    return {'prog_id': prog_id, 'plans': len(plan_ids), 'students': len(set(stu_ids)),
+            'recommendations': sum(len(ids) for ids in course_ids),
+            'seconds': round(time.monotonic() - started, 3)}
+
+
+def run_batch(db, prog_ids=None, workers=None):
+    """
+    Rank and store recommendations for the students of prog_ids (every
+    major when None) on db, a dbpool.Database. Returns one summary per
+    program.
+    """
+    with db.connection() as con:
+        if prog_ids is None:
+            prog_ids = [r[0] for r in con.execute(
+                "SELECT prog_id FROM program WHERE program_type = 'Major' ORDER BY prog_id").fetchall()]
+    workers = max(1, min(len(prog_ids), workers or max(1, db.pool_size // 2)))
+
+    def one(prog_id):
+        with db.connection() as con:
+            return run_program(con, prog_id)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recommend') as pool:
+        return list(pool.map(one, prog_ids))
+
+
+if __name__ == '__main__':
+    # catalog scripts live in db/
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'db'))
+    import dbpool
+    import import_catalog
+
+    parser = argparse.ArgumentParser(description='store next-term recommendations for whole programs')
+    parser.add_argument('--db', default=os.environ.get('COURSE_PLANNER_DB') or str(
+        (Path(__file__).resolve().parent.parent / 'db' / 'course_planner.duckdb').resolve()))
+    parser.add_argument('--program', type=int, action='append', dest='prog_ids',
+                        help='prog_id to run, repeatable (default every major)')
+    parser.add_argument('--workers', type=int, help='programs ranked at once (default half the pool)')
+    args = parser.parse_args()
+
+    def open_db(root):
+        import_catalog.ensure_flowsheet_schema(root)
+        ensure_schema(root)
+
+    database = dbpool.Database(args.db, on_open=open_db)
+    try:
+        started = time.monotonic()
+        for s in run_batch(database, args.prog_ids, args.workers):
+            print(f"program {s['prog_id']}: {s['plans']} plans of {s['students']} students, "
+                  f"{s['recommendations']} recommendations in {s['seconds']}s")
+        print(f'done in {time.monotonic() - started:.1f}s')
+    finally:
+        database.close()
@@ -0,0 +1,170 @@
+# conflict-free section schedules for a set of courses
+#
+# every pair of sections that clash is found once with the sweep in
+# conflicts.py and folded into one compatibility bitset per section (bit j set
+# when section j can sit next to it). the search picks one section per course,
+# fewest candidates first, and keeps the AND of the chosen sections' bitsets,
+# so the candidates left for every other course are one AND away and a course
+# with none left prunes the branch immediately.
+import heapq
+import time
+from itertools import count
+
+import conflicts
+
+
+def minutes(t):
+    return t.hour * 60 + t.minute
+
+
+class Section:
+    def __init__(self, section_id, course_id, meetings, info=None):
+        # meetings: (day, start, end, location) with datetime.time start/end
+        self.section_id = section_id
+        self.course_id = course_id
+        self.meetings = meetings
+        self.info = info or {}
+        self.spans = [(day, minutes(start), minutes(end)) for day, start, end, _ in meetings]
+        self.days = 0
+        for day, _, _, _ in meetings:
+            self.days |= 1 << day
+
+    def allowed(self, earliest=None, latest=None, free_days=()):
+        for day, start, end, _ in self.meetings:
+            if day in free_days:
+                return False
+            if earliest is not None and start < earliest:
+                return False
+            if latest is not None and end > latest:
+                return False
+        return True
+
+
+def score(sections):
+    # fewer days on campus, then less idle time between classes, then a later start
+    per_day = {}
+    for s in sections:
+        for day, start, end in s.spans:
+            per_day.setdefault(day, []).append((start, end))
+    gaps = 0
+    earliest = 24 * 60
+    for spans in per_day.values():
+        spans.sort()
+        earliest = min(earliest, spans[0][0])
+        reach = spans[0][1]
+        for start, end in spans[1:]:
+            if start > reach:
+                gaps += start - reach
+            reach = max(reach, end)
+    return (len(per_day), gaps, -earliest)
+
+
+class Generator:
+    def __init__(self, sections_by_course):
+        # sections_by_course: {course_id: [Section]}; courses without sections
+        # are left out by the caller
+        self.courses = list(sections_by_course)
+        self.sections = [s for c in self.courses for s in sections_by_course[c]]
+        index = {id(s): i for i, s in enumerate(self.sections)}
+
+        self.course_mask = {}
+        for c in self.courses:
+            mask = 0
+            for s in sections_by_course[c]:
+                mask |= 1 << index[id(s)]
+            self.course_mask[c] = mask
+
+        everything = (1 << len(self.sections)) - 1
+        clash = [0] * len(self.sections)
+        meetings = [
+            (i, day, start, end)
+            for i, s in enumerate(self.sections)
+            for day, start, end, _ in s.meetings
+        ]
+        for a, b in conflicts.overlapping_pairs(meetings):
+            clash[a[0]] |= 1 << b[0]
+            clash[b[0]] |= 1 << a[0]
+        # a section is never compatible with another section of its own course
+        self.compat = [
+            everything & ~clash[i] & ~self.course_mask[s.course_id]
+            for i, s in enumerate(self.sections)
+        ]
+
+    def search(self, max_results=10, budget=2.0):
+        """
+        Best max_results schedules (by score) found within budget seconds.
+        Returns (schedules, stats); schedules are lists of Section in course
+        order, best first.
+        """
+        deadline = time.monotonic() + budget
+        stats = {'nodes': 0, 'found': 0, 'timed_out': False}
+        best = []  # max-heap on score via negation: (neg score, tiebreak, picks)
+        tiebreak = count()
+        sections = self.sections
+        compat = self.compat
+        course_mask = self.course_mask
+
+        def worst_days():
+            return -best[0][0][0] if len(best) >= max_results else None
+
+        def visit(remaining, allowed, picks, days):
+            stats['nodes'] += 1
+            if stats['nodes'] & 1023 == 0 and time.monotonic() > deadline:
+                stats['timed_out'] = True
+                return False
+            if not remaining:
+                chosen = [sections[i] for i in picks]
+                key = score(chosen)
+                stats['found'] += 1
+                entry = (tuple(-k for k in key), next(tiebreak), list(picks))
+                if len(best) < max_results:
+                    heapq.heappush(best, entry)
+                elif entry[:1] > best[0][:1]:
+                    heapq.heapreplace(best, entry)
+                return True
+
+            # most constrained course next; any course with nothing left prunes
+            pick, pick_mask = None, None
+            for c in remaining:
+                m = course_mask[c] & allowed
+                if not m:
+                    return True
+                if pick_mask is None or bin(m).count('1') < bin(pick_mask).count('1'):
+                    pick, pick_mask = c, m
+            rest = [c for c in remaining if c != pick]
+
+            # sections adding the fewest new days first, so good schedules
+            # turn up early and the days bound below starts pruning sooner
+            candidates = []
+            m = pick_mask
+            while m:
+                low = m & -m
+                i = low.bit_length() - 1
+                m ^= low
+                new_days = days | sections[i].days
+                candidates.append((bin(new_days).count('1'), i, new_days))
+            candidates.sort()
+
+            for n_days, i, new_days in candidates:
+                limit = worst_days()
+                # days on campus only grow, so a branch already worse than
+                # the kept schedules cannot improve
+                if limit is not None and n_days > limit:
+                    break
+                picks.append(i)
+                ok = visit(rest, allowed & compat[i], picks, new_days)
+                picks.pop()
+                if not ok:
+                    return False
+            return True
+
+        if self.courses:
+            visit(list(self.courses), (1 << len(sections)) - 1, [], 0)
+
+        ranked = sorted(best, key=lambda e: (tuple(-k for k in e[0]), e[1]))
+        order = {c: n for n, c in enumerate(self.courses)}
+        schedules = [
+            sorted((sections[i] for i in e[2]), key=lambda s: order[s.course_id])
+            for e in ranked
+        ]
+        return schedules, stats
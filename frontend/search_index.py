@@ -0,0 +1,307 @@
+# in-memory course search index
+#
+# courses are kept sorted by (subject, cata_num), so a course's position is
+# also its place in the result order and ranking only has to pick tiers. the
+# index holds word postings (exact words, plus every 1-3 letter prefix so
+# short queries do not scan the word list), 1-3 letter grams of the distinct
+# words for substring matches, single-letter deletions of every word for typo
+# tolerance, and subject / level facets.
+import bisect
+import heapq
+import re
+import threading
+from collections import defaultdict
+
+import catalog_hooks
+
+LIMIT = 100
+
+CODE_RE = re.compile(r'^\s*([A-Za-z]{2,5})\s*([0-9]{1,3})\s*$')
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+SHORT_PREFIX = 3
+MIN_FUZZY_LEN = 4
+
+
+def words(text):
+    return WORD_RE.findall(text.lower())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def grams(text):
+    # every substring of up to three letters
+    return {text[i:i + n] for n in (1, 2, 3) for i in range(len(text) - n + 1)}
+
+
+def deletions(word):
+    return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def within_one_edit(a, b):
+    # one insert, delete, substitution or adjacent swap apart
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        diff = [i for i in range(la) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    if la > lb:
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class SearchIndex:
+    def __init__(self, rows):
+        # rows: course_id, subject, cata_num, title, credits
+        self.docs = sorted(
+            (dict(r) for r in rows),
+            key=lambda r: (r['subject'], str(r['cata_num']), r['course_id']),
+        )
+        # each course's place in that order, for paging
+        self.keys = [(d['subject'], str(d['cata_num']), d['course_id']) for d in self.docs]
+        self.by_subject = defaultdict(set)
+        self.by_level = defaultdict(set)
+        self.postings = defaultdict(set)        # word -> docs
+        self.short_prefix = defaultdict(set)    # 1-3 letter prefix -> docs
+        self.word_grams = defaultdict(set)      # 1-3 letter gram -> words containing it
+        self.deletions = defaultdict(set)       # word minus one letter -> words, for typos
+        self.titles = []
+        cata_keys = []
+
+        for i, d in enumerate(self.docs):
+            subject = d['subject']
+            cata = str(d['cata_num'])
+            title = (d['title'] or '').lower()
+            self.titles.append(title)
+            cata_keys.append((cata, i))
+            self.by_subject[subject].add(i)
+            if cata:
+                self.by_level[cata[0]].add(i)
+            for w in set(words(subject) + words(cata) + words(title)):
+                self.postings[w].add(i)
+
+        self.words = sorted(self.postings)
+        self.subjects = sorted(self.by_subject, key=str.upper)
+        self.subjects_upper = [sub.upper() for sub in self.subjects]
+        cata_keys.sort()
+        self.cata_keys = [k for k, _ in cata_keys]
+        self.cata_docs = [i for _, i in cata_keys]
+        by_prefix = defaultdict(list)
+        for w in self.words:
+            for n in range(1, min(len(w), SHORT_PREFIX) + 1):
+                by_prefix[w[:n]].append(self.postings[w])
+            for t in grams(w):
+                self.word_grams[t].add(w)
+            if len(w) >= MIN_FUZZY_LEN - 1:
+                for v in deletions(w):
+                    self.deletions[v].add(w)
+        for prefix, postings in by_prefix.items():
+            self.short_prefix[prefix] = set().union(*postings)
+        self.subject_range = {}
+        for i, d in enumerate(self.docs):
+            lo, _ = self.subject_range.get(d['subject'], (i, i))
+            self.subject_range[d['subject']] = (lo, i + 1)
+
+    # word level matching
+
+    def prefix_docs(self, prefix):
+        if len(prefix) <= SHORT_PREFIX:
+            return self.short_prefix.get(prefix, set())
+        out = set()
+        i = bisect.bisect_left(self.words, prefix)
+        while i < len(self.words) and self.words[i].startswith(prefix):
+            out |= self.postings[self.words[i]]
+            i += 1
+        return out
+
+    def fuzzy_docs(self, word):
+        # words one edit away: any two such words share a one-letter deletion
+        if len(word) < MIN_FUZZY_LEN:
+            return set()
+        out = set()
+        seen = set()
+        for v in deletions(word):
+            for w in self.deletions.get(v, ()):
+                if w not in seen:
+                    seen.add(w)
+                    if within_one_edit(word, w):
+                        out |= self.postings[w]
+        return out
+
+    def direct_docs(self, q, limit=None):
+        # subject or catalog number starting with q, like the old LIKE 'q%'.
+        # with a limit only the first limit courses of each part are kept,
+        # which is enough for the first page
+        out = set()
+        qu = q.upper()
+        i = bisect.bisect_left(self.subjects_upper, qu)
+        while i < len(self.subjects) and self.subjects_upper[i].startswith(qu):
+            lo, hi = self.subject_range[self.subjects[i]]
+            if limit is not None:
+                hi = min(hi, lo + limit)
+            out.update(range(lo, hi))
+            i += 1
+        i = bisect.bisect_left(self.cata_keys, q)
+        j = bisect.bisect_left(self.cata_keys, q + '\uffff')
+        if limit is not None and j - i > limit:
+            out.update(heapq.nsmallest(limit, self.cata_docs[i:j]))
+        else:
+            out.update(self.cata_docs[i:j])
+        return out
+
+    def substring_docs(self, q):
+        # title contains q, like the old LIKE '%q%': courses with a word
+        # containing the longest piece of q, then checked against the title
+        q = q.lower()
+        piece = max(words(q), key=len, default='')
+        if not piece:
+            return set()
+        keys = trigrams(piece) if len(piece) >= 3 else {piece}
+        keys = sorted(keys, key=lambda t: len(self.word_grams.get(t, ())))
+        cand = set(self.word_grams.get(keys[0], ()))
+        for t in keys[1:]:
+            cand &= self.word_grams.get(t, set())
+        docs = set().union(*(self.postings[w] for w in cand if piece in w))
+        titles = self.titles
+        return {i for i in docs if q in titles[i]}
+
+    # queries
+
+    def search(self, q='', subject='', level='', limit=LIMIT, after=None):
+        """
+        (up to limit matching courses best first, the key of the last one
+        when more follow, else None). Keys are (tier, subject, cata_num,
+        course_id); with after, a key from the page before, the page starts
+        right after that course.
+        """
+        q = (q or '').strip()
+        subject = (subject or '').strip()
+        level = (level or '').strip()
+        want = limit + 1
+
+        # tiers before the cursor's only hide their courses from later ones
+        start_tier = after[0] if after else 0
+        start = bisect.bisect_right(self.keys, tuple(after[1:])) if after else 0
+
+        facet = None
+        if level and level.isdigit():
+            facet = self.by_level.get(str(int(level) // 100), set())
+
+        def filtered(docs, use_subject=True):
+            if use_subject and subject:
+                docs = docs & self.by_subject.get(subject, set())
+            if facet is not None:
+                docs = docs & facet
+            return docs
+
+        def page(found):
+            # found: (tier, doc) in result order, one more than the page
+            rows = [dict(self.docs[i]) for _, i in found[:limit]]
+            if len(found) <= limit:
+                return rows, None
+            t, i = found[limit - 1]
+            return rows, (t,) + self.keys[i]
+
+        # tiers are computed lazily, best first, until the page is full
+        tiers = []
+        code_match = CODE_RE.match(q) if q else None
+        if code_match:
+            # subject + number: that subject's courses by number prefix, as before
+            subj_code, num_code = code_match.groups()
+            lo, hi = self.subject_range.get(subj_code.upper(), (0, 0))
+            docs = filtered({i for i in range(lo, hi) if str(self.docs[i]['cata_num']).startswith(num_code)},
+                            use_subject=False)
+            if docs or subj_code.upper() in self.subject_range:
+                tiers.append(lambda: docs)
+            else:
+                # no such subject: maybe a typo in it
+                tiers.append(lambda: filtered(self.fuzzy_docs(subj_code.lower()) & self.direct_docs(num_code),
+                                              use_subject=False))
+        elif q:
+            tokens = words(q)
+
+            def every_prefix():
+                # every word starts a word of the course
+                every = None
+                for t in tokens:
+                    docs = self.prefix_docs(t)
+                    every = docs if every is None else every & docs
+                    if not every:
+                        break
+                return filtered(every or set())
+
+            def every_fuzzy():
+                # every word matches, allowing one typo per word
+                fuzzy = None
+                for t in tokens:
+                    docs = self.prefix_docs(t) | self.fuzzy_docs(t)
+                    fuzzy = docs if fuzzy is None else fuzzy & docs
+                    if not fuzzy:
+                        break
+                return filtered(fuzzy or set())
+
+            # the first page can come from the first tier alone only without
+            # filters; later pages need it whole to leave out what it showed
+            direct_limit = want if not subject and facet is None and after is None else None
+            tiers.append(lambda: filtered(self.direct_docs(q, direct_limit)))
+            tiers.append(every_prefix)
+            tiers.append(lambda: filtered(self.substring_docs(q)))
+            tiers.append(every_fuzzy)
+        else:
+            # no query: courses are stored in result order, so walk the
+            # subject's range (or everything) from the cursor and stop once
+            # the page is full
+            lo, hi = self.subject_range.get(subject, (0, 0)) if subject else (0, len(self.docs))
+            found = []
+            for i in range(max(lo, start), hi):
+                if facet is None or i in facet:
+                    found.append((0, i))
+                    if len(found) >= want:
+                        break
+            return page(found)
+
+        seen = set()
+        found = []
+        for t, tier in enumerate(tiers):
+            fresh = tier() - seen
+            seen |= fresh
+            if t < start_tier or not fresh:
+                continue
+            if t == start_tier and start:
+                fresh = {i for i in fresh if i >= start}
+            found.extend((t, i) for i in heapq.nsmallest(want - len(found), fresh))
+            if len(found) >= want:
+                break
+        return page(found)
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def current(run_query):
+    global _index
+    index = _index
+    if index is not None:
+        return index
+    with _lock:
+        if _index is None:
+            _index = SearchIndex(run_query("SELECT course_id, subject, cata_num, title, credits FROM course"))
+        return _index
+
+
+@catalog_hooks.on_change
+def invalidate():
+    global _index
+    with _lock:
+        _index = None
@@ -0,0 +1,268 @@
+# seat-limited enrollment with a waitlist per section
+#
+# each section's seats are counted in memory: its capacity, the students
+# holding a seat (status ENROLLED), every student with an enrollment row in it
+# and its waitlist, read from the database the first time the section is
+# used. enrolling, dropping and leaving the waitlist take the section's lock,
+# decide from those counts and write while still holding it, so attempts on
+# one section line up without a COUNT(*) each and attempts on different
+# sections never wait for each other.
+#
+# a waitlist entry's position is a ticket: one past the last ticket the
+# section handed out, never renumbered, so joining the line is one insert.
+# a student's place in line is the number of entries at or before theirs.
+# whenever a seat is free the lowest ticket is enrolled, in the same
+# transaction as the drop that freed it. writes that go around this module
+# (history edits, transcript and catalog imports) mark sections stale; a
+# stale section is read again on its next use and any seat it has free goes
+# to its waitlist before anyone new.
+import sys
+import threading
+from collections import deque
+from pathlib import Path
+
+import duckdb
+
+import catalog_hooks
+import statements
+
+# catalog scripts live in db/
+_DB_DIR = str(Path(__file__).resolve().parent.parent / 'db')
+if _DB_DIR not in sys.path:
+    sys.path.insert(0, _DB_DIR)
+import ids
+
+SECTION_SQL = statements.define('seats_section', "SELECT course_id, capacity FROM section WHERE section_id = ?")
+TAKEN_SQL = statements.define('seats_taken', """
+    SELECT stu_id, status = 'ENROLLED' AS seated FROM enrollment WHERE section_id = ?
+""")
+WAITING_SQL = statements.define('seats_waiting', """
+    SELECT stu_id, position FROM waitlist WHERE section_id = ? ORDER BY position
+""")
+ENROLL_SQL = statements.define('seats_enroll', f"""
+    INSERT INTO enrollment (enroll_id, stu_id, section_id, status, grade, credits_earned)
+    VALUES ({ids.nextval_sql('enrollment')}, ?, ?, 'ENROLLED', NULL, NULL)
+    RETURNING enroll_id
+""")
+WAIT_SQL = statements.define('seats_wait', f"""
+    INSERT INTO waitlist (wait_id, stu_id, section_id, position, time_added)
+    VALUES ({ids.nextval_sql('waitlist')}, ?, ?, ?, now())
+    RETURNING wait_id
+""")
+DROP_SQL = statements.define('seats_drop', """
+    DELETE FROM enrollment WHERE stu_id = ? AND section_id = ? AND status = 'ENROLLED' RETURNING enroll_id
+""")
+# section_id and position together are a lookup on idx_waitlist_section_position
+POP_SQL = statements.define('seats_pop', "DELETE FROM waitlist WHERE section_id = ? AND position = ?")
+LEAVE_SQL = statements.define('seats_leave', """
+    DELETE FROM waitlist WHERE stu_id = ? AND section_id = ? RETURNING position
+""")
+
+
+class Section:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stale = True
+        self.course_id = None
+        self.capacity = 0
+        self.seated = set()     # students holding a seat
+        self.taken = set()      # students with any enrollment row
+        self.waiting = {}       # student -> ticket
+        self.line = deque()     # (ticket, student), lowest first; entries that
+                                # left the waitlist are skipped when reached
+        self.next_ticket = 1
+
+    def load(self, run_query, section_id):
+        # False when there is no such section. a load that raced with an
+        # invalidation is used once and read again next time
+        epoch = _epoch
+        found = run_query(SECTION_SQL, (section_id,))
+        if not found:
+            return False
+        self.course_id = found[0]['course_id']
+        self.capacity = found[0]['capacity']
+        rows = run_query(TAKEN_SQL, (section_id,))
+        self.taken = {r['stu_id'] for r in rows}
+        self.seated = {r['stu_id'] for r in rows if r['seated']}
+        rows = run_query(WAITING_SQL, (section_id,))
+        self.waiting = {r['stu_id']: r['position'] for r in rows}
+        self.line = deque((r['position'], r['stu_id']) for r in rows)
+        self.next_ticket = rows[-1]['position'] + 1 if rows else 1
+        self.stale = epoch != _epoch
+        return True
+
+    def place(self, stu_id):
+        # the student's place in line, 1 for the next to get a seat
+        ticket = self.waiting[stu_id]
+        return sum(1 for t in self.waiting.values() if t <= ticket)
+
+
+_sections = {}
+_lock = threading.Lock()
+_epoch = 0
+
+
+def _section(section_id):
+    sec = _sections.get(section_id)
+    if sec is None:
+        with _lock:
+            sec = _sections.setdefault(section_id, Section())
+    return sec
+
+
+def _promote(run_query, sec, section_id):
+    # fill free seats from the head of the line, inside the caller's
+    # transaction; returns (stu_id, enroll_id, course_id) of everyone enrolled
+    promoted = []
+    while len(sec.seated) < sec.capacity and sec.line:
+        ticket, stu_id = sec.line.popleft()
+        if sec.waiting.get(stu_id) != ticket:
+            continue
+        del sec.waiting[stu_id]
+        run_query(POP_SQL, (section_id, ticket))
+        if stu_id in sec.taken:
+            continue
+        enroll_id = run_query(ENROLL_SQL, (stu_id, section_id))[0]['enroll_id']
+        sec.seated.add(stu_id)
+        sec.taken.add(stu_id)
+        promoted.append((stu_id, enroll_id, sec.course_id))
+    return promoted
+
+
+def _ready(run_query, transaction, sec, section_id):
+    """
+    Load a stale section and hand its free seats to its waitlist. Returns
+    the students promoted, or None when the section does not exist. The
+    caller holds sec.lock.
+    """
+    if not sec.stale:
+        return []
+    if not sec.load(run_query, section_id):
+        return None
+    if len(sec.seated) >= sec.capacity or not sec.line:
+        return []
+    with transaction():
+        return _promote(run_query, sec, section_id)
+
+
+def _enroll(run_query, transaction, sec, stu_id, section_id):
+    promoted = _ready(run_query, transaction, sec, section_id)
+    if promoted is None:
+        return None, []
+    if stu_id in sec.taken:
+        result = {'status': 'ALREADY_ENROLLED'}
+    elif stu_id in sec.waiting:
+        result = {'status': 'ALREADY_WAITLISTED', 'position': sec.place(stu_id)}
+    elif len(sec.seated) < sec.capacity:
+        enroll_id = run_query(ENROLL_SQL, (stu_id, section_id))[0]['enroll_id']
+        sec.seated.add(stu_id)
+        sec.taken.add(stu_id)
+        result = {'status': 'ENROLLED', 'enroll_id': enroll_id}
+    else:
+        ticket = sec.next_ticket
+        wait_id = run_query(WAIT_SQL, (stu_id, section_id, ticket))[0]['wait_id']
+        sec.next_ticket += 1
+        sec.waiting[stu_id] = ticket
+        sec.line.append((ticket, stu_id))
+        # everyone already in line is ahead
+        result = {'status': 'WAITLISTED', 'wait_id': wait_id, 'position': len(sec.waiting)}
+    result['course_id'] = sec.course_id
+    return result, promoted
+
+
+def enroll(run_query, transaction, stu_id, section_id):
+    """
+    A seat in the section for the student, or a place on its waitlist when
+    it is full. Returns (result, promoted): result is None for a section that
+    does not exist, else a dict with status ENROLLED (and enroll_id),
+    WAITLISTED (wait_id, position), ALREADY_ENROLLED or ALREADY_WAITLISTED,
+    and the section's course_id. promoted lists (stu_id, enroll_id,
+    course_id) of waitlisted students given a seat on the way.
+    """
+    sec = _section(section_id)
+    with sec.lock:
+        try:
+            try:
+                return _enroll(run_query, transaction, sec, stu_id, section_id)
+            except duckdb.ConstraintException:
+                # a write that went around this module got there first
+                sec.stale = True
+                return _enroll(run_query, transaction, sec, stu_id, section_id)
+        except Exception:
+            sec.stale = True
+            raise
+
+
+def drop(run_query, transaction, stu_id, section_id):
+    """
+    Give up the student's seat in the section. Returns (enroll_ids dropped,
+    promoted), promoted as for enroll().
+    """
+    sec = _section(section_id)
+    with sec.lock:
+        try:
+            promoted = _ready(run_query, transaction, sec, section_id) or []
+            with transaction():
+                dropped = [r['enroll_id'] for r in run_query(DROP_SQL, (stu_id, section_id))]
+                if dropped and not sec.stale:
+                    sec.seated.discard(stu_id)
+                    sec.taken.discard(stu_id)
+                    promoted += _promote(run_query, sec, section_id)
+        except Exception:
+            sec.stale = True
+            raise
+    return dropped, promoted
+
+
+def leave(run_query, stu_id, section_id):
+    # take the student off the section's waitlist; False when not on it
+    sec = _section(section_id)
+    with sec.lock:
+        try:
+            left = run_query(LEAVE_SQL, (stu_id, section_id))
+        except Exception:
+            sec.stale = True
+            raise
+        # the line entry is skipped when it comes up
+        sec.waiting.pop(stu_id, None)
+    return bool(left)
+
+
+def refresh(run_query, transaction, section_id):
+    # read the section again now, after a write that went around this module;
+    # returns the students promoted into seats it freed. a section not used
+    # yet is read on first use anyway
+    sec = _sections.get(section_id)
+    if sec is None:
+        return []
+    with sec.lock:
+        sec.stale = True
+        try:
+            return _ready(run_query, transaction, sec, section_id) or []
+        except Exception:
+            sec.stale = True
+            raise
+
+
+def invalidate(section_ids=None):
+    # read these sections (every section when None) again on next use
+    global _epoch
+    with _lock:
+        _epoch += 1
+        targets = list(_sections.values()) if section_ids is None else [
+            _sections[s] for s in section_ids if s in _sections]
+    for sec in targets:
+        sec.stale = True
+
+
+def stats():
+    with _lock:
+        loaded = [s for s in _sections.values() if not s.stale]
+    return {'sections': len(loaded), 'seated': sum(len(s.seated) for s in loaded),
+            'waiting': sum(len(s.waiting) for s in loaded)}
+
+
+@catalog_hooks.on_change
+def clear():
+    # capacities may have changed
+    invalidate()
@@ -0,0 +1,29 @@
+# production entry point: the app served by uvicorn through asgi.py instead
+# of the flask debug server
+#
+#   python serve.py --host 0.0.0.0 --port 8000
+#
+# duckdb allows one process per database file, so this always runs a single
+# uvicorn process; concurrency comes from asgi.py's worker threads
+# (ASGI_WORKERS, default DB_POOL_SIZE) and ASGI_MAX_PENDING bounds the queue.
+import argparse
+import os
+
+
+def main():
+    parser = argparse.ArgumentParser(description='serve the course planner')
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '8000')))
+    parser.add_argument('--log-level', default='info')
+    parser.add_argument('--access-log', action='store_true', help='log every request')
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit('serve.py needs uvicorn: python -m pip install uvicorn')
+    uvicorn.run('asgi:application', host=args.host, port=args.port, workers=1,
+                log_level=args.log_level, access_log=args.access_log)
+
+
+if __name__ == '__main__':
+    main()
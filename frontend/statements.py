@@ -0,0 +1,72 @@
+# named statements, parsed once per pooled cursor
+#
+# duckdb parses sql text again on every execute. the fixed statements of the
+# request paths are defined here once and parsed on a cursor the first time
+# that cursor runs them (con.extract_statements); later runs hand duckdb the
+# parsed statement with its parameters bound by the driver, as any other
+# execute. binding and planning still happen per run, so a catalog swap or a
+# schema change is picked up like it is for plain sql text.
+import re
+import threading
+import weakref
+
+_NAME = re.compile(r'^[a-z][a-z0-9_]*$')
+
+_registry = {}   # name -> Statement
+_parsed = weakref.WeakKeyDictionary()   # cursor -> name -> parsed statement
+_lock = threading.Lock()
+
+
+class Statement(str):
+    """
+    SQL text with a name. It is a str, so it can go anywhere sql text can;
+    execute() below runs it from a cached parse.
+    """
+
+    def __new__(cls, name, sql):
+        self = super().__new__(cls, sql)
+        self.name = name
+        self.executes = 0
+        self.parses = 0
+        return self
+
+
+def define(name, sql):
+    if not _NAME.match(name):
+        raise ValueError(f'bad statement name {name!r}')
+    with _lock:
+        found = _registry.get(name)
+        if found is not None:
+            if found != sql:
+                raise ValueError(f'statement {name} is already defined with other sql')
+            return found
+        stmt = _registry[name] = Statement(name, sql)
+        return stmt
+
+
+def execute(con, sql, params=()):
+    """
+    con.execute(sql, params), with a Statement run from its parse on con.
+    Returns the cursor.
+    """
+    if not isinstance(sql, Statement):
+        return con.execute(sql, params)
+    with _lock:
+        parsed = _parsed.get(con)
+        if parsed is None:
+            parsed = _parsed[con] = {}
+    stmt = parsed.get(sql.name)
+    if stmt is None:
+        stmt, = con.extract_statements(sql)
+        parsed[sql.name] = stmt
+        with _lock:
+            sql.parses += 1
+    with _lock:
+        sql.executes += 1
+    return con.execute(stmt, params)
+
+
+def stats():
+    with _lock:
+        return {s.name: {'executes': s.executes, 'parses': s.parses}
+                for s in _registry.values()}
@@ -0,0 +1,138 @@
+# per-student academic state kept between requests
+#
+# completed courses, credit totals and planned courses are read by most plan
+# and recommendation endpoints. they only change through a handful of write
+# endpoints, which drop the affected entry after their write commits. a load
+# that raced with an invalidation is not stored, so a stale read never
+# outlives the write that made it stale. neither is a load inside an open
+# transaction: it reads the snapshot from when the transaction began, which
+# may predate a write whose invalidation already ran.
+import os
+import threading
+from collections import OrderedDict
+
+import catalog_hooks
+import dbpool
+import statements
+
+CACHE_SIZE = int(os.environ.get('STUDENT_CACHE_SIZE', '1024'))
+
+# grades that complete a course (P counts for history, not for prereqs)
+PASSING = ('A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'P')
+PREREQ_PASSING = ('A', 'A-', 'B+', 'B', 'B-', 'C+', 'C')
+
+
+class LRUCache:
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            epoch = self._epoch
+        value = load()
+        if dbpool.in_transaction():
+            return value
+        with self._lock:
+            # skip the store if anything was invalidated while loading
+            if epoch == self._epoch:
+                self._items[key] = value
+                self._items.move_to_end(key)
+                while len(self._items) > self.size:
+                    self._items.popitem(last=False)
+        return value
+
+    def peek(self, key):
+        # the cached value or None, without loading or counting
+        with self._lock:
+            return self._items.get(key)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._epoch += 1
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._items), 'max_size': self.size, 'hits': self.hits, 'misses': self.misses}
+
+
+_cache = LRUCache()
+
+
+STUDENT_ROWS_SQL = statements.define('student_state_rows', """
+    SELECT s.course_id, e.grade, CAST(c.credits AS INT) AS credits
+    FROM enrollment e
+    JOIN section s ON s.section_id = e.section_id
+    JOIN course c ON c.course_id = s.course_id
+    WHERE e.stu_id = ?
+      AND e.grade IS NOT NULL
+""")
+PLAN_OWNER_SQL = statements.define('plan_owner', "SELECT stu_id FROM degree_plan WHERE plan_id = ?")
+PLAN_COURSES_SQL = statements.define('plan_state_rows', """
+    SELECT COALESCE(pc.course_id, sec.course_id) AS course_id
+    FROM planned_course pc
+    LEFT JOIN section sec ON sec.section_id = pc.section_id
+    WHERE pc.plan_id = ?
+""")
+
+
+def student_state(run_query, stu_id):
+    """
+    {'completed': course ids passed (P included), 'prereq_completed': course
+    ids passed with a grade that satisfies prereqs, 'credits': credits of the
+    passed enrollments}
+    """
+    def load():
+        rows = run_query(STUDENT_ROWS_SQL, (stu_id,))
+        passed = [r for r in rows if r['grade'] in PASSING]
+        return {
+            'completed': frozenset(r['course_id'] for r in passed),
+            'prereq_completed': frozenset(r['course_id'] for r in passed if r['grade'] in PREREQ_PASSING),
+            'credits': sum(r['credits'] or 0 for r in passed),
+        }
+    return _cache.get(('student', stu_id), load)
+
+
+def plan_state(run_query, plan_id):
+    # {'stu_id': owner or None, 'planned': course ids in the plan}
+    def load():
+        owner = run_query(PLAN_OWNER_SQL, (plan_id,))
+        rows = run_query(PLAN_COURSES_SQL, (plan_id,))
+        return {
+            'stu_id': owner[0]['stu_id'] if owner else None,
+            'planned': frozenset(r['course_id'] for r in rows if r['course_id'] is not None),
+        }
+    return _cache.get(('plan', plan_id), load)
+
+
+def invalidate_student(stu_id):
+    _cache.invalidate(('student', stu_id))
+
+
+def invalidate_plan(plan_id):
+    _cache.invalidate(('plan', plan_id))
+
+
+def stats():
+    return _cache.stats()
+
+
+# sections and courses behind the cached sets can change on import
+@catalog_hooks.on_change
+def clear():
+    _cache.clear()